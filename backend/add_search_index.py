@@ -0,0 +1,66 @@
+"""
+Add the FULLTEXT index used by /api/search to test banks created before
+scraper.py started creating it. Banks without the index still work but
+fall back to slow LIKE scans.
+
+Usage:
+    python add_search_index.py                 # every test bank
+    python add_search_index.py aws_saa_c03     # specific banks
+"""
+import argparse
+
+import mysql.connector
+
+from app import DB_CONFIG
+from catalog import BANK_COLUMNS, touch_signal_file
+from search import FULLTEXT_INDEX, SEARCH_COLUMNS
+
+
+def find_unindexed_tables(cursor):
+    """Test bank tables that don't have the FULLTEXT index yet"""
+    cursor.execute("""
+        SELECT TABLE_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME IN (%s, %s)
+        GROUP BY TABLE_NAME
+        HAVING COUNT(*) = 2
+    """, BANK_COLUMNS)
+    banks = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT DISTINCT TABLE_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND INDEX_NAME = %s
+    """, (FULLTEXT_INDEX,))
+    indexed = {row[0] for row in cursor.fetchall()}
+    return sorted(banks - indexed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add the search FULLTEXT index to test banks")
+    parser.add_argument("tables", nargs="*", help="Tables to index (default: all unindexed banks)")
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        cursor = db.cursor()
+        tables = args.tables or find_unindexed_tables(cursor)
+        if not tables:
+            print("✓ Every test bank already has the search index")
+
+        for table_name in tables:
+            # The first FULLTEXT index on an InnoDB table rebuilds the table
+            print(f"Indexing '{table_name}'...")
+            cursor.execute(
+                f"ALTER TABLE `{table_name}` ADD FULLTEXT INDEX {FULLTEXT_INDEX} "
+                f"({', '.join(SEARCH_COLUMNS)})"
+            )
+            print(f"✓ {table_name}: search index created")
+        cursor.close()
+    finally:
+        db.close()
+
+    # Running API processes reload the catalog and start using the index
+    touch_signal_file()
+
+
+if __name__ == "__main__":
+    main()
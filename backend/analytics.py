@@ -0,0 +1,429 @@
+# Cohort analytics rollups. Every attempt write adds its counts to these
+# tables in the same transaction as the user_stats upsert, and resets take
+# them back out, so the cohort endpoints read a few rows by index instead of
+# grouping user_stats. refresh_analytics.py rebuilds them from user_stats.
+QUESTION_ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS question_rollup (
+        table_name VARCHAR(255) NOT NULL,
+        question_id INT NOT NULL,
+        learners INT NOT NULL DEFAULT 0,
+        attempts INT NOT NULL DEFAULT 0,
+        correct INT NOT NULL DEFAULT 0,
+        error_rate DOUBLE NOT NULL DEFAULT 0,
+        PRIMARY KEY (table_name, question_id),
+        INDEX idx_error_rate (error_rate, attempts),
+        INDEX idx_bank_error_rate (table_name, error_rate, attempts)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+LEARNER_BANK_ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS learner_bank_rollup (
+        user_id VARCHAR(255) NOT NULL,
+        table_name VARCHAR(255) NOT NULL,
+        questions_attempted INT NOT NULL DEFAULT 0,
+        attempts INT NOT NULL DEFAULT 0,
+        correct INT NOT NULL DEFAULT 0,
+        last_attempt DATETIME NOT NULL,
+        PRIMARY KEY (user_id, table_name),
+        INDEX idx_bank_correct (table_name, correct),
+        INDEX idx_bank_questions (table_name, questions_attempted)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+LEARNER_ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS learner_rollup (
+        user_id VARCHAR(255) NOT NULL PRIMARY KEY,
+        banks INT NOT NULL DEFAULT 0,
+        questions_attempted INT NOT NULL DEFAULT 0,
+        attempts INT NOT NULL DEFAULT 0,
+        correct INT NOT NULL DEFAULT 0,
+        last_attempt DATETIME NOT NULL,
+        INDEX idx_correct (correct),
+        INDEX idx_questions (questions_attempted)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+BANK_ROLLUP_DDL = """
+    CREATE TABLE IF NOT EXISTS bank_rollup (
+        table_name VARCHAR(255) NOT NULL PRIMARY KEY,
+        learners INT NOT NULL DEFAULT 0,
+        questions_attempted INT NOT NULL DEFAULT 0,
+        attempts INT NOT NULL DEFAULT 0,
+        correct INT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+ANALYTICS_DDL = (QUESTION_ROLLUP_DDL, LEARNER_BANK_ROLLUP_DDL, LEARNER_ROLLUP_DDL, BANK_ROLLUP_DDL)
+
+# Rows per statement, as in stats_writer.py
+ROWS_PER_STATEMENT = 500
+
+# Questions answered fewer times than this are left out of the hardest list
+HARDEST_MIN_ATTEMPTS = 5
+
+# Ranking columns for top learners
+LEARNER_ORDER = {'correct': 'correct', 'questions': 'questions_attempted'}
+
+# Assignments that add a row's VALUES() to the rollup it collides with,
+# qualified because resets insert from tables with the same column names.
+# MySQL applies them left to right, so error_rate sees the new totals
+ADD_QUESTION = """
+    question_rollup.learners = question_rollup.learners + VALUES(learners),
+    question_rollup.attempts = question_rollup.attempts + VALUES(attempts),
+    question_rollup.correct = question_rollup.correct + VALUES(correct),
+    question_rollup.error_rate = IF(question_rollup.attempts > 0,
+        (question_rollup.attempts - question_rollup.correct) / question_rollup.attempts, 0)
+"""
+
+ADD_BANK = """
+    bank_rollup.learners = bank_rollup.learners + VALUES(learners),
+    bank_rollup.questions_attempted = bank_rollup.questions_attempted + VALUES(questions_attempted),
+    bank_rollup.attempts = bank_rollup.attempts + VALUES(attempts),
+    bank_rollup.correct = bank_rollup.correct + VALUES(correct)
+"""
+
+
+def chunked(rows):
+    for offset in range(0, len(rows), ROWS_PER_STATEMENT):
+        yield rows[offset:offset + ROWS_PER_STATEMENT]
+
+
+def learner_totals(counts):
+    """{(user_id, table_name): [attempts, correct]} for coalesced attempt counts"""
+    totals = {}
+    for (user_id, table_name, _), (attempts, correct) in counts.items():
+        pair = totals.setdefault((user_id, table_name), [0, 0])
+        pair[0] += attempts
+        pair[1] += correct
+    return totals
+
+
+def learner_bank_statements(counts):
+    """(sql, params) upserts adding attempt counts to learner_bank_rollup, run
+    right after the user_stats upsert. questions_attempted is added later by
+    rollup_statements, once first_attempts_queries have found the new questions"""
+    rows = sorted((user_id, table_name, attempts, correct)
+                  for (user_id, table_name), (attempts, correct) in learner_totals(counts).items())
+    for chunk in chunked(rows):
+        placeholders = ', '.join(['(%s, %s, 0, %s, %s, CURRENT_TIMESTAMP)'] * len(chunk))
+        yield f"""
+            INSERT INTO learner_bank_rollup
+                (user_id, table_name, questions_attempted, attempts, correct, last_attempt)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE
+                attempts = attempts + VALUES(attempts),
+                correct = correct + VALUES(correct),
+                last_attempt = CURRENT_TIMESTAMP
+        """, tuple(value for row in chunk for value in row)
+
+
+def first_attempts_queries(counts):
+    """(sql, params) queries selecting the user_stats rows (user_id, table_name,
+    question_id) and learner_bank_rollup rows (user_id, table_name, NULL)
+    that this batch created, ROWS_PER_STATEMENT keys per query.
+
+    Run after both upserts, in the same transaction: a row was created by the
+    batch exactly when its attempts equal the batch's, since rows are never
+    stored without attempts. The upserts hold the rows' locks until commit,
+    so concurrent first attempts on the same question are counted once.
+    """
+    keys = sorted(counts)
+    for chunk in chunked(keys):
+        match = ' OR '.join(['(user_id = %s AND table_name = %s AND question_id = %s AND attempts = %s)']
+                            * len(chunk))
+        yield (f"SELECT user_id, table_name, question_id FROM user_stats WHERE {match}",
+               tuple(value for key in chunk for value in key + (counts[key][0],)))
+
+    pairs = sorted(learner_totals(counts).items())
+    for chunk in chunked(pairs):
+        match = ' OR '.join(['(user_id = %s AND table_name = %s AND attempts = %s)'] * len(chunk))
+        yield (f"SELECT user_id, table_name, NULL AS question_id FROM learner_bank_rollup WHERE {match}",
+               tuple(value for (user_id, table_name), (attempts, _) in chunk
+                     for value in (user_id, table_name, attempts)))
+
+
+def rollup_statements(counts, first_attempts):
+    """(sql, params) upserts adding coalesced attempt counts to the rollups.
+
+    first_attempts are the rows first_attempts_queries returned. The shared
+    per-question and per-bank rows are written last, in key order, to hold
+    their locks briefly and always take them in the same order.
+    """
+    new_questions = {}
+    new_banks = {}
+    for user_id, table_name, question_id in first_attempts:
+        if question_id is None:
+            new_banks[(user_id, table_name)] = 1
+        else:
+            new_questions[(user_id, table_name, question_id)] = 1
+
+    questions_per_learner = {}
+    for user_id, table_name, _ in new_questions:
+        questions_per_learner[(user_id, table_name)] = questions_per_learner.get((user_id, table_name), 0) + 1
+    rows = sorted(questions_per_learner.items())
+    for chunk in chunked(rows):
+        placeholders = ', '.join(['(%s, %s, %s, 0, 0, CURRENT_TIMESTAMP)'] * len(chunk))
+        yield f"""
+            INSERT INTO learner_bank_rollup
+                (user_id, table_name, questions_attempted, attempts, correct, last_attempt)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE
+                questions_attempted = questions_attempted + VALUES(questions_attempted)
+        """, tuple(value for (user_id, table_name), new in chunk for value in (user_id, table_name, new))
+
+    learners = {}
+    for (user_id, table_name), (attempts, correct) in learner_totals(counts).items():
+        totals = learners.setdefault(user_id, [0, 0, 0, 0])
+        totals[0] += new_banks.get((user_id, table_name), 0)
+        totals[1] += questions_per_learner.get((user_id, table_name), 0)
+        totals[2] += attempts
+        totals[3] += correct
+    rows = sorted((user_id, *totals) for user_id, totals in learners.items())
+    for chunk in chunked(rows):
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)'] * len(chunk))
+        yield f"""
+            INSERT INTO learner_rollup (user_id, banks, questions_attempted, attempts, correct, last_attempt)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE
+                banks = banks + VALUES(banks),
+                questions_attempted = questions_attempted + VALUES(questions_attempted),
+                attempts = attempts + VALUES(attempts),
+                correct = correct + VALUES(correct),
+                last_attempt = CURRENT_TIMESTAMP
+        """, tuple(value for row in chunk for value in row)
+
+    questions = {}
+    for (user_id, table_name, question_id), (attempts, correct) in counts.items():
+        totals = questions.setdefault((table_name, question_id), [0, 0, 0])
+        totals[0] += new_questions.get((user_id, table_name, question_id), 0)
+        totals[1] += attempts
+        totals[2] += correct
+    rows = sorted((table_name, question_id, learners, attempts, correct, (attempts - correct) / attempts)
+                  for (table_name, question_id), (learners, attempts, correct) in questions.items())
+    for chunk in chunked(rows):
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk))
+        yield f"""
+            INSERT INTO question_rollup (table_name, question_id, learners, attempts, correct, error_rate)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE {ADD_QUESTION}
+        """, tuple(value for row in chunk for value in row)
+
+    banks = {}
+    for (user_id, table_name), (attempts, correct) in learner_totals(counts).items():
+        totals = banks.setdefault(table_name, [0, 0, 0, 0])
+        totals[0] += new_banks.get((user_id, table_name), 0)
+        totals[1] += questions_per_learner.get((user_id, table_name), 0)
+        totals[2] += attempts
+        totals[3] += correct
+    rows = sorted((table_name, *totals) for table_name, totals in banks.items())
+    for chunk in chunked(rows):
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))
+        yield f"""
+            INSERT INTO bank_rollup (table_name, learners, questions_attempted, attempts, correct)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE {ADD_BANK}
+        """, tuple(value for row in chunk for value in row)
+
+
+def record_rollups(cursor, counts):
+    """Add coalesced attempt counts to the rollups; runs after their user_stats
+    upsert, on a plain (tuple) cursor in the same transaction"""
+    if not counts:
+        return
+    for sql, params in learner_bank_statements(counts):
+        cursor.execute(sql, params)
+    first_attempts = []
+    for sql, params in first_attempts_queries(counts):
+        cursor.execute(sql, params)
+        first_attempts.extend(cursor.fetchall())
+    for sql, params in rollup_statements(counts, first_attempts):
+        cursor.execute(sql, params)
+
+
+def reset_statements(user_id, table_name=None):
+    """(sql, params) statements taking a learner's user_stats (in one bank, or
+    all of them) out of the rollups; run before those rows are deleted"""
+    where = "user_id = %s"
+    params = (user_id,)
+    if table_name:
+        where += " AND table_name = %s"
+        params += (table_name,)
+
+    yield f"""
+        INSERT INTO question_rollup (table_name, question_id, learners, attempts, correct, error_rate)
+        SELECT table_name, question_id, -1, -attempts, -correct, 0
+        FROM user_stats
+        WHERE {where}
+        ORDER BY table_name, question_id
+        ON DUPLICATE KEY UPDATE {ADD_QUESTION}
+    """, params
+    yield f"""
+        INSERT INTO bank_rollup (table_name, learners, questions_attempted, attempts, correct)
+        SELECT table_name, -1, -questions_attempted, -attempts, -correct
+        FROM learner_bank_rollup
+        WHERE {where}
+        ORDER BY table_name
+        ON DUPLICATE KEY UPDATE {ADD_BANK}
+    """, params
+    yield f"DELETE FROM learner_bank_rollup WHERE {where}", params
+    # A learner's totals are the sum of their remaining banks
+    yield "DELETE FROM learner_rollup WHERE user_id = %s", (user_id,)
+    yield """
+        INSERT INTO learner_rollup (user_id, banks, questions_attempted, attempts, correct, last_attempt)
+        SELECT user_id, COUNT(*), SUM(questions_attempted), SUM(attempts), SUM(correct), MAX(last_attempt)
+        FROM learner_bank_rollup
+        WHERE user_id = %s
+        GROUP BY user_id
+    """, (user_id,)
+
+
+def rebuild_statements(table_name=None):
+    """(sql, params) statements recomputing the rollups from user_stats: all of
+    them, or one bank's rows and the totals of that bank's learners"""
+    if table_name is None:
+        for table in ('question_rollup', 'learner_bank_rollup', 'learner_rollup', 'bank_rollup'):
+            yield f"DELETE FROM {table}", ()
+        stats_where, bank_where, learners, params = "WHERE attempts > 0", "", "", ()
+    else:
+        stats_where, bank_where = "WHERE attempts > 0 AND table_name = %s", "WHERE table_name = %s"
+        params = (table_name,)
+        learners = "WHERE user_id IN (SELECT user_id FROM learner_bank_rollup WHERE table_name = %s)"
+        yield "DELETE FROM question_rollup WHERE table_name = %s", params
+        yield "DELETE FROM bank_rollup WHERE table_name = %s", params
+        # The bank's learners, found before their rows in it are replaced
+        yield f"DELETE FROM learner_rollup {learners}", params
+        yield "DELETE FROM learner_bank_rollup WHERE table_name = %s", params
+    yield f"""
+        INSERT INTO question_rollup (table_name, question_id, learners, attempts, correct, error_rate)
+        SELECT table_name, question_id, COUNT(*), SUM(attempts), SUM(correct),
+               IF(SUM(attempts) > 0, (SUM(attempts) - SUM(correct)) / SUM(attempts), 0)
+        FROM user_stats
+        {stats_where}
+        GROUP BY table_name, question_id
+    """, params
+    yield f"""
+        INSERT INTO learner_bank_rollup (user_id, table_name, questions_attempted, attempts, correct, last_attempt)
+        SELECT user_id, table_name, COUNT(*), SUM(attempts), SUM(correct), MAX(last_attempt)
+        FROM user_stats
+        {stats_where}
+        GROUP BY user_id, table_name
+    """, params
+    yield f"""
+        INSERT INTO learner_rollup (user_id, banks, questions_attempted, attempts, correct, last_attempt)
+        SELECT user_id, COUNT(*), SUM(questions_attempted), SUM(attempts), SUM(correct), MAX(last_attempt)
+        FROM learner_bank_rollup
+        {learners}
+        GROUP BY user_id
+    """, params
+    yield f"""
+        INSERT INTO bank_rollup (table_name, learners, questions_attempted, attempts, correct)
+        SELECT table_name, COUNT(*), SUM(questions_attempted), SUM(attempts), SUM(correct)
+        FROM learner_bank_rollup
+        {bank_where}
+        GROUP BY table_name
+    """, params
+
+
+def percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0
+
+
+def hardest_questions(cursor, table_name, limit, min_attempts):
+    """Questions with the highest error rate across all learners, from the
+    error_rate index (one bank's, when table_name is given)"""
+    where = "attempts >= %s"
+    params = (min_attempts,)
+    if table_name:
+        where = "table_name = %s AND " + where
+        params = (table_name,) + params
+    cursor.execute(f"""
+        SELECT table_name, question_id, learners, attempts, correct, error_rate
+        FROM question_rollup
+        WHERE {where}
+        ORDER BY error_rate DESC, attempts DESC
+        LIMIT %s
+    """, params + (limit,))
+    return [{
+        'tableName': row['table_name'],
+        'questionId': row['question_id'],
+        'learners': row['learners'],
+        'attempts': row['attempts'],
+        'correct': row['correct'],
+        'errorRate': round(row['error_rate'] * 100, 1)
+    } for row in cursor.fetchall()]
+
+
+def format_completion(bank, row):
+    """Completion of a catalog bank across learners, from its bank_rollup row (or None)"""
+    row = row or {'learners': 0, 'questions_attempted': 0, 'attempts': 0, 'correct': 0}
+    learners = int(row['learners'])
+    return {
+        'tableName': bank['name'],
+        'displayName': bank['displayName'],
+        'totalQuestions': bank['totalQuestions'],
+        'learners': learners,
+        'questionsAttempted': int(row['questions_attempted']),
+        'averageCompletion': percent(int(row['questions_attempted']), learners * bank['totalQuestions']),
+        'attempts': int(row['attempts']),
+        'correct': int(row['correct']),
+        'accuracy': percent(int(row['correct']), int(row['attempts']))
+    }
+
+
+def bank_completion(cursor, banks):
+    """Completion across learners for each catalog bank, one bank_rollup row each"""
+    cursor.execute("SELECT table_name, learners, questions_attempted, attempts, correct FROM bank_rollup")
+    rows = {row['table_name']: row for row in cursor.fetchall()}
+    return [format_completion(bank, rows.get(bank['name'])) for bank in banks]
+
+
+def single_bank_completion(cursor, bank):
+    """Completion across learners for one bank, plus how many attempted every question"""
+    cursor.execute("""
+        SELECT table_name, learners, questions_attempted, attempts, correct
+        FROM bank_rollup
+        WHERE table_name = %s
+    """, (bank['name'],))
+    completion = format_completion(bank, cursor.fetchone())
+    cursor.execute("""
+        SELECT COUNT(*) AS completed FROM learner_bank_rollup
+        WHERE table_name = %s AND questions_attempted >= %s
+    """, (bank['name'], max(bank['totalQuestions'], 1)))
+    completion['completedLearners'] = int(cursor.fetchone()['completed'])
+    return completion
+
+
+def top_learners(cursor, table_name, limit, order):
+    """The learners with the most correct answers (or questions attempted),
+    overall or in one bank, read from the rollup's ranking index"""
+    column = LEARNER_ORDER[order]
+    if table_name:
+        cursor.execute(f"""
+            SELECT user_id, questions_attempted, attempts, correct, last_attempt
+            FROM learner_bank_rollup
+            WHERE table_name = %s
+            ORDER BY {column} DESC
+            LIMIT %s
+        """, (table_name, limit))
+    else:
+        cursor.execute(f"""
+            SELECT user_id, banks, questions_attempted, attempts, correct, last_attempt
+            FROM learner_rollup
+            ORDER BY {column} DESC
+            LIMIT %s
+        """, (limit,))
+
+    learners = []
+    for row in cursor.fetchall():
+        learner = {
+            'userId': row['user_id'],
+            'questionsAttempted': row['questions_attempted'],
+            'attempts': row['attempts'],
+            'correct': row['correct'],
+            'accuracy': percent(row['correct'], row['attempts']),
+            'lastActivity': row['last_attempt'].isoformat() if row['last_attempt'] else None
+        }
+        if 'banks' in row:
+            learner['banks'] = row['banks']
+        learners.append(learner)
+    return learners
@@ -1,11 +1,40 @@
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, abort, jsonify, request, url_for
 from flask_cors import CORS
-import mysql.connector
 from mysql.connector import Error
+from datetime import datetime, timezone
+from functools import wraps
+import base64
+import hashlib
+import hmac
 import os
+import sys
+import threading
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+from analytics import (ANALYTICS_DDL, HARDEST_MIN_ATTEMPTS, LEARNER_ORDER, bank_completion, hardest_questions,
+                       rebuild_statements, reset_statements, single_bank_completion, top_learners)
+from bank_stats import BANK_STATS_DDL, format_bank_stats, load_bank_stats
+from catalog import BankCatalog, DEFAULT_SIGNAL_FILE
+from db_pool import ConnectionPool
+from export import export_lines, export_query
+from http_cache import conditional, init_compression
+from metrics import MetricsCollector
+from profiler import MAX_PROFILE_SECONDS, SamplingProfiler, format_collapsed
+from progress import bank_summary, user_summary
+from projection import compact_question, parse_projection, select_columns
+from quiz_sessions import (MAX_SEED_LENGTH, QUIZ_SESSION_ANSWERS_DDL, QUIZ_SESSIONS_DDL, answer_letters,
+                           correct_letters, create_session, load_session, save_answer, session_answers)
+from sampling import QuestionIdCache, new_seed, seeded_slice
+from scheduler import REVIEW_SCHEDULE_DDL, backfill_statement, format_review, next_due
+from search import search_banks
+from snapshots import SnapshotStore
+from stats_writer import WriteBehindBuffer, coalesce_attempts, write_attempts
+
+# The image store's tables are defined once, next to the scraper at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_optimizer import create_image_store
+
+# Routes are registered on this blueprint; create_app() builds the application
+api = Blueprint('api', __name__)
 
 # Database configuration
 DB_CONFIG = {
@@ -15,15 +44,331 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'exam_questions')
 }
 
+# 'tables' reads each test bank from its own table; 'normalized' reads every
+# bank from the shared banks/questions tables (see migrate_to_normalized.py)
+QUESTION_STORE = os.getenv('QUESTION_STORE', 'tables')
+
+# Largest page /api/search will return
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Most rows a cohort analytics list will return
+MAX_ANALYTICS_LIMIT = 100
+
+# Largest page /api/questions will return, and the default for cursor requests
+MAX_QUESTIONS_PAGE_SIZE = int(os.getenv('QUESTIONS_MAX_PAGE_SIZE', 100))
+DEFAULT_QUESTIONS_PAGE_SIZE = 10
+
+# Quiz sessions expire after this many hours; each holds at most this many questions
+QUIZ_SESSION_TTL_HOURS = int(os.getenv('QUIZ_SESSION_TTL_HOURS', 24))
+MAX_QUIZ_SESSION_QUESTIONS = int(os.getenv('QUIZ_SESSION_MAX_QUESTIONS', 1000))
+
+# gzip/brotli compression of large JSON responses (turn off if a proxy compresses)
+COMPRESS_RESPONSES = os.getenv('COMPRESS_RESPONSES', 'true').lower() == 'true'
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+
+# Optimized image formats (see image_optimizer.py) served to clients that
+# accept them, best first; empty serves every client the original
+VARIANT_TYPES = tuple(t.strip() for t in os.getenv('IMAGE_VARIANT_TYPES', 'image/avif,image/webp').split(',')
+                      if t.strip())
+
+# Request/database metrics on /metrics; statements slower than SLOW_QUERY_MS
+# are logged as JSON lines (0 disables). Under gunicorn, workers share their
+# counts through snapshot files in METRICS_DIR (see gunicorn.conf.py).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+
+# Directory of compiled, memory-mapped test bank snapshots (see
+# build_snapshots.py); when set, questions and images are read from them
+# instead of MySQL
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR') or None
+
+# /api/debug/profile is only available when this token is set
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN') or None
+
+# Connection pool configuration
+POOL_CONFIG = {
+    'size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'recycle': int(os.getenv('DB_POOL_RECYCLE', 3600)),
+    'pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+metrics = MetricsCollector(slow_query_ms=SLOW_QUERY_MS, metrics_dir=METRICS_DIR) if METRICS_ENABLED else None
+profiler = SamplingProfiler()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                hooks = {'on_query': metrics.on_query, 'on_acquire': metrics.on_acquire} if metrics else {}
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG, **hooks)
+    return _pool
+
+def reset_pool():
+    """Close the pool so the next get_pool() opens fresh connections (e.g. after fork)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.dispose()
+        _pool = None
+
 def get_db_connection():
-    """Create and return a database connection"""
+    """Borrow a connection from the pool; close() returns it to the pool"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        return get_pool().get_connection()
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
+# Test bank catalog, cached in memory and reloaded after CATALOG_TTL seconds
+# or when the scraper touches CATALOG_SIGNAL_FILE
+catalog = BankCatalog(
+    get_db_connection,
+    ttl=int(os.getenv('CATALOG_TTL', 300)),
+    signal_file=os.getenv('CATALOG_SIGNAL_FILE', DEFAULT_SIGNAL_FILE),
+    normalized=QUESTION_STORE == 'normalized'
+)
+
+# Cached question ids per bank for random sampling
+question_ids = QuestionIdCache(catalog)
+
+# Memory-mapped bank snapshots, swapped when the catalog reloads
+snapshots = SnapshotStore(SNAPSHOT_DIR, catalog) if SNAPSHOT_DIR else None
+
+# Optional write-behind buffer for /api/user-stats/batch
+stats_buffer = None
+if os.getenv('USER_STATS_WRITE_BEHIND', 'false').lower() == 'true':
+    stats_buffer = WriteBehindBuffer(
+        get_db_connection,
+        max_pending=int(os.getenv('USER_STATS_FLUSH_SIZE', 500)),
+        max_delay=float(os.getenv('USER_STATS_FLUSH_INTERVAL', 2.0)),
+        max_failures=int(os.getenv('USER_STATS_MAX_FAILURES', 5))
+    )
+
+def require_bank(view):
+    """Return 404 for unknown test banks, validated against the catalog"""
+    @wraps(view)
+    def wrapper(table_name, *args, **kwargs):
+        try:
+            if not catalog.exists(table_name):
+                return jsonify({'error': 'Test bank not found'}), 404
+        except Error as e:
+            print(f"Error loading test bank catalog: {e}")
+            return jsonify({'error': str(e)}), 500
+        return view(table_name, *args, **kwargs)
+    return wrapper
+
+def int_arg(name, default, minimum=None, maximum=None, values=None):
+    """Read an integer query parameter (or key of `values`), clamped to [minimum, maximum]"""
+    raw = (request.args if values is None else values).get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+    if minimum is not None:
+        value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+def image_columns(table_name):
+    """SQL for whether a question has a stored image, without reading the image itself"""
+    if not catalog.has_column(table_name, 'question_image_data'):
+        # Normalized store: images only live in question_images
+        return "question_image_hash IS NOT NULL AS has_image_data, question_image_hash"
+    if catalog.has_column(table_name, 'question_image_blob'):
+        return """
+            (question_image_hash IS NOT NULL OR question_image_data IS NOT NULL) AS has_image_data,
+            question_image_hash
+        """
+    # Table predates migrate_images.py
+    return "question_image_data IS NOT NULL AS has_image_data, NULL AS question_image_hash"
+
+def add_image_src(table_name, question, build_url=url_for):
+    """Replace the stored-image flag with a URL to the image endpoint"""
+    has_image_data = question.pop('has_image_data')
+    image_hash = question.pop('question_image_hash')
+    if has_image_data:
+        # The hash versions the URL, so browsers can cache it forever
+        question['question_image_src'] = build_url(
+            'api.get_question_image', table_name=table_name,
+            question_id=question['id'], v=image_hash
+        )
+
+def question_projection():
+    """Fields (view= / fields=) and encoding (format=compact) requested for questions"""
+    return parse_projection(request.args)
+
+def encode_question(table_name, question, compact, build_url=url_for):
+    """Finish a selected row for the response (build_url is the framework's url_for)"""
+    if 'has_image_data' in question:
+        add_image_src(table_name, question, build_url)
+    return compact_question(question) if compact else question
+
+def current_snapshot(table_name):
+    """The bank's snapshot if snapshots are enabled and it has an up-to-date one, else None"""
+    return snapshots.get(table_name) if snapshots else None
+
+def snapshot_page(snapshot, fields, random_order, seed, cursor_arg, start, limit):
+    """(rows, next cursor) for a get_questions page, read from a snapshot
+    with the same positions and cursors as the database path"""
+    next_cursor = None
+    if random_order:
+        position = cursor_arg if cursor_arg is not None else start - 1
+        ids = seeded_slice(snapshot.ids, seed, position, position + limit + 1)
+        if len(ids) > limit:
+            ids = ids[:limit]
+            next_cursor = position + limit
+        return snapshot.questions(ids, fields), next_cursor
+    
+    after_id = cursor_arg
+    if after_id is None:
+        after_id = 0
+        if start > 1:
+            if start - 2 < snapshot.count:
+                after_id = snapshot.ids[start - 2]
+            else:
+                limit = 0  # past the end of the bank
+    ids = snapshot.after(after_id, limit + 1) if limit else []
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = ids[-1]
+    return snapshot.questions(ids, fields), next_cursor
+
+def questions_by_id_query(table_name, ids, fields):
+    """(sql, params) selecting `fields` of some of a bank's questions by id"""
+    source = catalog.source(table_name)
+    bank_where, bank_params = source.scope()
+    placeholders = ', '.join(['%s'] * len(ids))
+    return (
+        f"SELECT {select_columns(fields, image_columns(table_name))} "
+        f"FROM {source.table} WHERE {bank_where} AND id IN ({placeholders})",
+        bank_params + tuple(ids)
+    )
+
+def questions_after_query(table_name, fields, after_id, limit):
+    """(sql, params) selecting `fields` of the `limit` questions following after_id"""
+    source = catalog.source(table_name)
+    bank_where, bank_params = source.scope()
+    return f"""
+        SELECT {select_columns(fields, image_columns(table_name))}
+        FROM {source.table}
+        WHERE {bank_where} AND id > %s
+        ORDER BY id
+        LIMIT %s
+    """, bank_params + (after_id, limit)
+
+def table_is_empty(cursor, table):
+    """True when `table` has no rows"""
+    cursor.execute(f"SELECT EXISTS(SELECT 1 FROM {table})")
+    return not cursor.fetchone()[0]
+
+def init_image_store_table():
+    """Create the shared question_images store and its variants table if they don't exist"""
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        create_image_store(cursor)
+        connection.commit()
+        return True
+    except Error as e:
+        print(f"Error creating question_images table: {e}")
+        return False
+    finally:
+        connection.close()
+
+def init_bank_stats_table():
+    """Create the materialized bank_stats table if it doesn't exist"""
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        cursor.execute(BANK_STATS_DDL)
+        connection.commit()
+        return True
+    except Error as e:
+        print(f"Error creating bank_stats table: {e}")
+        return False
+    finally:
+        connection.close()
+
+def init_review_schedule_table():
+    """Create the spaced-repetition review_schedule table if it doesn't exist,
+    seeding it from user_stats when it is empty and user_stats is not"""
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        cursor.execute(REVIEW_SCHEDULE_DDL)
+        if table_is_empty(cursor, 'review_schedule') and not table_is_empty(cursor, 'user_stats'):
+            cursor.execute(*backfill_statement())
+            print(f"Seeded review_schedule with {cursor.rowcount} reviews from user_stats")
+        connection.commit()
+        return True
+    except Error as e:
+        print(f"Error creating review_schedule table: {e}")
+        return False
+    finally:
+        connection.close()
+
+def init_analytics_tables():
+    """Create the cohort analytics rollup tables if they don't exist, building
+    them from user_stats when they are empty and user_stats is not"""
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        for ddl in ANALYTICS_DDL:
+            cursor.execute(ddl)
+        # Every recorded attempt leaves a learner_bank_rollup row
+        if table_is_empty(cursor, 'learner_bank_rollup') and not table_is_empty(cursor, 'user_stats'):
+            for sql, params in rebuild_statements():
+                cursor.execute(sql, params)
+            print("Built analytics rollups from user_stats")
+        connection.commit()
+        return True
+    except Error as e:
+        print(f"Error creating analytics tables: {e}")
+        return False
+    finally:
+        connection.close()
+
+def init_quiz_session_tables():
+    """Create the quiz_sessions and quiz_session_answers tables if they don't exist"""
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        cursor.execute(QUIZ_SESSIONS_DDL)
+        cursor.execute(QUIZ_SESSION_ANSWERS_DDL)
+        connection.commit()
+        return True
+    except Error as e:
+        print(f"Error creating quiz session tables: {e}")
+        return False
+    finally:
+        connection.close()
+
 def init_user_stats_table():
     """Create user_stats table if it doesn't exist"""
     connection = get_db_connection()
@@ -48,74 +393,120 @@ def init_user_stats_table():
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
         """)
         connection.commit()
-        cursor.close()
-        connection.close()
         return True
     except Error as e:
         print(f"Error creating user_stats table: {e}")
         return False
+    finally:
+        connection.close()
+
+def init_schema():
+    """Create the API's own tables; run once at startup, not per request"""
+    return all([init_user_stats_table(), init_image_store_table(), init_bank_stats_table(),
+                init_review_schedule_table(), init_quiz_session_tables(), init_analytics_tables()])
 
-@app.route('/api/health', methods=['GET'])
+def create_app(init_db=True):
+    """Build the Flask application.
+
+    Pass init_db=False when the schema is created elsewhere, e.g. once in
+    the gunicorn master (see gunicorn.conf.py) rather than in every worker.
+    """
+    app = Flask(__name__)
+    CORS(app, expose_headers=['X-Random-Seed', 'X-Next-Page', 'X-Next-Cursor'])  # Enable CORS for all routes
+    app.register_blueprint(api)
+    # Registered before compression so response sizes are measured compressed
+    if metrics:
+        metrics.init_app(app)
+    if COMPRESS_RESPONSES:
+        init_compression(app, min_size=COMPRESS_MIN_SIZE)
+    
+    if init_db:
+        print("Initializing database tables...")
+        if not init_schema():
+            print("Warning: could not initialize database tables")
+    return app
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    init_user_stats_table()
     return jsonify({'status': 'healthy', 'message': 'API is running'})
 
-@app.route('/api/test-banks', methods=['GET'])
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and database metrics in Prometheus text format"""
+    if not metrics:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/debug/profile', methods=['POST'])
+def run_profile():
+    """Sample this worker's thread stacks for a while and return them collapsed (for flame graphs)"""
+    if not PROFILER_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('X-Profiler-Token', ''), PROFILER_TOKEN):
+        return jsonify({'error': 'Invalid profiler token'}), 403
+    try:
+        seconds = int_arg('seconds', 10, minimum=1, maximum=MAX_PROFILE_SECONDS)
+        interval_ms = int_arg('interval_ms', 10, minimum=1, maximum=1000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        stacks = profiler.run(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(format_collapsed(stacks), mimetype='text/plain')
+
+@api.route('/api/test-banks', methods=['GET'])
+@conditional
 def get_test_banks():
-    """Get all available test banks (tables) from the database"""
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
+    """Get all available test banks from the catalog"""
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SHOW TABLES")
-        tables = cursor.fetchall()
-        
-        test_banks = []
-        for table in tables:
-            table_name = list(table.values())[0]
-            
-            # Skip the user_stats table
-            if table_name == 'user_stats':
-                continue
-            
-            # Get total questions count
-            cursor.execute(f"SELECT COUNT(*) as total FROM `{table_name}`")
-            count_result = cursor.fetchone()
-            total_questions = count_result['total'] if count_result else 0
-            
-            # Try to get topic_name, but handle if column doesn't exist
-            try:
-                cursor.execute(f"SELECT topic_name FROM `{table_name}` LIMIT 1")
-                topic_result = cursor.fetchone()
-                display_name = topic_result['topic_name'] if topic_result and topic_result.get('topic_name') else table_name.replace('_', ' ').title()
-            except Error:
-                # Column doesn't exist, use table name
-                display_name = table_name.replace('_', ' ').title()
-            
-            test_banks.append({
-                'name': table_name,
-                'displayName': display_name,
-                'totalQuestions': total_questions
-            })
-        
-        cursor.close()
-        connection.close()
-        
-        return jsonify(test_banks)
-    
+        return jsonify(catalog.banks())
     except Error as e:
         print(f"Error fetching test banks: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/questions/<table_name>', methods=['GET'])
+@api.route('/api/catalog/refresh', methods=['POST'])
+def refresh_catalog():
+    """Reload the test bank catalog (e.g. after a scrape on another host)"""
+    try:
+        banks = catalog.refresh()
+        return jsonify({'success': True, 'testBanks': len(banks)})
+    except Error as e:
+        print(f"Error refreshing catalog: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/questions/<table_name>', methods=['GET'])
+@conditional
+@require_bank
 def get_questions(table_name):
-    """Get questions from a specific test bank with optional range and randomization"""
-    start = int(request.args.get('start', 1))
-    end = int(request.args.get('end', 10))
+    """Get a page of questions from a test bank, in id or seeded random order.
+
+    Pages are selected with start/end (1-based positions) or with the
+    cursor returned in X-Next-Cursor plus limit; either way at most
+    MAX_QUESTIONS_PAGE_SIZE questions are returned. view=/fields= choose the
+    columns read and format=compact the encoding (see projection.py).
+    """
+    try:
+        cursor_arg = int_arg('cursor', None, minimum=0)
+        if cursor_arg is None:
+            start = int_arg('start', 1, minimum=1)
+            limit = int_arg('end', 10) - start + 1
+        else:
+            start = None
+            limit = int_arg('limit', DEFAULT_QUESTIONS_PAGE_SIZE)
+        fields, compact = question_projection()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(0, min(limit, MAX_QUESTIONS_PAGE_SIZE))
     random_order = request.args.get('random', 'false').lower() == 'true'
+    seed = request.args.get('seed') or new_seed()
+    
+    snapshot = current_snapshot(table_name)
+    if snapshot is not None:
+        questions, next_cursor = snapshot_page(snapshot, fields, random_order, seed, cursor_arg, start, limit)
+        return questions_response(table_name, questions, compact, seed if random_order else None, next_cursor)
     
     connection = get_db_connection()
     if not connection:
@@ -124,45 +515,79 @@ def get_questions(table_name):
     try:
         cursor = connection.cursor(dictionary=True)
         
-        # Validate table name to prevent SQL injection
-        cursor.execute("SHOW TABLES LIKE %s", (table_name,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Test bank not found'}), 404
-        
-        # Build query with optional random ordering
-        order_clause = "ORDER BY RAND()" if random_order else "ORDER BY id"
-        
-        query = f"""
-            SELECT id, topic_name, question_text, question_image_url, question_image_data, 
-                   question_image_type, answer_a, answer_b, answer_c, answer_d, answer_e, 
-                   answer_f, correct_answers, page_number
-            FROM `{table_name}`
-            {order_clause}
-            LIMIT %s OFFSET %s
-        """
-        
-        cursor.execute(query, (end - start + 1, start - 1))
-        questions = cursor.fetchall()
-        
-        # Convert image data if present
-        for question in questions:
-            if question['question_image_data']:
-                # Image is already base64 encoded in the database
-                question['question_image_base64'] = question['question_image_data']
-            del question['question_image_data']  # Remove the large data field
-        
-        cursor.close()
-        connection.close()
+        next_cursor = None
+        if random_order:
+            # The cursor is a position in the seeded shuffle of the cached id
+            # list; fetch just those rows by primary key (no ORDER BY RAND())
+            position = cursor_arg if cursor_arg is not None else start - 1
+            ids = question_ids.sample(table_name, cursor, seed, position, position + limit + 1)
+            if len(ids) > limit:
+                ids = ids[:limit]
+                next_cursor = position + limit
+            questions = []
+            if ids:
+                cursor.execute(*questions_by_id_query(table_name, ids, fields))
+                rows = {row['id']: row for row in cursor.fetchall()}
+                questions = [rows[question_id] for question_id in ids if question_id in rows]
+        else:
+            # The cursor is the last id already seen. A start position is
+            # turned into one with the cached id list, so deep pages seek on
+            # the primary key instead of scanning past an OFFSET
+            after_id = cursor_arg
+            if after_id is None:
+                after_id = 0
+                if start > 1:
+                    ids = question_ids.get(table_name, cursor)
+                    if start - 2 < len(ids):
+                        after_id = ids[start - 2]
+                    else:
+                        limit = 0  # past the end of the bank
+            
+            questions = []
+            if limit:
+                cursor.execute(*questions_after_query(table_name, fields, after_id, limit + 1))
+                questions = cursor.fetchall()
+            if len(questions) > limit:
+                questions = questions[:limit]
+                next_cursor = questions[-1]['id']
         
-        return jsonify(questions)
+        return questions_response(table_name, questions, compact, seed if random_order else None, next_cursor)
     
     except Error as e:
         print(f"Error fetching questions: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+def questions_response(table_name, questions, compact, seed, next_cursor):
+    """JSON page of questions; seed is set for random order"""
+    # Images are served separately by /api/image
+    response = jsonify([encode_question(table_name, question, compact) for question in questions])
+    if seed:
+        # Pass this back as ?seed= to page through the same shuffled order
+        response.headers['X-Random-Seed'] = seed
+    if next_cursor is not None:
+        # Pass this back as ?cursor= (with the same random/seed) for the next page
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
 
-@app.route('/api/question/<table_name>/<int:question_id>', methods=['GET'])
+@api.route('/api/question/<table_name>/<int:question_id>', methods=['GET'])
+@conditional
+@require_bank
 def get_single_question(table_name, question_id):
     """Get a single question by ID"""
+    try:
+        fields, compact = question_projection()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    snapshot = current_snapshot(table_name)
+    if snapshot is not None:
+        questions = snapshot.questions([question_id], fields)
+        if not questions:
+            return jsonify({'error': 'Question not found'}), 404
+        return jsonify(encode_question(table_name, questions[0], compact))
+    
     connection = get_db_connection()
     if not connection:
         return jsonify({'error': 'Database connection failed'}), 500
@@ -170,42 +595,30 @@ def get_single_question(table_name, question_id):
     try:
         cursor = connection.cursor(dictionary=True)
         
-        # Validate table name
-        cursor.execute("SHOW TABLES LIKE %s", (table_name,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Test bank not found'}), 404
-        
-        query = f"""
-            SELECT id, topic_name, question_text, question_image_url, question_image_data,
-                   question_image_type, answer_a, answer_b, answer_c, answer_d, answer_e,
-                   answer_f, correct_answers, page_number
-            FROM `{table_name}`
-            WHERE id = %s
-        """
-        
-        cursor.execute(query, (question_id,))
+        cursor.execute(*questions_by_id_query(table_name, [question_id], fields))
         question = cursor.fetchone()
         
         if not question:
             return jsonify({'error': 'Question not found'}), 404
         
-        # Convert image data if present
-        if question['question_image_data']:
-            question['question_image_base64'] = question['question_image_data']
-        del question['question_image_data']
-        
-        cursor.close()
-        connection.close()
-        
-        return jsonify(question)
+        return jsonify(encode_question(table_name, question, compact))
     
     except Error as e:
         print(f"Error fetching question: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
 
-@app.route('/api/stats/<table_name>', methods=['GET'])
-def get_table_stats(table_name):
-    """Get statistics for a specific test bank"""
+@api.route('/api/image/<table_name>/<int:question_id>', methods=['GET'])
+@require_bank
+def get_question_image(table_name, question_id):
+    """Serve a question's image as raw bytes with a strong ETag"""
+    snapshot = current_snapshot(table_name)
+    if snapshot is not None:
+        return snapshot_image(snapshot, question_id)
+    
+    source = catalog.source(table_name)
+    
     connection = get_db_connection()
     if not connection:
         return jsonify({'error': 'Database connection failed'}), 500
@@ -213,93 +626,486 @@ def get_table_stats(table_name):
     try:
         cursor = connection.cursor(dictionary=True)
         
-        # Validate table name
-        cursor.execute("SHOW TABLES LIKE %s", (table_name,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Test bank not found'}), 404
-        
-        # Get overall statistics
-        cursor.execute(f"""
-            SELECT 
-                COUNT(*) as total_questions,
-                SUM(CASE WHEN question_image_url IS NOT NULL OR question_image_data IS NOT NULL THEN 1 ELSE 0 END) as questions_with_images,
-                SUM(CASE WHEN correct_answers LIKE '%,%' THEN 1 ELSE 0 END) as multiple_answer_questions
-            FROM `{table_name}`
-        """)
+        accepted = variant_types(request.accept_mimetypes)
         
-        stats = cursor.fetchone()
+        # Answer conditional GETs from the stored hash without reading the image
+        if source.has_column('question_image_hash') and request.if_none_match:
+            cursor.execute(*image_hash_query(source, question_id, accepted))
+            row = cursor.fetchone()
+            if row and row['question_image_hash']:
+                etag = image_etag(row['question_image_hash'], row['variant_type'])
+                if etag in request.if_none_match:
+                    return image_not_modified(row['question_image_hash'], etag)
         
-        # Get answer distribution
-        cursor.execute(f"""
-            SELECT correct_answers, COUNT(*) as count
-            FROM `{table_name}`
-            GROUP BY correct_answers
-            ORDER BY count DESC
-        """)
+        cursor.execute(*image_query(source, question_id, accepted))
+        row = cursor.fetchone()
+        image, image_hash = decode_image(row)
+        if image is None:
+            return jsonify({'error': 'Image not found'}), 404
         
-        answer_distribution = cursor.fetchall()
+        etag = image_etag(image_hash, row['variant_type'])
+        if etag in request.if_none_match:
+            return image_not_modified(image_hash, etag)
         
-        cursor.close()
+        response = Response(image, mimetype=row['variant_type'] or row['question_image_type']
+                            or 'application/octet-stream')
+        response.set_etag(etag)
+        set_image_cache_headers(response, image_hash)
+        return response
+    
+    except (Error, ValueError) as e:
+        print(f"Error fetching image: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
         connection.close()
+
+def variant_types(accept):
+    """Optimized image formats a client lists explicitly in its Accept header,
+    best first; */* alone doesn't count, as not every browser decodes them"""
+    return [mime_type for mime_type in VARIANT_TYPES
+            if any(value == mime_type and quality > 0 for value, quality in accept)]
+
+def image_etag(image_hash, variant_type=None):
+    """Each encoding of an image is a different representation with its own ETag"""
+    return f"{image_hash}-{variant_type.split('/')[-1]}" if variant_type else image_hash
+
+def variant_clauses(variant_types):
+    """(join, order, join params, order params) picking a question's best
+    stored variant among variant_types"""
+    if not variant_types:
+        return '', '', (), ()
+    marks = ', '.join(['%s'] * len(variant_types))
+    return (f"""LEFT JOIN question_image_variants v ON v.hash = q.question_image_hash
+                AND v.mime_type IN ({marks}) AND v.data IS NOT NULL""",
+            f"ORDER BY FIELD(v.mime_type, {marks}) LIMIT 1", tuple(variant_types), tuple(variant_types))
+
+def snapshot_image(snapshot, question_id):
+    """get_question_image's response, read from a snapshot"""
+    found = snapshot.image(question_id, variant_types(request.accept_mimetypes))
+    if found is None:
+        return jsonify({'error': 'Image not found'}), 404
+    image, image_hash, variant_type, mime_type = found
+    
+    etag = image_etag(image_hash, variant_type)
+    if etag in request.if_none_match:
+        return image_not_modified(image_hash, etag)
+    
+    response = Response(image, mimetype=variant_type or mime_type or 'application/octet-stream')
+    response.set_etag(etag)
+    set_image_cache_headers(response, image_hash)
+    return response
+
+def image_hash_query(source, question_id, variant_types=()):
+    """(sql, params) reading just a question's stored image hash and the
+    variant it would be served as"""
+    bank_where, bank_params = source.scope('q')
+    join, order, join_params, order_params = variant_clauses(variant_types)
+    variant = 'v.mime_type' if join else 'NULL'
+    return f"""
+        SELECT q.question_image_hash, {variant} AS variant_type
+        FROM {source.table} q
+        {join}
+        WHERE {bank_where} AND q.id = %s
+        {order}
+    """, join_params + bank_params + (question_id,) + order_params
+
+def image_query(source, question_id, variant_types=()):
+    """(sql, params) reading a question's image from wherever it is stored,
+    preferring an optimized variant among variant_types"""
+    bank_where, bank_params = source.scope('q')
+    # Images live in the shared question_images store, or in tables not
+    # yet converted by migrate_images.py / dedupe_questions.py, in the row itself
+    data = 'q.question_image_data' if source.has_column('question_image_data') else 'NULL'
+    blob = 'q.question_image_blob' if source.has_column('question_image_blob') else 'NULL'
+    if source.has_column('question_image_hash'):
+        join, order, join_params, order_params = variant_clauses(variant_types)
+        if not join:
+            return f"""
+                SELECT {data} AS question_image_data, q.question_image_type,
+                       {blob} AS question_image_blob, q.question_image_hash, i.data AS stored_image,
+                       NULL AS variant_type
+                FROM {source.table} q
+                LEFT JOIN question_images i ON i.hash = q.question_image_hash
+                WHERE {bank_where} AND q.id = %s
+            """, bank_params + (question_id,)
+        # The original is only read when no variant matched
+        return f"""
+            SELECT {data} AS question_image_data, q.question_image_type,
+                   {blob} AS question_image_blob, q.question_image_hash,
+                   COALESCE(v.data, i.data) AS stored_image, v.mime_type AS variant_type
+            FROM {source.table} q
+            {join}
+            LEFT JOIN question_images i ON i.hash = q.question_image_hash AND v.hash IS NULL
+            WHERE {bank_where} AND q.id = %s
+            {order}
+        """, join_params + bank_params + (question_id,) + order_params
+    return f"""
+        SELECT {data} AS question_image_data, q.question_image_type, NULL AS question_image_blob,
+               NULL AS question_image_hash, NULL AS stored_image, NULL AS variant_type
+        FROM {source.table} q
+        WHERE {bank_where} AND q.id = %s
+    """, bank_params + (question_id,)
+
+def decode_image(row):
+    """(image bytes, hash) from an image_query() row, or (None, None) if there is no image"""
+    if not row or not (row['stored_image'] or row['question_image_blob'] or row['question_image_data']):
+        return None, None
+    if row['stored_image'] is not None:
+        image = bytes(row['stored_image'])
+    elif row['question_image_blob'] is not None:
+        image = bytes(row['question_image_blob'])
+    else:
+        # Not yet migrated to binary storage
+        image = base64.b64decode(row['question_image_data'])
+    return image, row['question_image_hash'] or hashlib.sha256(image).hexdigest()
+
+def set_image_cache_headers(response, image_hash):
+    """Versioned image URLs (?v=<hash>) never change; others must revalidate"""
+    if request.args.get('v') == image_hash:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    # The format served depends on what the client accepts
+    response.vary.add('Accept')
+
+def image_not_modified(image_hash, etag=None):
+    response = Response(status=304)
+    response.set_etag(etag or image_hash)
+    set_image_cache_headers(response, image_hash)
+    return response
+
+@api.route('/api/export/<table_name>', methods=['GET'])
+@require_bank
+def export_questions(table_name):
+    """Stream a whole test bank as NDJSON, one question per line"""
+    include_images = request.args.get('images', 'true').lower() == 'true'
+    query, params = export_query(catalog.source(table_name), include_images)
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        # Unbuffered: rows are read from the server as the response is written,
+        # so memory use doesn't grow with the bank
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(query, params)
+    except Error as e:
+        print(f"Error exporting questions: {e}")
+        connection.close()
+        return jsonify({'error': str(e)}), 500
+    
+    # export_lines closes the connection when the stream ends
+    response = Response(export_lines(connection, cursor), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = f'attachment; filename="{table_name}.ndjson"'
+    return response
+
+@api.route('/api/stats/<table_name>', methods=['GET'])
+@require_bank
+def get_table_stats(table_name):
+    """Get statistics for a specific test bank (precomputed in bank_stats)"""
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        row = load_bank_stats(connection, catalog.source(table_name))
         
-        return jsonify({
-            'stats': stats,
-            'answer_distribution': answer_distribution
-        })
+        response = jsonify(format_bank_stats(row))
+        response.add_etag(weak=True)
+        response.last_modified = row['updated_at'].replace(tzinfo=timezone.utc)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     
     except Error as e:
         print(f"Error fetching stats: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/search', methods=['GET'])
+def search_all_banks():
+    """Search questions across every test bank"""
+    try:
+        tables = [bank['name'] for bank in catalog.banks()]
+    except Error as e:
+        print(f"Error loading test bank catalog: {e}")
+        return jsonify({'error': str(e)}), 500
+    return run_search(tables)
 
-@app.route('/api/search/<table_name>', methods=['GET'])
+@api.route('/api/search/<table_name>', methods=['GET'])
+@require_bank
 def search_questions(table_name):
     """Search questions by keyword"""
-    keyword = request.args.get('q', '')
+    return run_search([table_name])
+
+def run_search(table_names):
+    """Relevance-ranked, paginated search over the given banks"""
+    keyword = request.args.get('q', '').strip()
     
     if not keyword:
         return jsonify({'error': 'Search query required'}), 400
     
+    try:
+        page = int_arg('page', 1, minimum=1)
+        per_page = int_arg('per_page', 20, minimum=1, maximum=MAX_SEARCH_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Banks without the FULLTEXT index (see add_search_index.py) use LIKE
+    sources = [catalog.source(name) for name in table_names]
+    
     connection = get_db_connection()
     if not connection:
         return jsonify({'error': 'Database connection failed'}), 500
     
     try:
         cursor = connection.cursor(dictionary=True)
+        results, has_more = search_banks(cursor, sources, keyword, page, per_page)
         
-        # Validate table name
-        cursor.execute("SHOW TABLES LIKE %s", (table_name,))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Test bank not found'}), 404
-        
-        query = f"""
-            SELECT id, topic_name, question_text, answer_a, answer_b, answer_c, 
-                   answer_d, answer_e, answer_f, correct_answers
-            FROM `{table_name}`
-            WHERE question_text LIKE %s 
-               OR answer_a LIKE %s 
-               OR answer_b LIKE %s 
-               OR answer_c LIKE %s 
-               OR answer_d LIKE %s
-            LIMIT 50
-        """
+        response = jsonify(results)
+        if has_more:
+            response.headers['X-Next-Page'] = str(page + 1)
+        return response
+    
+    except Error as e:
+        print(f"Error searching questions: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+def session_rows(cursor, table_name, ids, fields):
+    """Question rows for a quiz session keyed by id, always with correct_answers"""
+    if not ids:
+        return {}
+    cursor.execute(*questions_by_id_query(table_name, ids, session_fields(fields)))
+    return {row['id']: row for row in cursor.fetchall()}
+
+def session_fields(fields):
+    """Quiz sessions always read correct_answers, to grade and count answers"""
+    return fields if 'correct_answers' in fields else fields + ('correct_answers',)
+
+def session_question(table_name, row, compact, result=None, build_url=url_for):
+    """A quiz session question; its correct answers are only included once answered"""
+    question = dict(row)
+    correct = correct_letters(question.pop('correct_answers'))
+    question['answer_count'] = len(correct)
+    question = encode_question(table_name, question, compact, build_url)
+    if result:
+        question['result'] = dict(result, correctAnswers=correct)
+    return question
+
+@api.route('/api/quiz-sessions/<table_name>', methods=['POST'])
+@require_bank
+def create_quiz_session(table_name):
+    """Start a quiz: freeze its question order and return the first batch.
+    
+    Takes start/end/random/seed like /api/questions, plus wrong_threshold to
+    keep only questions answered wrongly at least that many times.
+    """
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON object required'}), 400
+    
+    user_id = payload.get('user_id', 'default_user')
+    random_order = bool(payload.get('random', False))
+    seed = str(payload.get('seed') or new_seed())
+    if len(seed) > MAX_SEED_LENGTH:
+        return jsonify({'error': f'seed must be at most {MAX_SEED_LENGTH} characters'}), 400
+    try:
+        start = int_arg('start', 1, minimum=1, values=payload)
+        end = int_arg('end', start + MAX_QUIZ_SESSION_QUESTIONS - 1,
+                      maximum=start + MAX_QUIZ_SESSION_QUESTIONS - 1, values=payload)
+        wrong_threshold = int_arg('wrong_threshold', None, minimum=1, values=payload)
+        batch_size = int_arg('batch_size', DEFAULT_QUESTIONS_PAGE_SIZE, minimum=1,
+                             maximum=MAX_QUESTIONS_PAGE_SIZE, values=payload)
+        fields, compact = question_projection()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
         
-        search_term = f"%{keyword}%"
-        cursor.execute(query, (search_term, search_term, search_term, search_term, search_term))
-        results = cursor.fetchall()
+        if random_order:
+            ids = question_ids.sample(table_name, cursor, seed, start - 1, end)
+        else:
+            ids = question_ids.get(table_name, cursor)[start - 1:end]
         
-        cursor.close()
+        if wrong_threshold is not None:
+            cursor.execute("""
+                SELECT question_id FROM user_stats
+                WHERE user_id = %s AND table_name = %s AND attempts - correct >= %s
+            """, (user_id, table_name, wrong_threshold))
+            wrong = {row['question_id'] for row in cursor.fetchall()}
+            ids = [question_id for question_id in ids if question_id in wrong]
+        
+        session_id = create_session(cursor, user_id, table_name, ids,
+                                    seed if random_order else None, QUIZ_SESSION_TTL_HOURS)
+        rows = session_rows(cursor, table_name, ids[:batch_size], fields)
+        connection.commit()
+        
+        return jsonify({
+            'sessionId': session_id,
+            'total': len(ids),
+            'seed': seed if random_order else None,
+            'questions': [session_question(table_name, rows[question_id], compact)
+                          for question_id in ids[:batch_size] if question_id in rows]
+        }), 201
+    
+    except Error as e:
+        print(f"Error creating quiz session: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
         connection.close()
+
+@api.route('/api/quiz-sessions/<table_name>/<session_id>', methods=['GET'])
+@require_bank
+def get_quiz_session(table_name, session_id):
+    """Progress of a quiz session"""
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        session = load_session(cursor, session_id, table_name, QUIZ_SESSION_TTL_HOURS)
+        if not session:
+            return jsonify({'error': 'Quiz session not found'}), 404
         
-        return jsonify(results)
+        answers = session_answers(cursor, session_id)
+        return jsonify({
+            'sessionId': session_id,
+            'total': len(session['question_ids']),
+            'seed': session['seed'],
+            'answered': len(answers),
+            'correct': sum(1 for answer in answers.values() if answer['isCorrect'])
+        })
     
     except Error as e:
-        print(f"Error searching questions: {e}")
+        print(f"Error fetching quiz session: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/quiz-sessions/<table_name>/<session_id>/questions', methods=['GET'])
+@require_bank
+def get_quiz_session_questions(table_name, session_id):
+    """A batch of a session's questions (offset/limit), for prefetching.
+    
+    Questions already answered in the session come with their result.
+    """
+    try:
+        offset = int_arg('offset', 0, minimum=0)
+        limit = int_arg('limit', DEFAULT_QUESTIONS_PAGE_SIZE, minimum=1, maximum=MAX_QUESTIONS_PAGE_SIZE)
+        fields, compact = question_projection()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        session = load_session(cursor, session_id, table_name, QUIZ_SESSION_TTL_HOURS)
+        if not session:
+            return jsonify({'error': 'Quiz session not found'}), 404
+        
+        ids = session['question_ids'][offset:offset + limit]
+        rows = session_rows(cursor, table_name, ids, fields)
+        answers = session_answers(cursor, session_id)
+        
+        return jsonify([session_question(table_name, rows[question_id], compact, answers.get(question_id))
+                        for question_id in ids if question_id in rows])
+    
+    except Error as e:
+        print(f"Error fetching quiz session questions: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
 
-@app.route('/api/user-stats/<table_name>', methods=['GET'])
+@api.route('/api/quiz-sessions/<table_name>/<session_id>/answers', methods=['POST'])
+@require_bank
+def submit_quiz_answer(table_name, session_id):
+    """Grade an answer, record the attempt and return the next question in one round trip"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON object required'}), 400
+    
+    question_id = payload.get('question_id')
+    if not isinstance(question_id, int) or isinstance(question_id, bool):
+        return jsonify({'error': 'question_id must be an integer'}), 400
+    try:
+        letters = answer_letters(payload.get('answer'))
+        fields, compact = question_projection()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        session = load_session(cursor, session_id, table_name, QUIZ_SESSION_TTL_HOURS)
+        if not session:
+            return jsonify({'error': 'Quiz session not found'}), 404
+        
+        ids = session['question_ids']
+        if question_id not in ids:
+            return jsonify({'error': 'Question is not part of this quiz session'}), 400
+        position = ids.index(question_id) + 1
+        next_id = ids[position] if position < len(ids) else None
+        
+        # The answered question and the next one in a single query
+        rows = session_rows(cursor, table_name, [question_id] + ([next_id] if next_id else []), fields)
+        if question_id not in rows:
+            return jsonify({'error': 'Question not found'}), 404
+        
+        correct = correct_letters(rows[question_id]['correct_answers'])
+        is_correct = letters == correct
+        save_answer(cursor, session_id, question_id, letters, is_correct)
+        
+        counts = {(session['user_id'], table_name, question_id): [1, 1 if is_correct else 0]}
+        if stats_buffer:
+            connection.commit()
+            stats_buffer.add(counts)
+        else:
+            # Commits the session answer together with the attempt
+            write_attempts(connection, counts)
+        
+        return jsonify({
+            'questionId': question_id,
+            'isCorrect': is_correct,
+            'correctAnswers': correct,
+            'position': position,
+            'next': session_question(table_name, rows[next_id], compact) if next_id in rows else None
+        })
+    
+    except Error as e:
+        print(f"Error submitting quiz answer: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/user-stats/<table_name>', methods=['GET'])
 def get_user_stats(table_name):
-    """Get user statistics for a specific test bank"""
+    """Get user statistics for a specific test bank.
+    
+    With since=<lastAttempt> only questions attempted at or after that time
+    are returned, so clients can merge changes into what they already have.
+    """
     user_id = request.args.get('user_id', 'default_user')
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({'error': "'since' must be an ISO 8601 timestamp"}), 400
     
     connection = get_db_connection()
     if not connection:
@@ -313,8 +1119,13 @@ def get_user_stats(table_name):
             FROM user_stats
             WHERE user_id = %s AND table_name = %s
         """
+        params = (user_id, table_name)
+        if since:
+            # >= because last_attempt has one-second resolution
+            query += " AND last_attempt >= %s"
+            params += (since,)
         
-        cursor.execute(query, (user_id, table_name))
+        cursor.execute(query, params)
         results = cursor.fetchall()
         
         # Convert to dictionary keyed by question_id
@@ -326,16 +1137,53 @@ def get_user_stats(table_name):
                 'lastAttempt': row['last_attempt'].isoformat() if row['last_attempt'] else None
             }
         
-        cursor.close()
-        connection.close()
-        
         return jsonify(stats)
     
     except Error as e:
         print(f"Error fetching user stats: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/user-stats/summary', methods=['GET'])
+def get_user_summary():
+    """Progress totals for a user in every test bank they have attempted"""
+    user_id = request.args.get('user_id', 'default_user')
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        return jsonify(user_summary(cursor, user_id))
+    
+    except Error as e:
+        print(f"Error fetching user summary: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
 
-@app.route('/api/user-stats/<table_name>/<int:question_id>', methods=['POST'])
+@api.route('/api/user-stats/<table_name>/summary', methods=['GET'])
+def get_user_bank_summary(table_name):
+    """Progress totals for a user in one test bank"""
+    user_id = request.args.get('user_id', 'default_user')
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        return jsonify(bank_summary(cursor, user_id, table_name))
+    
+    except Error as e:
+        print(f"Error fetching user summary: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/user-stats/<table_name>/<int:question_id>', methods=['POST'])
 def update_user_stats(table_name, question_id):
     """Update user statistics for a specific question"""
     user_id = request.json.get('user_id', 'default_user')
@@ -346,23 +1194,12 @@ def update_user_stats(table_name, question_id):
         return jsonify({'error': 'Database connection failed'}), 500
     
     try:
-        cursor = connection.cursor(dictionary=True)
-        
-        # Insert or update statistics
-        query = """
-            INSERT INTO user_stats (user_id, table_name, question_id, attempts, correct)
-            VALUES (%s, %s, %s, 1, %s)
-            ON DUPLICATE KEY UPDATE
-                attempts = attempts + 1,
-                correct = correct + %s,
-                last_attempt = CURRENT_TIMESTAMP
-        """
-        
+        # Insert or update statistics, with the review schedule and analytics rollups
         correct_increment = 1 if is_correct else 0
-        cursor.execute(query, (user_id, table_name, question_id, correct_increment, correct_increment))
-        connection.commit()
+        write_attempts(connection, {(user_id, table_name, question_id): [1, correct_increment]})
         
         # Get updated stats
+        cursor = connection.cursor(dictionary=True)
         cursor.execute("""
             SELECT attempts, correct, last_attempt
             FROM user_stats
@@ -371,9 +1208,6 @@ def update_user_stats(table_name, question_id):
         
         result = cursor.fetchone()
         
-        cursor.close()
-        connection.close()
-        
         if result:
             return jsonify({
                 'success': True,
@@ -387,8 +1221,172 @@ def update_user_stats(table_name, question_id):
     except Error as e:
         print(f"Error updating user stats: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/user-stats/batch', methods=['POST'])
+def batch_update_user_stats():
+    """Record many question attempts in one request and one transaction"""
+    payload = request.get_json(silent=True)
+    if isinstance(payload, list):
+        payload = {'attempts': payload}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON body required'}), 400
+    
+    try:
+        events = payload.get('attempts', [])
+        counts = coalesce_attempts(events, payload.get('user_id', 'default_user'), catalog.exists)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Error as e:
+        print(f"Error loading test bank catalog: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    if stats_buffer:
+        stats_buffer.add(counts)
+        return jsonify({'success': True, 'queued': len(events)}), 202
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        write_attempts(connection, counts)
+        return jsonify({
+            'success': True,
+            'recorded': len(events),
+            'questions': len(counts)
+        })
+    
+    except Error as e:
+        print(f"Error recording user stats batch: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/review/<table_name>/next-due', methods=['GET'])
+@require_bank
+def get_next_due(table_name):
+    """The questions a user should review next, most overdue first.
+    
+    Accepts the same view=/fields=/format= options as /api/questions; each
+    question also carries its review schedule under 'review'.
+    """
+    user_id = request.args.get('user_id', 'default_user')
+    try:
+        limit = int_arg('limit', DEFAULT_QUESTIONS_PAGE_SIZE, minimum=1, maximum=MAX_QUESTIONS_PAGE_SIZE)
+        fields, compact = question_projection()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        schedule = next_due(cursor, user_id, table_name, limit)
+        
+        questions = []
+        if schedule:
+            ids = [row['question_id'] for row in schedule]
+            cursor.execute(*questions_by_id_query(table_name, ids, fields))
+            rows = {row['id']: row for row in cursor.fetchall()}
+            # Keep due order; skip questions deleted from the bank since
+            for entry in schedule:
+                question = rows.get(entry['question_id'])
+                if question:
+                    question = encode_question(table_name, question, compact)
+                    question['review'] = format_review(entry)
+                    questions.append(question)
+        
+        return jsonify(questions)
+    
+    except Error as e:
+        print(f"Error fetching due questions: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/analytics/hardest-questions', methods=['GET'])
+@conditional
+def get_hardest_questions():
+    """Questions with the highest error rate across all learners and banks"""
+    return run_hardest_questions(None)
+
+@api.route('/api/analytics/hardest-questions/<table_name>', methods=['GET'])
+@conditional
+@require_bank
+def get_bank_hardest_questions(table_name):
+    """Questions with the highest error rate across all learners in one bank"""
+    return run_hardest_questions(table_name)
+
+def run_hardest_questions(table_name):
+    try:
+        limit = int_arg('limit', 20, minimum=1, maximum=MAX_ANALYTICS_LIMIT)
+        min_attempts = int_arg('min_attempts', HARDEST_MIN_ATTEMPTS, minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return read_rollups(hardest_questions, table_name, limit, min_attempts)
+
+@api.route('/api/analytics/completion', methods=['GET'])
+@conditional
+def get_bank_completion():
+    """How far learners have got through each test bank"""
+    try:
+        banks = catalog.banks()
+    except Error as e:
+        print(f"Error loading test bank catalog: {e}")
+        return jsonify({'error': str(e)}), 500
+    return read_rollups(bank_completion, banks)
+
+@api.route('/api/analytics/completion/<table_name>', methods=['GET'])
+@conditional
+@require_bank
+def get_single_bank_completion(table_name):
+    """How far learners have got through one test bank"""
+    return read_rollups(single_bank_completion, catalog.get(table_name))
+
+@api.route('/api/analytics/top-learners', methods=['GET'])
+@conditional
+def get_top_learners():
+    """Learners with the most correct answers across all banks"""
+    return run_top_learners(None)
+
+@api.route('/api/analytics/top-learners/<table_name>', methods=['GET'])
+@conditional
+@require_bank
+def get_bank_top_learners(table_name):
+    """Learners with the most correct answers in one bank"""
+    return run_top_learners(table_name)
+
+def run_top_learners(table_name):
+    order = request.args.get('by', 'correct')
+    if order not in LEARNER_ORDER:
+        return jsonify({'error': f"'by' must be one of {', '.join(LEARNER_ORDER)}"}), 400
+    try:
+        limit = int_arg('limit', 20, minimum=1, maximum=MAX_ANALYTICS_LIMIT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return read_rollups(top_learners, table_name, limit, order)
 
-@app.route('/api/user-stats', methods=['DELETE'])
+def read_rollups(read, *args):
+    """JSON response of read(cursor, *args), a query over the analytics rollups"""
+    connection = get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        return jsonify(read(cursor, *args))
+    
+    except Error as e:
+        print(f"Error reading analytics rollups: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
+
+@api.route('/api/user-stats', methods=['DELETE'])
 def delete_all_user_stats():
     """Delete all user statistics (reset progress)"""
     user_id = request.args.get('user_id', 'default_user')
@@ -399,12 +1397,12 @@ def delete_all_user_stats():
     
     try:
         cursor = connection.cursor()
+        for sql, params in reset_statements(user_id):
+            cursor.execute(sql, params)
         cursor.execute("DELETE FROM user_stats WHERE user_id = %s", (user_id,))
-        connection.commit()
         deleted_count = cursor.rowcount
-        
-        cursor.close()
-        connection.close()
+        cursor.execute("DELETE FROM review_schedule WHERE user_id = %s", (user_id,))
+        connection.commit()
         
         return jsonify({
             'success': True,
@@ -414,8 +1412,10 @@ def delete_all_user_stats():
     except Error as e:
         print(f"Error deleting user stats: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
 
-@app.route('/api/user-stats/<table_name>', methods=['DELETE'])
+@api.route('/api/user-stats/<table_name>', methods=['DELETE'])
 def delete_bank_user_stats(table_name):
     """Delete user statistics for a specific test bank"""
     user_id = request.args.get('user_id', 'default_user')
@@ -426,15 +1426,18 @@ def delete_bank_user_stats(table_name):
     
     try:
         cursor = connection.cursor()
+        for sql, params in reset_statements(user_id, table_name):
+            cursor.execute(sql, params)
         cursor.execute(
             "DELETE FROM user_stats WHERE user_id = %s AND table_name = %s",
             (user_id, table_name)
         )
-        connection.commit()
         deleted_count = cursor.rowcount
-        
-        cursor.close()
-        connection.close()
+        cursor.execute(
+            "DELETE FROM review_schedule WHERE user_id = %s AND table_name = %s",
+            (user_id, table_name)
+        )
+        connection.commit()
         
         return jsonify({
             'success': True,
@@ -444,10 +1447,12 @@ def delete_bank_user_stats(table_name):
     except Error as e:
         print(f"Error deleting bank stats: {e}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        connection.close()
 
 if __name__ == '__main__':
     print("Starting Exam Quiz API Server...")
     print("Make sure to update DB_CONFIG with your database credentials!")
-    print("Initializing user_stats table...")
-    init_user_stats_table()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print("Development server only; use `gunicorn -c gunicorn.conf.py wsgi:app` in production")
+    app = create_app()
+    app.run(debug=os.getenv('FLASK_DEBUG', 'true').lower() == 'true', host='0.0.0.0', port=5000)
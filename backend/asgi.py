@@ -0,0 +1,11 @@
+"""
+ASGI entry point for the async serving mode (see async_app.py):
+
+    hypercorn asgi:app --bind 0.0.0.0:5000 --workers 2
+
+Unlike wsgi.py there is no master process to create the schema, so each
+worker creates any missing tables as it starts.
+"""
+from async_app import create_async_app
+
+app = create_async_app()
@@ -0,0 +1,706 @@
+"""
+Async serving mode: the routes a quiz hits on every question run as asyncio
+handlers on an aiomysql pool, so one process keeps thousands of client
+connections open while their queries wait on MySQL, instead of one per
+gunicorn thread. Every other route (exports, search, stats, admin) is passed
+to the Flask app from app.py, run on a thread pool, so all routes and JSON
+contracts are the same in both modes.
+
+    pip install -r requirements-async.txt
+    hypercorn asgi:app --bind 0.0.0.0:5000 --workers 2
+
+The async routes share their SQL and response shaping with app.py and the
+helper modules; only the database calls are awaited. Each worker has one
+aiomysql pool sized by DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW (requests beyond
+that wait for a connection, not a thread) and the usual sync pool for the
+Flask routes.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+
+import aiomysql
+from aiomysql import Error
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from mysql.connector import Error as CatalogError
+from quart import Blueprint, Quart, Response, g, jsonify, make_response, request, url_for
+from werkzeug.exceptions import HTTPException
+
+from analytics import first_attempts_queries, learner_bank_statements, rollup_statements
+from app import (COMPRESS_MIN_SIZE, COMPRESS_RESPONSES, DB_CONFIG, DEFAULT_QUESTIONS_PAGE_SIZE,
+                 MAX_QUESTIONS_PAGE_SIZE, POOL_CONFIG, QUIZ_SESSION_TTL_HOURS, catalog, create_app,
+                 current_snapshot, decode_image, encode_question, image_etag, image_hash_query, image_query,
+                 init_schema, int_arg, metrics, question_ids, questions_after_query, questions_by_id_query,
+                 session_fields, session_question, snapshot_page, stats_buffer, variant_types)
+from http_cache import compress_body, compressible, set_validators
+from projection import parse_projection
+from quiz_sessions import (LOAD_SESSION_SQL, SAVE_ANSWER_SQL, SESSION_ANSWERS_SQL, answer_letters,
+                           correct_letters, decode_answers, decode_session)
+from sampling import new_seed, seeded_slice
+from stats_writer import attempt_statements, coalesce_attempts
+
+# Largest request body passed to the Flask routes (e.g. /api/user-stats/batch)
+MAX_FALLBACK_BODY_SIZE = 16 * 1024 * 1024
+
+EXPOSE_HEADERS = 'X-Next-Cursor, X-Next-Page, X-Random-Seed'
+
+api = Blueprint('api', __name__)
+
+_pool = None
+_pool_lock = None
+
+
+async def get_pool():
+    """Return this process's aiomysql pool, creating it on first use"""
+    global _pool, _pool_lock
+    if _pool is None:
+        _pool_lock = _pool_lock or asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                # autocommit, so read-only requests don't hold a snapshot open
+                # in pooled connections; writes begin() their own transaction
+                _pool = await aiomysql.create_pool(
+                    host=DB_CONFIG['host'], user=DB_CONFIG['user'], password=DB_CONFIG['password'],
+                    db=DB_CONFIG['database'], charset='utf8mb4', autocommit=True,
+                    cursorclass=aiomysql.DictCursor,
+                    minsize=0, maxsize=POOL_CONFIG['size'] + POOL_CONFIG['max_overflow'],
+                    pool_recycle=POOL_CONFIG['recycle']
+                )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+async def get_db_connection():
+    """Borrow a connection from the async pool; give it back with release_connection()"""
+    try:
+        pool = await get_pool()
+        return await asyncio.wait_for(pool.acquire(), POOL_CONFIG['timeout'])
+    except (Error, OSError, asyncio.TimeoutError) as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+
+def release_connection(connection):
+    _pool.release(connection)
+
+
+async def fetch_bank_ids(cursor, table_name):
+    """Sorted question ids for a bank from the shared QuestionIdCache, loaded on a miss"""
+    version = catalog.version
+    ids = question_ids.cached(table_name)
+    if ids is None:
+        await cursor.execute(*question_ids.query(table_name))
+        ids = question_ids.store(table_name, version, await cursor.fetchall())
+    return ids
+
+
+async def session_rows(cursor, table_name, ids, fields):
+    """Question rows for a quiz session keyed by id, always with correct_answers"""
+    if not ids:
+        return {}
+    await cursor.execute(*questions_by_id_query(table_name, ids, session_fields(fields)))
+    return {row['id']: row for row in await cursor.fetchall()}
+
+
+async def load_session(cursor, session_id, table_name):
+    await cursor.execute(LOAD_SESSION_SQL, (session_id, table_name, QUIZ_SESSION_TTL_HOURS))
+    return decode_session(await cursor.fetchone())
+
+
+async def session_answers(cursor, session_id):
+    await cursor.execute(SESSION_ANSWERS_SQL, (session_id,))
+    return decode_answers(await cursor.fetchall())
+
+
+@asynccontextmanager
+async def transaction(connection):
+    """Run the block's statements in one transaction (the pool's connections autocommit)"""
+    await connection.begin()
+    try:
+        yield
+        await connection.commit()
+    except Error:
+        await connection.rollback()
+        raise
+
+
+async def write_attempts(cursor, counts):
+    """Apply coalesced attempt counts, review schedules and analytics rollups
+    (inside a transaction); the async form of analytics.record_rollups"""
+    for sql, params in attempt_statements(counts):
+        await cursor.execute(sql, params)
+    for sql, params in learner_bank_statements(counts):
+        await cursor.execute(sql, params)
+    first_attempts = []
+    for sql, params in first_attempts_queries(counts):
+        await cursor.execute(sql, params)
+        first_attempts.extend((row['user_id'], row['table_name'], row['question_id'])
+                              for row in await cursor.fetchall())
+    for sql, params in rollup_statements(counts, first_attempts):
+        await cursor.execute(sql, params)
+
+
+async def current_catalog():
+    """Reload the catalog if it is stale. The reload queries MySQL with the sync
+    driver, so it runs in a thread, keeping the event loop free"""
+    if catalog.stale():
+        await asyncio.to_thread(catalog.banks)
+
+
+def require_bank(view):
+    """Return 404 for unknown test banks, validated against the catalog"""
+    @wraps(view)
+    async def wrapper(table_name, *args, **kwargs):
+        try:
+            await current_catalog()
+            if not catalog.exists(table_name):
+                return jsonify({'error': 'Test bank not found'}), 404
+        except CatalogError as e:
+            print(f"Error loading test bank catalog: {e}")
+            return jsonify({'error': str(e)}), 500
+        return await view(table_name, *args, **kwargs)
+    return wrapper
+
+
+def conditional(view):
+    """Weak ETag and If-None-Match handling, as http_cache.conditional does for Flask"""
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        response = await make_response(await view(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        set_validators(response, await response.get_data())
+        return await response.make_conditional(request)
+    return wrapper
+
+
+def create_async_app(init_db=True):
+    """Build the ASGI application: the async routes, with every other route served by app.py"""
+    quart_app = Quart(__name__, static_folder=None)
+    quart_app.register_blueprint(api)
+
+    @quart_app.before_serving
+    async def startup():
+        if init_db:
+            print("Initializing database tables...")
+            if not await asyncio.to_thread(init_schema):
+                print("Warning: could not initialize database tables")
+
+    @quart_app.after_serving
+    async def shutdown():
+        await close_pool()
+        if stats_buffer:
+            await asyncio.to_thread(stats_buffer.flush)
+
+    @quart_app.before_request
+    async def start_timer():
+        g.started = time.perf_counter()
+
+    @quart_app.after_request
+    async def finish_response(response):
+        # The same CORS headers flask-cors sends for the Flask routes
+        origin = request.headers.get('Origin')
+        response.headers['Access-Control-Allow-Origin'] = origin or '*'
+        response.headers['Access-Control-Expose-Headers'] = EXPOSE_HEADERS
+        if origin:
+            response.vary.add('Origin')
+        if COMPRESS_RESPONSES and compressible(response):
+            response = compress_body(response, await response.get_data(), request.accept_encodings,
+                                     COMPRESS_MIN_SIZE)
+        if metrics:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.record_request(route, request.method, response.status_code,
+                                   time.perf_counter() - g.pop('started'), response.content_length)
+        return response
+
+    wsgi_app = AsyncioWSGIMiddleware(leading_empty_chunk(create_app(init_db=False)),
+                                     max_body_size=MAX_FALLBACK_BODY_SIZE)
+    return FallbackDispatcher(quart_app, wsgi_app)
+
+
+def leading_empty_chunk(wsgi_app):
+    """hypercorn only starts a WSGI response when the first body chunk arrives, so
+    bodiless responses (304s, CORS preflights) would never be sent; lead with b''"""
+    def app(environ, start_response):
+        body = wsgi_app(environ, start_response)
+        try:
+            yield b''
+            yield from body
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+    return app
+
+
+class FallbackDispatcher:
+    """Send requests the async app has a route for to it, and the rest to the WSGI app.
+
+    CORS preflights go to the WSGI app too, where flask-cors answers them
+    for every route. Lifespan events go to the async app.
+    """
+
+    def __init__(self, app, fallback):
+        self.app = app
+        self.fallback = fallback
+
+    def serves(self, scope):
+        if scope['method'] == 'OPTIONS':
+            return False
+        try:
+            self.app.url_map.bind('').match(scope['path'], scope['method'])
+        except HTTPException:
+            return False
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not self.serves(scope):
+            await self.fallback(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+@api.route('/api/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({'status': 'healthy', 'message': 'API is running'})
+
+
+@api.route('/api/test-banks', methods=['GET'])
+@conditional
+async def get_test_banks():
+    """Get all available test banks from the catalog"""
+    try:
+        await current_catalog()
+        return jsonify(catalog.banks())
+    except CatalogError as e:
+        print(f"Error fetching test banks: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@api.route('/api/questions/<table_name>', methods=['GET'])
+@conditional
+@require_bank
+async def get_questions(table_name):
+    """Get a page of questions from a test bank (see get_questions in app.py)"""
+    try:
+        cursor_arg = int_arg('cursor', None, minimum=0, values=request.args)
+        if cursor_arg is None:
+            start = int_arg('start', 1, minimum=1, values=request.args)
+            limit = int_arg('end', 10, values=request.args) - start + 1
+        else:
+            start = None
+            limit = int_arg('limit', DEFAULT_QUESTIONS_PAGE_SIZE, values=request.args)
+        fields, compact = parse_projection(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = max(0, min(limit, MAX_QUESTIONS_PAGE_SIZE))
+    random_order = request.args.get('random', 'false').lower() == 'true'
+    seed = request.args.get('seed') or new_seed()
+
+    # Snapshots are memory-mapped, so reading them needs no await
+    snapshot = current_snapshot(table_name)
+    if snapshot is not None:
+        questions, next_cursor = snapshot_page(snapshot, fields, random_order, seed, cursor_arg, start, limit)
+        return questions_response(table_name, questions, compact, seed if random_order else None, next_cursor)
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            next_cursor = None
+            if random_order:
+                position = cursor_arg if cursor_arg is not None else start - 1
+                ids = seeded_slice(await fetch_bank_ids(cursor, table_name), seed,
+                                   position, position + limit + 1)
+                if len(ids) > limit:
+                    ids = ids[:limit]
+                    next_cursor = position + limit
+                questions = []
+                if ids:
+                    await cursor.execute(*questions_by_id_query(table_name, ids, fields))
+                    rows = {row['id']: row for row in await cursor.fetchall()}
+                    questions = [rows[question_id] for question_id in ids if question_id in rows]
+            else:
+                after_id = cursor_arg
+                if after_id is None:
+                    after_id = 0
+                    if start > 1:
+                        ids = await fetch_bank_ids(cursor, table_name)
+                        if start - 2 < len(ids):
+                            after_id = ids[start - 2]
+                        else:
+                            limit = 0  # past the end of the bank
+
+                questions = []
+                if limit:
+                    await cursor.execute(*questions_after_query(table_name, fields, after_id, limit + 1))
+                    questions = await cursor.fetchall()
+                if len(questions) > limit:
+                    questions = questions[:limit]
+                    next_cursor = questions[-1]['id']
+
+        return questions_response(table_name, questions, compact, seed if random_order else None, next_cursor)
+
+    except Error as e:
+        print(f"Error fetching questions: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+def questions_response(table_name, questions, compact, seed, next_cursor):
+    response = jsonify([encode_question(table_name, question, compact, url_for) for question in questions])
+    if seed:
+        response.headers['X-Random-Seed'] = seed
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+
+@api.route('/api/question/<table_name>/<int:question_id>', methods=['GET'])
+@conditional
+@require_bank
+async def get_single_question(table_name, question_id):
+    """Get a single question by ID"""
+    try:
+        fields, compact = parse_projection(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    snapshot = current_snapshot(table_name)
+    if snapshot is not None:
+        questions = snapshot.questions([question_id], fields)
+        if not questions:
+            return jsonify({'error': 'Question not found'}), 404
+        return jsonify(encode_question(table_name, questions[0], compact, url_for))
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            await cursor.execute(*questions_by_id_query(table_name, [question_id], fields))
+            question = await cursor.fetchone()
+
+        if not question:
+            return jsonify({'error': 'Question not found'}), 404
+
+        return jsonify(encode_question(table_name, question, compact, url_for))
+
+    except Error as e:
+        print(f"Error fetching question: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+@api.route('/api/image/<table_name>/<int:question_id>', methods=['GET'])
+@require_bank
+async def get_question_image(table_name, question_id):
+    """Serve a question's image as raw bytes with a strong ETag"""
+    snapshot = current_snapshot(table_name)
+    if snapshot is not None:
+        return snapshot_image(snapshot, question_id)
+
+    source = catalog.source(table_name)
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            accepted = variant_types(request.accept_mimetypes)
+
+            # Answer conditional GETs from the stored hash without reading the image
+            if source.has_column('question_image_hash') and request.if_none_match:
+                await cursor.execute(*image_hash_query(source, question_id, accepted))
+                row = await cursor.fetchone()
+                if row and row['question_image_hash']:
+                    etag = image_etag(row['question_image_hash'], row['variant_type'])
+                    if etag in request.if_none_match:
+                        return image_not_modified(row['question_image_hash'], etag)
+
+            await cursor.execute(*image_query(source, question_id, accepted))
+            row = await cursor.fetchone()
+
+        image, image_hash = decode_image(row)
+        if image is None:
+            return jsonify({'error': 'Image not found'}), 404
+
+        etag = image_etag(image_hash, row['variant_type'])
+        if etag in request.if_none_match:
+            return image_not_modified(image_hash, etag)
+
+        response = Response(image, mimetype=row['variant_type'] or row['question_image_type']
+                            or 'application/octet-stream')
+        response.set_etag(etag)
+        set_image_cache_headers(response, image_hash)
+        return response
+
+    except (Error, ValueError) as e:
+        print(f"Error fetching image: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+def snapshot_image(snapshot, question_id):
+    """get_question_image's response, read from a snapshot"""
+    found = snapshot.image(question_id, variant_types(request.accept_mimetypes))
+    if found is None:
+        return jsonify({'error': 'Image not found'}), 404
+    image, image_hash, variant_type, mime_type = found
+
+    etag = image_etag(image_hash, variant_type)
+    if etag in request.if_none_match:
+        return image_not_modified(image_hash, etag)
+
+    response = Response(image, mimetype=variant_type or mime_type or 'application/octet-stream')
+    response.set_etag(etag)
+    set_image_cache_headers(response, image_hash)
+    return response
+
+
+def set_image_cache_headers(response, image_hash):
+    """Versioned image URLs (?v=<hash>) never change; others must revalidate"""
+    if request.args.get('v') == image_hash:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    # The format served depends on what the client accepts
+    response.vary.add('Accept')
+
+
+def image_not_modified(image_hash, etag=None):
+    response = Response(b'', status=304)
+    response.set_etag(etag or image_hash)
+    set_image_cache_headers(response, image_hash)
+    return response
+
+
+@api.route('/api/quiz-sessions/<table_name>/<session_id>', methods=['GET'])
+@require_bank
+async def get_quiz_session(table_name, session_id):
+    """Progress of a quiz session"""
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            session = await load_session(cursor, session_id, table_name)
+            if not session:
+                return jsonify({'error': 'Quiz session not found'}), 404
+            answers = await session_answers(cursor, session_id)
+
+        return jsonify({
+            'sessionId': session_id,
+            'total': len(session['question_ids']),
+            'seed': session['seed'],
+            'answered': len(answers),
+            'correct': sum(1 for answer in answers.values() if answer['isCorrect'])
+        })
+
+    except Error as e:
+        print(f"Error fetching quiz session: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+@api.route('/api/quiz-sessions/<table_name>/<session_id>/questions', methods=['GET'])
+@require_bank
+async def get_quiz_session_questions(table_name, session_id):
+    """A batch of a session's questions (offset/limit), for prefetching"""
+    try:
+        offset = int_arg('offset', 0, minimum=0, values=request.args)
+        limit = int_arg('limit', DEFAULT_QUESTIONS_PAGE_SIZE, minimum=1, maximum=MAX_QUESTIONS_PAGE_SIZE,
+                        values=request.args)
+        fields, compact = parse_projection(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            session = await load_session(cursor, session_id, table_name)
+            if not session:
+                return jsonify({'error': 'Quiz session not found'}), 404
+
+            ids = session['question_ids'][offset:offset + limit]
+            rows = await session_rows(cursor, table_name, ids, fields)
+            answers = await session_answers(cursor, session_id)
+
+        return jsonify([session_question(table_name, rows[question_id], compact, answers.get(question_id),
+                                         url_for)
+                        for question_id in ids if question_id in rows])
+
+    except Error as e:
+        print(f"Error fetching quiz session questions: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+@api.route('/api/quiz-sessions/<table_name>/<session_id>/answers', methods=['POST'])
+@require_bank
+async def submit_quiz_answer(table_name, session_id):
+    """Grade an answer, record the attempt and return the next question in one round trip"""
+    payload = await request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON object required'}), 400
+
+    question_id = payload.get('question_id')
+    if not isinstance(question_id, int) or isinstance(question_id, bool):
+        return jsonify({'error': 'question_id must be an integer'}), 400
+    try:
+        letters = answer_letters(payload.get('answer'))
+        fields, compact = parse_projection(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            session = await load_session(cursor, session_id, table_name)
+            if not session:
+                return jsonify({'error': 'Quiz session not found'}), 404
+
+            ids = session['question_ids']
+            if question_id not in ids:
+                return jsonify({'error': 'Question is not part of this quiz session'}), 400
+            position = ids.index(question_id) + 1
+            next_id = ids[position] if position < len(ids) else None
+
+            rows = await session_rows(cursor, table_name, [question_id] + ([next_id] if next_id else []), fields)
+            if question_id not in rows:
+                return jsonify({'error': 'Question not found'}), 404
+
+            correct = correct_letters(rows[question_id]['correct_answers'])
+            is_correct = letters == correct
+            counts = {(session['user_id'], table_name, question_id): [1, 1 if is_correct else 0]}
+
+            async with transaction(connection):
+                await cursor.execute(SAVE_ANSWER_SQL, (session_id, question_id, ','.join(letters), is_correct))
+                if not stats_buffer:
+                    # Commits the session answer together with the attempt
+                    await write_attempts(cursor, counts)
+            if stats_buffer:
+                stats_buffer.add(counts)
+
+        return jsonify({
+            'questionId': question_id,
+            'isCorrect': is_correct,
+            'correctAnswers': correct,
+            'position': position,
+            'next': session_question(table_name, rows[next_id], compact, build_url=url_for)
+                    if next_id in rows else None
+        })
+
+    except Error as e:
+        print(f"Error submitting quiz answer: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+@api.route('/api/user-stats/<table_name>/<int:question_id>', methods=['POST'])
+async def update_user_stats(table_name, question_id):
+    """Update user statistics for a specific question"""
+    payload = await request.get_json()
+    user_id = payload.get('user_id', 'default_user')
+    correct_increment = 1 if payload.get('is_correct', False) else 0
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        async with connection.cursor() as cursor:
+            async with transaction(connection):
+                await write_attempts(cursor, {(user_id, table_name, question_id): [1, correct_increment]})
+
+            await cursor.execute("""
+                SELECT attempts, correct, last_attempt
+                FROM user_stats
+                WHERE user_id = %s AND table_name = %s AND question_id = %s
+            """, (user_id, table_name, question_id))
+            result = await cursor.fetchone()
+
+        if result:
+            return jsonify({
+                'success': True,
+                'attempts': result['attempts'],
+                'correct': result['correct'],
+                'lastAttempt': result['last_attempt'].isoformat() if result['last_attempt'] else None
+            })
+        else:
+            return jsonify({'error': 'Failed to update stats'}), 500
+
+    except Error as e:
+        print(f"Error updating user stats: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
+
+
+@api.route('/api/user-stats/batch', methods=['POST'])
+async def batch_update_user_stats():
+    """Record many question attempts in one request and one transaction"""
+    payload = await request.get_json(silent=True)
+    if isinstance(payload, list):
+        payload = {'attempts': payload}
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON body required'}), 400
+
+    try:
+        await current_catalog()
+        events = payload.get('attempts', [])
+        counts = coalesce_attempts(events, payload.get('user_id', 'default_user'), catalog.exists)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except CatalogError as e:
+        print(f"Error loading test bank catalog: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    if stats_buffer:
+        stats_buffer.add(counts)
+        return jsonify({'success': True, 'queued': len(events)}), 202
+
+    connection = await get_db_connection()
+    if not connection:
+        return jsonify({'error': 'Database connection failed'}), 500
+
+    try:
+        if counts:
+            async with connection.cursor() as cursor, transaction(connection):
+                await write_attempts(cursor, counts)
+        return jsonify({
+            'success': True,
+            'recorded': len(events),
+            'questions': len(counts)
+        })
+
+    except Error as e:
+        print(f"Error recording user stats batch: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        release_connection(connection)
@@ -0,0 +1,94 @@
+import json
+from datetime import datetime, timezone
+
+# Materialized per-bank statistics. The scraper deletes a bank's row whenever it
+# writes to the bank, and the next read (or refresh_bank_stats.py) recomputes it.
+BANK_STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS bank_stats (
+        table_name VARCHAR(64) PRIMARY KEY,
+        total_questions INT NOT NULL,
+        questions_with_images INT NOT NULL,
+        multiple_answer_questions INT NOT NULL,
+        answer_distribution TEXT NOT NULL,
+        updated_at DATETIME NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def image_condition(source):
+    """SQL condition for 'this question has an image' on a bank's rows"""
+    conditions = ["question_image_url IS NOT NULL"]
+    for column in ('question_image_data', 'question_image_hash'):
+        if source.has_column(column):
+            conditions.append(f"{column} IS NOT NULL")
+    return ' OR '.join(conditions)
+
+
+def compute_bank_stats(cursor, source):
+    """Run the aggregate scans over a bank (a catalog BankSource) and store the result in bank_stats"""
+    table_name = source.table_name
+    where, params = source.scope()
+    cursor.execute(f"""
+        SELECT
+            COUNT(*) as total_questions,
+            SUM(CASE WHEN {image_condition(source)} THEN 1 ELSE 0 END) as questions_with_images,
+            SUM(CASE WHEN INSTR(correct_answers, ',') > 0 THEN 1 ELSE 0 END) as multiple_answer_questions
+        FROM {source.table}
+        WHERE {where}
+    """, params)
+    totals = cursor.fetchone()
+
+    cursor.execute(f"""
+        SELECT correct_answers, COUNT(*) as count
+        FROM {source.table}
+        WHERE {where}
+        GROUP BY correct_answers
+        ORDER BY count DESC
+    """, params)
+    distribution = [{'correct_answers': row['correct_answers'], 'count': int(row['count'])}
+                    for row in cursor.fetchall()]
+
+    row = {
+        'table_name': table_name,
+        'total_questions': int(totals['total_questions'] or 0),
+        'questions_with_images': int(totals['questions_with_images'] or 0),
+        'multiple_answer_questions': int(totals['multiple_answer_questions'] or 0),
+        'answer_distribution': json.dumps(distribution),
+        'updated_at': datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    }
+    cursor.execute("""
+        REPLACE INTO bank_stats
+            (table_name, total_questions, questions_with_images, multiple_answer_questions,
+             answer_distribution, updated_at)
+        VALUES (%(table_name)s, %(total_questions)s, %(questions_with_images)s,
+                %(multiple_answer_questions)s, %(answer_distribution)s, %(updated_at)s)
+    """, row)
+    return row
+
+
+def load_bank_stats(connection, source):
+    """Materialized stats for a bank (one primary key lookup), computed on first use"""
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT table_name, total_questions, questions_with_images, multiple_answer_questions,
+               answer_distribution, updated_at
+        FROM bank_stats
+        WHERE table_name = %s
+    """, (source.table_name,))
+    row = cursor.fetchone()
+    if not row:
+        row = compute_bank_stats(cursor, source)
+        connection.commit()
+    return row
+
+
+def format_bank_stats(row):
+    """Shape a bank_stats row like the /api/stats response"""
+    return {
+        'stats': {
+            'total_questions': row['total_questions'],
+            'questions_with_images': row['questions_with_images'],
+            'multiple_answer_questions': row['multiple_answer_questions']
+        },
+        'answer_distribution': json.loads(row['answer_distribution'])
+    }
@@ -0,0 +1,262 @@
+"""
+Compare the sync (gunicorn, wsgi:app) and async (hypercorn, asgi:app)
+serving modes side by side: for each number of concurrent client
+connections, drive each server with keep-alive connections for a while and
+record throughput, latency, errors and the server's total memory (RSS of
+the master and all workers).
+
+A mode keeps up at a connection count while fewer than --max-error-rate of
+requests fail and p95 latency stays under --max-p95-ms; the report gives
+the largest count each mode kept up with, and connections per 100 MB of
+server memory so runs with different worker counts compare at equal memory.
+
+Usage:
+    python benchmark_async.py --path "/api/questions/aws_saa_c03?random=true&start=1&end=10"
+    python benchmark_async.py --connections 100 500 1000 2000 --think-ms 500
+    python benchmark_async.py --sync-workers 4 --sync-threads 8 --async-workers 2 --output results.json
+
+Both servers need the same database as the API. Many connections need a
+high open-file limit (ulimit -n) for this script and the servers.
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+from benchmark_server import wait_until_ready
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def server_command(mode, args):
+    """(argv, env) starting one serving mode on args.port"""
+    bind = f'127.0.0.1:{args.port}'
+    if mode == 'sync':
+        env = dict(os.environ, GUNICORN_WORKERS=str(args.sync_workers), GUNICORN_THREADS=str(args.sync_threads),
+                   GUNICORN_BIND=bind, GUNICORN_MAX_REQUESTS='0')
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env
+    return [sys.executable, '-m', 'hypercorn', 'asgi:app', '--bind', bind,
+            '--workers', str(args.async_workers), '--backlog', '4096'], dict(os.environ)
+
+
+def process_tree(pid):
+    """pid and all its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; ppid follows the closing paren
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, ()))
+    return tree
+
+
+def tree_rss_mb(pid):
+    """Resident memory of a server (master plus workers) in MB"""
+    total_kb = 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+async def connection_loop(port, path, deadline, think, latencies, counts):
+    """One keep-alive client connection sending GETs until the deadline"""
+    request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept-Encoding: gzip\r\n\r\n'.encode()
+    reader = writer = None
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 10)
+            writer.write(request)
+            status, keep_alive = await asyncio.wait_for(read_response(reader), 30)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            counts['errors'] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.1)
+            continue
+        latencies.append(time.perf_counter() - started)
+        counts['ok' if status < 500 else 'errors'] += 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+        if think:
+            await asyncio.sleep(think)
+    if writer is not None:
+        writer.close()
+
+
+async def read_response(reader):
+    """(status, keep_alive) of one HTTP/1.1 response, body read and discarded"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+def client_process(port, path, connections, duration, think, results):
+    """Run `connections` client connections in one process and report what they saw"""
+    # Thousands of sockets need more than the default soft limit of open files
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    async def run():
+        latencies = []
+        counts = {'ok': 0, 'errors': 0}
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(connection_loop(port, path, deadline, think, latencies, counts)
+                               for _ in range(connections)))
+        return latencies, counts
+
+    latencies, counts = asyncio.run(run())
+    results.put((latencies, counts['ok'], counts['errors']))
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def drive(connections, args):
+    """Load the running server with `connections` connections; returns one result row"""
+    processes = min(args.processes, connections)
+    results = multiprocessing.Queue()
+    clients = [multiprocessing.Process(
+        target=client_process,
+        args=(args.port, args.path, connections // processes + (1 if i < connections % processes else 0),
+              args.duration, args.think_ms / 1000, results)
+    ) for i in range(processes)]
+    started = time.monotonic()
+    for process in clients:
+        process.start()
+    totals = [results.get() for _ in clients]
+    elapsed = time.monotonic() - started
+    for process in clients:
+        process.join()
+
+    latencies = [value for result in totals for value in result[0]]
+    ok = sum(result[1] for result in totals)
+    errors = sum(result[2] for result in totals)
+    p95 = percentile(latencies, 0.95)
+    return {
+        'connections': connections,
+        'requests_per_second': round(ok / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'errors': errors,
+        'error_rate': round(errors / max(1, ok + errors), 4),
+    }
+
+
+def run_mode(mode, args):
+    """Start one serving mode and step it through the connection counts"""
+    argv, env = server_command(mode, args)
+    server = subprocess.Popen(argv, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows = []
+    try:
+        wait_until_ready(args.port)
+        idle_mb = tree_rss_mb(server.pid)
+        for connections in args.connections:
+            row = drive(connections, args)
+            # Measured after the run, when every worker has grown to its working size
+            row['server_rss_mb'] = round(tree_rss_mb(server.pid), 1)
+            row['kept_up'] = (row['error_rate'] <= args.max_error_rate and row['p95_ms'] is not None
+                              and row['p95_ms'] <= args.max_p95_ms)
+            rows.append(row)
+            print(f"{mode:>6} {connections:>7} {row['requests_per_second']:>9.0f} {row['p50_ms'] or 0:>8.1f} "
+                  f"{row['p95_ms'] or 0:>8.1f} {row['error_rate']:>7.2%} {row['server_rss_mb']:>8.0f}"
+                  f"{'' if row['kept_up'] else '  (overloaded)'}")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    kept_up = [row for row in rows if row['kept_up']]
+    capacity = max((row['connections'] for row in kept_up), default=0)
+    peak_mb = max((row['server_rss_mb'] for row in rows), default=idle_mb)
+    return {
+        'mode': mode,
+        'idle_rss_mb': round(idle_mb, 1),
+        'peak_rss_mb': peak_mb,
+        'capacity_connections': capacity,
+        'connections_per_100mb': round(capacity / peak_mb * 100, 1) if peak_mb else None,
+        'results': rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync and async serving modes side by side")
+    parser.add_argument("--path", default="/api/health", help="Path to request")
+    parser.add_argument("--connections", type=int, nargs="+", default=[50, 200, 500, 1000],
+                        help="Concurrent client connections to try")
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between a connection's requests")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per run")
+    parser.add_argument("--processes", type=int, default=4, help="Client processes")
+    parser.add_argument("--modes", nargs="+", choices=('sync', 'async'), default=['sync', 'async'])
+    parser.add_argument("--sync-workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--sync-threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--async-workers", type=int, default=4, help="hypercorn workers")
+    parser.add_argument("--max-p95-ms", type=float, default=1000, help="Slowest p95 that still keeps up")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Highest error rate that still keeps up")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"GET {args.path}: {args.duration:g}s per run, {args.think_ms:g}ms think time, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'mode':>6} {'conns':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'RSS MB':>8}")
+    summaries = [run_mode(mode, args) for mode in args.modes]
+
+    print()
+    for summary in summaries:
+        print(f"{summary['mode']:>6}: kept up with {summary['capacity_connections']} connections "
+              f"in {summary['peak_rss_mb']:.0f} MB ({summary['connections_per_100mb']} per 100 MB)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'path': args.path, 'think_ms': args.think_ms, 'duration': args.duration,
+                       'config': {'sync_workers': args.sync_workers, 'sync_threads': args.sync_threads,
+                                  'async_workers': args.async_workers},
+                       'modes': summaries}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
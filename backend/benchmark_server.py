@@ -0,0 +1,111 @@
+"""
+Measure requests per second of the production server at different worker
+counts. Starts gunicorn (gunicorn.conf.py) on a local port for each count,
+drives it with keep-alive client processes and prints a table.
+
+Usage:
+    python benchmark_server.py                          # /api/health, 1/2/4 workers
+    python benchmark_server.py --workers 1 2 4 8 --threads 4
+    python benchmark_server.py --path /api/test-banks --duration 20
+
+/api/health doesn't touch MySQL, so it measures the server itself; paths
+like /api/test-banks or /api/questions/<bank> include the database.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def client(port, path, duration, results):
+    """Send requests over one keep-alive connection until time runs out"""
+    ok = errors = 0
+    deadline = time.monotonic() + duration
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    while time.monotonic() < deadline:
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status < 500:
+                ok += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.close()
+    results.put((ok, errors))
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+    raise SystemExit(f"Server on port {port} did not start within {timeout}s")
+
+
+def run(workers, args):
+    """Start gunicorn with `workers` workers and return (requests/s, errors)"""
+    env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(args.threads),
+               GUNICORN_BIND=f'127.0.0.1:{args.port}', GUNICORN_MAX_REQUESTS='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(args.port)
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(args.port, args.path, args.duration, results))
+                   for _ in range(args.clients)]
+        started = time.monotonic()
+        for process in clients:
+            process.start()
+        totals = [results.get() for _ in clients]
+        elapsed = time.monotonic() - started
+        for process in clients:
+            process.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    ok = sum(result[0] for result in totals)
+    errors = sum(result[1] for result in totals)
+    return ok / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API throughput against worker count")
+    parser.add_argument("--path", default="/api/health", help="Path to request")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to try")
+    parser.add_argument("--threads", type=int, default=4, help="Threads per worker")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    print(f"GET {args.path}: {args.clients} clients, {args.threads} threads/worker, "
+          f"{args.duration:g}s per run, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'errors':>7}")
+    baseline = None
+    for workers in args.workers:
+        rate, errors = run(workers, args)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.0f} {rate / baseline:>7.2f}x {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
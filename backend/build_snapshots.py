@@ -0,0 +1,60 @@
+"""
+Compile test banks into the memory-mapped snapshots the API serves
+questions and images from when SNAPSHOT_DIR is set (see snapshots.py).
+Each bank gets a new generation that replaces the current one atomically;
+running API processes switch to it when their catalog reloads, which this
+script triggers by touching the catalog signal file.
+
+The scraper runs this for the bank it scraped when SNAPSHOT_DIR is set.
+Run it yourself after other changes to the questions (imports, dedupes,
+migrations); until then the API reads a bank whose question count no
+longer matches its snapshot from MySQL.
+
+Usage:
+    SNAPSHOT_DIR=/var/lib/exam-quiz/snapshots python build_snapshots.py                # every test bank
+    SNAPSHOT_DIR=/var/lib/exam-quiz/snapshots python build_snapshots.py aws_saa_c03    # specific banks
+    python build_snapshots.py --dir /tmp/snapshots --keep 3
+"""
+import argparse
+import time
+
+import mysql.connector
+
+from app import DB_CONFIG, SNAPSHOT_DIR, catalog
+from catalog import touch_signal_file
+from snapshots import write_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile test banks into memory-mapped snapshots")
+    parser.add_argument("tables", nargs="*", help="Banks to compile (default: all)")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot directory (default: $SNAPSHOT_DIR)")
+    parser.add_argument("--keep", type=int, default=2, help="Generations kept per bank, including the new one")
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("set SNAPSHOT_DIR or pass --dir")
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        # The catalog knows each bank's columns in either question store
+        banks = {bank['name'] for bank in catalog.banks()}
+        tables = args.tables or sorted(banks)
+
+        for table_name in tables:
+            if table_name not in banks:
+                print(f"Skipping '{table_name}': not a test bank")
+                continue
+            started = time.perf_counter()
+            questions, images, generation = write_snapshot(db, catalog.source(table_name), args.dir,
+                                                           keep=args.keep)
+            print(f"✓ {table_name}: {questions} questions, {images} images "
+                  f"in {time.perf_counter() - started:.1f}s ({generation})")
+    finally:
+        db.close()
+
+    # Running API processes reload the catalog and map the new generations
+    touch_signal_file()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import os
+import tempfile
+import threading
+import time
+
+from mysql.connector import Error
+
+# File the scraper touches after writing new data; a newer mtime invalidates the catalog
+DEFAULT_SIGNAL_FILE = os.path.join(tempfile.gettempdir(), 'exam_quiz_catalog.signal')
+
+# Every test bank table has these columns (see create_topic_table in scraper.py)
+BANK_COLUMNS = ('question_text', 'correct_answers')
+
+# Shared table holding every bank's questions when QUESTION_STORE=normalized,
+# and its columns and indexes (see create_question_store in scraper.py)
+QUESTIONS_TABLE = 'questions'
+QUESTIONS_COLUMNS = frozenset((
+    'bank_id', 'id', 'topic_name', 'question_text', 'question_image_url', 'question_image_hash',
+    'question_image_type', 'answer_a', 'answer_b', 'answer_c', 'answer_d', 'answer_e', 'answer_f',
+    'correct_answers', 'page_number', 'content_hash', 'created_at'
+))
+QUESTIONS_INDEXES = frozenset(('PRIMARY', 'uniq_content_hash', 'idx_image_hash', 'ft_question_answers'))
+
+
+def default_display_name(table_name):
+    """Fallback display name when a bank has no topic_name"""
+    return table_name.replace('_', ' ').title()
+
+
+def touch_signal_file(path=None):
+    """Tell running API processes that test bank data has changed"""
+    path = path or os.getenv('CATALOG_SIGNAL_FILE', DEFAULT_SIGNAL_FILE)
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+class BankSource:
+    """Where a bank's questions are stored: its own table, or (with a bank_id)
+    its rows of the shared questions table"""
+
+    def __init__(self, table_name, bank_id=None, columns=(), indexes=()):
+        self.table_name = table_name
+        self.bank_id = bank_id
+        self.columns = columns
+        self.indexes = indexes
+
+    @property
+    def table(self):
+        """Table to select the bank's questions FROM"""
+        if self.bank_id is not None:
+            return QUESTIONS_TABLE
+        return f"`{self.table_name}`"
+
+    def scope(self, alias=None):
+        """(condition, params) restricting a query on `table` to this bank"""
+        if self.bank_id is None:
+            return 'TRUE', ()
+        column = f"{alias}.bank_id" if alias else 'bank_id'
+        return f"{column} = %s", (self.bank_id,)
+
+    def has_column(self, column_name):
+        return column_name in self.columns
+
+    def has_index(self, index_name):
+        return index_name in self.indexes
+
+
+class BankCatalog:
+    """In-memory catalog of test banks (names, display names, question counts).
+
+    With one table per bank, loaded from information_schema (which also
+    records each bank's columns and indexes, so routes can adapt to older
+    table layouts) plus one UNION ALL query for counts. With normalized=True,
+    loaded with one query on the banks and questions tables. Either way it
+    is served from memory until the TTL expires, the signal file is touched
+    or invalidate() is called.
+    """
+
+    def __init__(self, get_connection, ttl=300, signal_file=None, normalized=False):
+        self._get_connection = get_connection
+        self.ttl = ttl
+        self.signal_file = signal_file
+        self.normalized = normalized
+        self._banks = None
+        self._columns = {}
+        self._indexes = {}
+        self._bank_ids = {}
+        # Bumped on every reload so dependent caches know to reload too
+        self.version = 0
+        self._loaded_at = 0
+        self._signal_mtime = None
+        self._lock = threading.Lock()
+
+    def _read_signal_mtime(self):
+        if not self.signal_file:
+            return None
+        try:
+            return os.stat(self.signal_file).st_mtime
+        except OSError:
+            return None
+
+    def _is_stale(self):
+        if self._banks is None:
+            return True
+        if self.ttl and time.monotonic() - self._loaded_at > self.ttl:
+            return True
+        return self._read_signal_mtime() != self._signal_mtime
+
+    def _load(self):
+        connection = self._get_connection()
+        if not connection:
+            raise Error('Database connection failed')
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            if self.normalized:
+                return self._load_normalized(cursor)
+
+            cursor.execute("""
+                SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                ORDER BY TABLE_NAME, ORDINAL_POSITION
+            """)
+            columns = {}
+            for row in cursor.fetchall():
+                columns.setdefault(row['table_name'], set()).add(row['column_name'])
+            columns = {
+                name: cols for name, cols in columns.items()
+                if all(col in cols for col in BANK_COLUMNS) and name != QUESTIONS_TABLE
+            }
+            if not columns:
+                return {}, {}, {}, {}
+
+            cursor.execute("""
+                SELECT DISTINCT TABLE_NAME AS table_name, INDEX_NAME AS index_name
+                FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE()
+            """)
+            indexes = {}
+            for row in cursor.fetchall():
+                if row['table_name'] in columns:
+                    indexes.setdefault(row['table_name'], set()).add(row['index_name'])
+
+            # One round trip for every bank's count and topic name
+            selects = []
+            for name in columns:
+                topic = (f"(SELECT topic_name FROM `{name}` LIMIT 1)"
+                         if 'topic_name' in columns[name] else "NULL")
+                selects.append(
+                    f"SELECT %s AS name, COUNT(*) AS total, {topic} AS topic_name FROM `{name}`"
+                )
+            cursor.execute(" UNION ALL ".join(selects), tuple(columns))
+
+            banks = {}
+            for row in cursor.fetchall():
+                name = row['name']
+                banks[name] = {
+                    'name': name,
+                    'displayName': row['topic_name'] or default_display_name(name),
+                    'totalQuestions': int(row['total'])
+                }
+            return dict(sorted(banks.items())), columns, indexes, {}
+        finally:
+            connection.close()
+
+    def _load_normalized(self, cursor):
+        """Banks registered in the banks table, counted with one indexed scan"""
+        cursor.execute(f"""
+            SELECT b.id, b.table_name AS name, b.topic_name, COUNT(q.id) AS total
+            FROM banks b
+            LEFT JOIN {QUESTIONS_TABLE} q ON q.bank_id = b.id
+            GROUP BY b.id, b.table_name, b.topic_name
+        """)
+        banks, bank_ids = {}, {}
+        for row in cursor.fetchall():
+            name = row['name']
+            bank_ids[name] = row['id']
+            banks[name] = {
+                'name': name,
+                'displayName': row['topic_name'] or default_display_name(name),
+                'totalQuestions': int(row['total'])
+            }
+        # Every bank shares the questions table's layout
+        columns = {name: QUESTIONS_COLUMNS for name in banks}
+        indexes = {name: QUESTIONS_INDEXES for name in banks}
+        return dict(sorted(banks.items())), columns, indexes, bank_ids
+
+    def _reload(self):
+        # Caller must hold self._lock
+        signal_mtime = self._read_signal_mtime()
+        self._banks, self._columns, self._indexes, self._bank_ids = self._load()
+        self._loaded_at = time.monotonic()
+        self._signal_mtime = signal_mtime
+        self.version += 1
+        return self._banks
+
+    def refresh(self):
+        """Reload the catalog from the database now"""
+        with self._lock:
+            return self._reload()
+
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        with self._lock:
+            self._banks = None
+
+    def _current(self):
+        banks = self._banks
+        if banks is not None and not self._is_stale():
+            return banks
+        with self._lock:
+            if self._is_stale():
+                self._reload()
+            return self._banks
+
+    def stale(self):
+        """Whether the next lookup will reload from the database"""
+        return self._is_stale()
+
+    def banks(self):
+        """All test banks, ordered by table name"""
+        return list(self._current().values())
+
+    def get(self, table_name):
+        """Catalog entry for a bank, or None if it does not exist"""
+        return self._current().get(table_name)
+
+    def exists(self, table_name):
+        return table_name in self._current()
+
+    def has_column(self, table_name, column_name):
+        """Whether a bank table has a column (older tables predate some columns)"""
+        self._current()
+        return column_name in self._columns.get(table_name, ())
+
+    def has_index(self, table_name, index_name):
+        self._current()
+        return index_name in self._indexes.get(table_name, ())
+
+    def source(self, table_name):
+        """BankSource for querying a bank's questions"""
+        self._current()
+        return BankSource(table_name, self._bank_ids.get(table_name),
+                          self._columns.get(table_name, ()), self._indexes.get(table_name, ()))
@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+
+class TimedCursor:
+    """Cursor wrapper that reports how long each execute and fetch takes"""
+
+    def __init__(self, cursor, on_query):
+        self._cursor = cursor
+        self._on_query = on_query
+        self._operation = None
+        self._params = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    def _timed(self, phase, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._on_query(self._operation, self._params, time.perf_counter() - started, phase)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._operation, self._params = operation, params
+        return self._timed('execute', self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._operation, self._params = operation, None
+        return self._timed('execute', self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        return self._timed('fetch', self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed('fetch', self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed('fetch', self._cursor.fetchall)
+
+
+class PooledConnection:
+    """Wrapper around a pooled connection; close() returns it to the pool"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise PoolError("Connection has already been returned to the pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        if self._pool.on_query:
+            return TimedCursor(cursor, self._pool.on_query)
+        return cursor
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        self._pool._release(raw, self._created_at)
+
+    def discard(self):
+        """Close the underlying connection instead of returning it, e.g. when
+        a large unbuffered result is still unread"""
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        self._pool._release(raw, self._created_at, keep=False)
+
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool with overflow, checkout timeout,
+    health-check-on-borrow and connection recycling.
+
+    Optional hooks: `on_query(operation, params, seconds, phase)` is called
+    for every cursor execute/fetch and `on_acquire(seconds)` for every checkout.
+    """
+
+    def __init__(self, db_config, size=5, max_overflow=10, timeout=30,
+                 recycle=3600, pre_ping=True, on_query=None, on_acquire=None):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.on_query = on_query
+        self.on_acquire = on_acquire
+
+        self._idle = deque()
+        self._lock = threading.Lock()
+        # One permit per connection that may exist at once (pooled + overflow)
+        self._slots = threading.BoundedSemaphore(size + max_overflow)
+        # Set by dispose(); connections returned afterwards are closed
+        self._closed = False
+
+    def _connect(self):
+        return mysql.connector.connect(**self.db_config), time.monotonic()
+
+    def _is_usable(self, raw, created_at):
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            return False
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Error:
+                return False
+        return True
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def get_connection(self):
+        """Borrow a connection, waiting up to `timeout` seconds for a free slot"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(
+                f"Connection pool exhausted: {self.size + self.max_overflow} "
+                f"connections in use after waiting {self.timeout}s"
+            )
+
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    raw, created_at = self._connect()
+                    break
+                raw, created_at = item
+                if self._is_usable(raw, created_at):
+                    break
+                self._discard(raw)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        if self.on_acquire:
+            self.on_acquire(time.perf_counter() - started)
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at, keep=True):
+        """Reset a returned connection and keep it idle, or close it if the
+        pool is disposed or full or the connection is no longer clean"""
+        try:
+            if keep:
+                try:
+                    if raw.unread_result:
+                        raw.consume_results()
+                    if raw.in_transaction:
+                        raw.rollback()
+                except Error:
+                    keep = False
+
+            with self._lock:
+                if keep and not self._closed and len(self._idle) < self.size:
+                    self._idle.append((raw, created_at))
+                    raw = None
+            if raw is not None:
+                self._discard(raw)
+        finally:
+            self._slots.release()
+
+    def dispose(self):
+        """Close every idle connection (checked-out ones close on return)"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            self._discard(raw)
@@ -0,0 +1,67 @@
+import base64
+import json
+
+# Columns written for each question, in order. Images are added as base64
+# under question_image; import_bank.py reads the same format back.
+EXPORT_COLUMNS = ('id', 'topic_name', 'question_text', 'question_image_url', 'question_image_type',
+                  'answer_a', 'answer_b', 'answer_c', 'answer_d', 'answer_e', 'answer_f',
+                  'correct_answers', 'page_number')
+
+# Rows fetched from the server-side cursor per chunk of output
+EXPORT_BATCH_SIZE = 500
+
+
+def export_query(source, include_images):
+    """SELECT (and params) for a whole bank in id order, with image bytes only if requested"""
+    columns = ', '.join(f"q.{column}" for column in EXPORT_COLUMNS)
+    where, params = source.scope('q')
+    if not include_images:
+        return f"""
+            SELECT {columns}, NULL AS image, NULL AS question_image_data
+            FROM {source.table} q WHERE {where} ORDER BY q.id
+        """, params
+    # Before migrate_images.py images are base64 in the row; before
+    # dedupe_questions.py they may be binary in the row
+    data = 'q.question_image_data' if source.has_column('question_image_data') else 'NULL'
+    if source.has_column('question_image_hash'):
+        blob = 'q.question_image_blob' if source.has_column('question_image_blob') else 'NULL'
+        return f"""
+            SELECT {columns}, COALESCE(i.data, {blob}) AS image, {data} AS question_image_data
+            FROM {source.table} q
+            LEFT JOIN question_images i ON i.hash = q.question_image_hash
+            WHERE {where}
+            ORDER BY q.id
+        """, params
+    return f"""
+        SELECT {columns}, NULL AS image, {data} AS question_image_data
+        FROM {source.table} q WHERE {where} ORDER BY q.id
+    """, params
+
+
+def export_record(row):
+    """One NDJSON line for a question row"""
+    record = {column: row[column] for column in EXPORT_COLUMNS}
+    if row['image'] is not None:
+        record['question_image'] = base64.b64encode(bytes(row['image'])).decode('ascii')
+    else:
+        record['question_image'] = row['question_image_data']
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_lines(connection, cursor):
+    """Yield NDJSON chunks from an executed unbuffered cursor, then release the connection"""
+    finished = False
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            yield ''.join(export_record(row) for row in rows)
+        finished = True
+    finally:
+        if finished:
+            connection.close()
+        else:
+            # Client went away or the query failed mid-stream: drop the
+            # connection rather than reading the rest of the bank to reuse it
+            connection.discard()
@@ -0,0 +1,85 @@
+"""
+Gunicorn settings for serving the API in production:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+A pre-fork master runs GUNICORN_WORKERS processes, each handling
+GUNICORN_THREADS requests at once. Each worker has its own connection pool,
+so keep DB_POOL_SIZE >= GUNICORN_THREADS and make sure
+GUNICORN_WORKERS * (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) fits in MySQL's
+max_connections.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Requests are mostly waiting on MySQL, so threads let one process overlap them
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Restart each worker after this many requests (plus jitter so they don't all
+# restart together) to bound memory growth; 0 disables recycling
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Seconds a worker may spend on one request, and seconds workers get to finish
+# in-flight requests after SIGTERM before they are killed
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+# Workers write metric snapshots here so /metrics (served by any one worker)
+# reports totals for the whole server
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'exam-quiz-metrics'))
+
+
+def on_starting(server):
+    """Create the database tables once, in the master, before any worker starts"""
+    import app
+
+    # Start metrics from zero: drop snapshots left by a previous run
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
+
+    if not app.init_schema():
+        server.log.warning("Could not initialize database tables")
+    # Workers are forked from the master; they must not share its sockets
+    app.reset_pool()
+
+
+def post_fork(server, worker):
+    """Drop the metrics the master recorded while setting up the schema;
+    otherwise every worker would report them as its own"""
+    import app
+
+    if app.metrics:
+        app.metrics.reset()
+
+
+def worker_exit(server, worker):
+    """Write buffered user stats, retire the worker's metrics and close pooled
+    connections before a worker exits"""
+    import app
+
+    if app.stats_buffer:
+        app.stats_buffer.flush()
+    if app.metrics:
+        app.metrics.retire()
+    app.reset_pool()
+
+
+def child_exit(server, worker):
+    """Fold the snapshot of a worker that exited without worker_exit (killed
+    after a timeout, or crashed) into the retired metrics"""
+    import app
+
+    if app.metrics:
+        app.metrics.retire(worker.pid)
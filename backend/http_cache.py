@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+# brotli is optional (pip install brotli); without it responses use gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing
+DEFAULT_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+
+def set_validators(response, data):
+    """Weak ETag from the body (unless the route set one) and revalidate-every-time caching"""
+    if not response.get_etag()[0]:
+        response.set_etag(hashlib.sha1(data).hexdigest(), weak=True)
+    if 'Cache-Control' not in response.headers:
+        # Cache, but revalidate every time (a 304 costs almost nothing)
+        response.headers['Cache-Control'] = 'no-cache'
+
+
+def conditional(view):
+    """Give a GET route's 200 responses a weak ETag and answer If-None-Match with 304.
+
+    Routes that set their own validators (e.g. /api/stats) are left alone.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        set_validators(response, response.get_data())
+        return response.make_conditional(request)
+    return wrapper
+
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    """Encode a body as 'br' or 'gzip' (from choose_encoding)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compressible(response):
+    """Successful text responses not already encoded"""
+    return (200 <= response.status_code < 300
+            and response.mimetype in COMPRESSIBLE_TYPES
+            and 'Content-Encoding' not in response.headers)
+
+
+def compress_body(response, data, accept_encodings, min_size=DEFAULT_MIN_SIZE):
+    """Replace a response's body (data) with brotli or gzip, if large enough and accepted"""
+    if len(data) < min_size:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if not encoding:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag promises byte-identical bodies, which differ per encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app, min_size=DEFAULT_MIN_SIZE):
+    """Compress large text responses with brotli or gzip, as the client accepts"""
+    @app.after_request
+    def compress_response(response):
+        if response.direct_passthrough or response.is_streamed or not compressible(response):
+            return response
+        return compress_body(response, response.get_data(), request.accept_encodings, min_size)
@@ -0,0 +1,428 @@
+"""
+Load test the API with a realistic mix of requests from many simulated
+users, and save per-endpoint latency percentiles as JSON so releases can
+be compared.
+
+1. Seed synthetic test banks (reproducible for a given --seed):
+
+    python load_test.py seed --banks 3 --questions 5000 --image-ratio 0.2
+
+2. Start the server (e.g. gunicorn -c gunicorn.conf.py wsgi:app), then run:
+
+    python load_test.py run --users 50 --duration 60 --output results.json
+    python load_test.py run --baseline last-release.json   # exit 1 on regressions
+
+3. Remove the synthetic banks and their stats:
+
+    python load_test.py drop
+"""
+import argparse
+import base64
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import random
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import quote, urlsplit
+
+import mysql.connector
+
+from app import DB_CONFIG
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Synthetic banks are named BANK_PREFIX + number so they are easy to find and drop
+BANK_PREFIX = 'bench_bank_'
+
+WORDS = ('instance', 'bucket', 'policy', 'subnet', 'gateway', 'region', 'replica', 'snapshot',
+         'encryption', 'latency', 'throughput', 'availability', 'lambda', 'queue', 'topic',
+         'cluster', 'container', 'function', 'database', 'cache', 'endpoint', 'certificate',
+         'firewall', 'route', 'storage', 'archive', 'identity', 'role', 'permission', 'audit',
+         'backup', 'failover', 'scaling', 'balancer', 'network', 'volume', 'stream', 'index',
+         'partition', 'quota', 'billing', 'monitoring', 'alarm', 'deployment', 'pipeline',
+         'template', 'secret', 'token', 'session', 'migration')
+
+# Relative weight of each operation in the mixed workload
+OPERATIONS = {
+    'test_banks': 5,
+    'questions_range': 25,
+    'questions_random': 15,
+    'question': 10,
+    'search': 10,
+    'bank_stats': 5,
+    'user_stats_update': 25,
+    'user_stats': 5,
+}
+
+
+def make_png(rng, width, height):
+    """Noise PNG (incompressible, so its size is predictable) without an imaging library"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    rows = b''.join(b'\x00' + rng.randbytes(width * 3) for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows))
+            + chunk(b'IEND', b''))
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def synthetic_questions(bank_number, count, image_ratio, image_size, seed):
+    """Yield NDJSON export records for one synthetic bank"""
+    rng = random.Random(f"{seed}:{bank_number}")
+    topic_name = f"Benchmark Bank {bank_number}"
+    for question_id in range(1, count + 1):
+        answer_count = rng.choice((4, 4, 4, 5, 6))
+        labels = 'ABCDEF'[:answer_count]
+        correct = sorted(rng.sample(labels, 2 if rng.random() < 0.2 else 1))
+        record = {
+            'id': question_id,
+            'topic_name': topic_name,
+            'question_text': f"Q{question_id}: {sentence(rng, 20, 60)}?",
+            'correct_answers': ','.join(correct),
+            'page_number': (question_id - 1) // 10 + 1,
+        }
+        for label in labels:
+            record[f'answer_{label.lower()}'] = sentence(rng, 4, 15)
+        if rng.random() < image_ratio:
+            width = rng.randint(image_size // 2, image_size)
+            image = make_png(rng, width, width * 3 // 4)
+            record['question_image'] = base64.b64encode(image).decode('ascii')
+            record['question_image_type'] = 'image/png'
+        yield json.dumps(record) + '\n'
+
+
+def seed_banks(args):
+    # The importer lives next to the scraper at the repository root
+    sys.path.insert(0, os.path.dirname(HERE))
+    from import_bank import import_bank
+    from scraper import signal_catalog_update
+
+    for bank_number in range(1, args.banks + 1):
+        table_name = f"{BANK_PREFIX}{bank_number}"
+        print(f"Seeding '{table_name}' with {args.questions} questions...")
+        records = synthetic_questions(bank_number, args.questions, args.image_ratio,
+                                      args.image_size, args.seed)
+        imported = import_bank(records, table_name, batch_size=args.batch_size)
+        print(f"✓ {table_name}: {imported} questions")
+    signal_catalog_update()
+
+
+def drop_banks(args):
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        cursor = db.cursor()
+        pattern = BANK_PREFIX.replace('_', '\\_') + '%'
+        cursor.execute("SHOW TABLES LIKE %s", (pattern,))
+        tables = [row[0] for row in cursor.fetchall()]
+        for table_name in tables:
+            cursor.execute(f"DROP TABLE `{table_name}`")
+        # Banks seeded with QUESTION_STORE=normalized (their questions cascade)
+        cursor.execute("SHOW TABLES LIKE 'banks'")
+        if cursor.fetchall():
+            cursor.execute("SELECT table_name FROM banks WHERE table_name LIKE %s", (pattern,))
+            tables += [row[0] for row in cursor.fetchall() if row[0] not in tables]
+            cursor.execute("DELETE FROM banks WHERE table_name LIKE %s", (pattern,))
+        for table_name in tables:
+            for stats_table in ('user_stats', 'review_schedule', 'bank_stats', 'question_rollup',
+                                'learner_bank_rollup', 'bank_rollup'):
+                cursor.execute(f"DELETE FROM {stats_table} WHERE table_name = %s", (table_name,))
+            db.commit()
+            print(f"✓ Dropped {table_name}")
+        # Load-test users only ever attempt load-test banks
+        cursor.execute("DELETE FROM learner_rollup WHERE user_id LIKE 'bench\\_user\\_%'")
+        db.commit()
+        cursor.close()
+    finally:
+        db.close()
+
+    sys.path.insert(0, os.path.dirname(HERE))
+    from scraper import signal_catalog_update
+    signal_catalog_update()
+
+
+class Client:
+    """One simulated user on its own keep-alive connection"""
+
+    def __init__(self, base_url, banks, user_id, rng):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.banks = banks
+        self.user_id = user_id
+        self.rng = rng
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        """Send one request; returns the status (0 for a connection error)"""
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                # A keep-alive connection may have been closed by the server; retry once
+                self.connection.close()
+                self.connection = None
+        return 0
+
+    def run_operation(self, name):
+        rng = self.rng
+        bank = rng.choice(self.banks)
+        table, total = bank['name'], max(bank['totalQuestions'], 1)
+        if name == 'test_banks':
+            return self.request('GET', '/api/test-banks')
+        if name == 'questions_range':
+            start = rng.randint(1, total)
+            return self.request('GET', f"/api/questions/{table}?start={start}&end={start + 9}")
+        if name == 'questions_random':
+            return self.request('GET', f"/api/questions/{table}?random=true&start=1&end=10"
+                                       f"&seed={rng.getrandbits(32)}")
+        if name == 'question':
+            return self.request('GET', f"/api/question/{table}/{rng.randint(1, total)}")
+        if name == 'search':
+            keyword = ' '.join(rng.sample(WORDS, rng.choice((1, 1, 2))))
+            return self.request('GET', f"/api/search?q={quote(keyword)}")
+        if name == 'bank_stats':
+            return self.request('GET', f"/api/stats/{table}")
+        if name == 'user_stats_update':
+            return self.request('POST', f"/api/user-stats/{table}/{rng.randint(1, total)}",
+                                {'user_id': self.user_id, 'is_correct': rng.random() < 0.7})
+        if name == 'user_stats':
+            return self.request('GET', f"/api/user-stats/{table}?user_id={quote(self.user_id)}")
+        raise ValueError(f"Unknown operation {name}")
+
+
+def user_loop(client, operations, weights, started, deadline, think_time, samples):
+    while time.time() < deadline:
+        name = client.rng.choices(operations, weights)[0]
+        # Requests made during warm-up are not recorded
+        measured = time.time() >= started
+        begin = time.perf_counter()
+        status = client.run_operation(name)
+        if measured:
+            samples.append((name, time.perf_counter() - begin, 200 <= status < 400))
+        if think_time:
+            time.sleep(client.rng.expovariate(1 / think_time))
+
+
+def worker_process(base_url, banks, first_user, users, args, started, deadline, results):
+    """Run `users` simulated users on threads in one process"""
+    operations = list(OPERATIONS)
+    weights = [OPERATIONS[name] for name in operations]
+    samples = []
+    threads = []
+    for user_number in range(first_user, first_user + users):
+        rng = random.Random(f"{args.seed}:user:{user_number}")
+        client = Client(base_url, banks, f"bench_user_{user_number}", rng)
+        threads.append(threading.Thread(
+            target=user_loop,
+            args=(client, operations, weights, started, deadline, args.think_time / 1000, samples)
+        ))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Ship back per-operation [latencies, errors] rather than one tuple per request
+    by_operation = {}
+    for name, seconds, ok in samples:
+        totals = by_operation.setdefault(name, [[], 0])
+        totals[0].append(seconds)
+        if not ok:
+            totals[1] += 1
+    results.put(by_operation)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    milliseconds = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 1),
+        'mean_ms': milliseconds(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'max_ms': milliseconds(latencies[-1]) if latencies else None,
+    }
+
+
+def fetch_banks(base_url):
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    try:
+        connection.request('GET', '/api/test-banks')
+        response = connection.getresponse()
+        if response.status != 200:
+            raise SystemExit(f"GET /api/test-banks returned {response.status}; is the server running?")
+        banks = json.loads(response.read())
+    except OSError as e:
+        raise SystemExit(f"Could not reach {base_url}: {e}")
+    finally:
+        connection.close()
+    return [bank for bank in banks if bank['name'].startswith(BANK_PREFIX)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(args):
+    banks = fetch_banks(args.url)
+    if not banks:
+        raise SystemExit(f"No '{BANK_PREFIX}*' banks found; run 'python load_test.py seed' first")
+
+    processes = max(1, min(args.processes, args.users))
+    print(f"{args.users} users in {processes} processes against {args.url} for {args.duration:g}s "
+          f"(+{args.warmup:g}s warm-up), {len(banks)} banks")
+
+    # Wall-clock times so every process starts measuring at the same moment
+    started = time.time() + args.warmup
+    deadline = started + args.duration
+    results = multiprocessing.Queue()
+    workers = []
+    first_user = 0
+    for index in range(processes):
+        users = args.users // processes + (1 if index < args.users % processes else 0)
+        workers.append(multiprocessing.Process(
+            target=worker_process,
+            args=(args.url, banks, first_user, users, args, started, deadline, results)
+        ))
+        first_user += users
+    for process in workers:
+        process.start()
+    merged = {}
+    for _ in workers:
+        for name, (latencies, errors) in results.get().items():
+            totals = merged.setdefault(name, [[], 0])
+            totals[0].extend(latencies)
+            totals[1] += errors
+    for process in workers:
+        process.join()
+
+    endpoints = {name: summarize(latencies, errors, args.duration)
+                 for name, (latencies, errors) in sorted(merged.items())}
+    everything = [value for latencies, _ in merged.values() for value in latencies]
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': git_revision(),
+        'config': {
+            'url': args.url, 'users': args.users, 'processes': processes, 'duration': args.duration,
+            'warmup': args.warmup, 'think_time_ms': args.think_time, 'seed': args.seed,
+            'banks': {bank['name']: bank['totalQuestions'] for bank in banks},
+            'operations': OPERATIONS,
+        },
+        'total': summarize(everything, sum(errors for _, errors in merged.values()), args.duration),
+        'endpoints': endpoints,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.tolerance):
+            raise SystemExit(1)
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<20} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(report['endpoints'].items()) + [('total', report['total'])]
+    for name, result in rows:
+        print(f"{name:<20} {result['requests']:>9} {result['errors']:>7} {result['throughput']:>8.1f} "
+              f"{result['p50_ms'] or 0:>8.1f} {result['p95_ms'] or 0:>8.1f} {result['p99_ms'] or 0:>8.1f}")
+
+
+def compare(baseline, report, tolerance):
+    """Print p95/throughput changes against a previous run; returns True on a regression"""
+    regressed = False
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp')}):")
+    for name, result in report['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before or not before.get('p95_ms') or not result['p95_ms']:
+            continue
+        change = result['p95_ms'] / before['p95_ms'] - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"  {name:<20} p95 {before['p95_ms']:>8.1f} -> {result['p95_ms']:>8.1f} ms "
+              f"({change:+.0%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic banks and load test the API")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help="Create synthetic test banks")
+    seed.add_argument("--banks", type=int, default=3, help="Number of banks")
+    seed.add_argument("--questions", type=int, default=2000, help="Questions per bank")
+    seed.add_argument("--image-ratio", type=float, default=0.2, help="Fraction of questions with an image")
+    seed.add_argument("--image-size", type=int, default=400, help="Maximum image width in pixels")
+    seed.add_argument("--batch-size", type=int, default=500, help="Questions per transaction")
+    seed.add_argument("--seed", default='1', help="Seed for the generated content")
+
+    run = commands.add_parser('run', help="Run the mixed workload against a running server")
+    run.add_argument("--url", default='http://127.0.0.1:5000', help="Base URL of the API")
+    run.add_argument("--users", type=int, default=50, help="Concurrent simulated users")
+    run.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                     help="Client processes the users are spread over")
+    run.add_argument("--duration", type=float, default=30, help="Seconds to measure")
+    run.add_argument("--warmup", type=float, default=5, help="Seconds to run before measuring")
+    run.add_argument("--think-time", type=float, default=0,
+                     help="Mean pause between a user's requests in ms (0 = closed loop)")
+    run.add_argument("--seed", default='1', help="Seed for the request mix")
+    run.add_argument("--output", help="Write the results as JSON to this file")
+    run.add_argument("--baseline", help="Results file of a previous run to compare p95 latency against")
+    run.add_argument("--tolerance", type=float, default=0.10,
+                     help="Allowed p95 slowdown against the baseline before failing (0.10 = 10%%)")
+
+    commands.add_parser('drop', help="Drop the synthetic banks and their user stats")
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed_banks(args)
+    elif args.command == 'run':
+        run_load(args)
+    else:
+        drop_banks(args)
+
+
+if __name__ == "__main__":
+    main()
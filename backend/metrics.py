@@ -0,0 +1,368 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+# Request and database metrics in Prometheus text format. Each process keeps
+# its own counts; with several gunicorn workers every worker also writes a
+# snapshot to METRICS_DIR, and /metrics adds them all up. Workers that exit
+# fold their counts into one retired.json instead of leaving a file behind.
+
+RETIRED_FILE = 'retired.json'
+
+# Metric types that keep adding up after a worker exits (not point-in-time gauges)
+CUMULATIVE_TYPES = ('counter', 'histogram')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.type = 'counter'
+
+    def empty(self):
+        return 0
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.type = 'histogram'
+
+    def empty(self):
+        # Per-bucket (not cumulative) counts, then the +Inf bucket, sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+
+class Registry:
+    """Thread-safe store of metric values, keyed by metric name and label values"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        self._metrics[name] = Counter(name, help_text, labels)
+        return name
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self._metrics[name] = Histogram(name, help_text, labels, buckets)
+        return name
+
+    def inc(self, name, *label_values, amount=1):
+        key = (name, label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, value, *label_values):
+        metric = self._metrics[name]
+        index = len(metric.buckets)
+        for position, bound in enumerate(metric.buckets):
+            if value <= bound:
+                index = position
+                break
+        key = (name, label_values)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = metric.empty()
+            data[index] += 1
+            data[-1] += value
+
+    def clear(self):
+        """Drop every value (the metrics stay registered)"""
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        """JSON-friendly copy of every value"""
+        with self._lock:
+            return [[name, list(labels), list(value) if isinstance(value, list) else value]
+                    for (name, labels), value in self._values.items()]
+
+    def merge(self, snapshots, types=None):
+        """{(name, labels): value} summing `snapshots`, limited to metrics of `types`"""
+        totals = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot:
+                metric = self._metrics.get(name)
+                if metric is None or (types is not None and metric.type not in types):
+                    continue
+                key = (name, tuple(labels))
+                if key not in totals:
+                    totals[key] = value
+                elif isinstance(value, list):
+                    totals[key] = [a + b for a, b in zip(totals[key], value)]
+                else:
+                    totals[key] += value
+        return totals
+
+    def render(self, snapshots):
+        """Prometheus text exposition of the sum of `snapshots`"""
+        totals = self.merge(snapshots)
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for (metric_name, labels), value in sorted(totals.items()):
+                if metric_name != name:
+                    continue
+                pairs = list(zip(metric.labels, labels))
+                if metric.type == 'counter':
+                    lines.append(f"{name}{format_labels(pairs)} {format_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else format_number(bound)
+                    lines.append(f"{name}_bucket{format_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(pairs)} {format_number(value[-1])}")
+                lines.append(f"{name}_count{format_labels(pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs) + '}'
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+REQUESTS = registry.counter('http_requests_total', 'Requests handled', ('route', 'method', 'status'))
+ERRORS = registry.counter('http_request_errors_total', 'Requests that failed with a 5xx or an exception',
+                          ('route', 'method'))
+LATENCY = registry.histogram('http_request_duration_seconds', 'Time to handle a request', ('route', 'method'))
+RESPONSE_SIZE = registry.histogram('http_response_size_bytes', 'Response body size (after compression)',
+                                   ('route',), SIZE_BUCKETS)
+REQUEST_QUERIES = registry.histogram('http_request_db_queries', 'Database statements run per request',
+                                     ('route',), COUNT_BUCKETS)
+REQUEST_DB_TIME = registry.histogram('http_request_db_seconds', 'Time per request spent in database calls',
+                                     ('route',))
+QUERIES = registry.counter('db_queries_total', 'Database statements executed', ('route',))
+QUERY_TIME = registry.histogram('db_query_duration_seconds',
+                                'Database call time, split into executing and fetching results',
+                                ('route', 'phase'))
+ACQUIRE_TIME = registry.histogram('db_connection_acquire_seconds', 'Time to get a connection from the pool')
+
+
+def current_route():
+    """Route template for labels (not the raw path, which would explode label values)"""
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+class MetricsCollector:
+    """Flask hooks and database callbacks feeding the registry"""
+
+    def __init__(self, slow_query_ms=None, metrics_dir=None, flush_interval=5.0):
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        self._thread = None
+        self._retired = False
+        self._write_lock = threading.Lock()
+        if metrics_dir:
+            atexit.register(self.write_snapshot)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+        self._ensure_thread()
+
+    def _after_request(self, response):
+        route = current_route()
+        registry.inc(REQUESTS, route, request.method, str(response.status_code))
+        if response.status_code >= 500:
+            registry.inc(ERRORS, route, request.method)
+        if not response.is_streamed:
+            registry.observe(RESPONSE_SIZE, response.calculate_content_length() or 0, route)
+        return response
+
+    def _teardown_request(self, exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = current_route()
+        registry.observe(LATENCY, time.perf_counter() - started, route, request.method)
+        registry.observe(REQUEST_QUERIES, g.pop('db_queries', 0), route)
+        registry.observe(REQUEST_DB_TIME, g.pop('db_seconds', 0.0), route)
+        if exc is not None:
+            registry.inc(ERRORS, route, request.method)
+
+    def record_request(self, route, method, status_code, seconds, size=None):
+        """Record a request served outside Flask (the async routes in async_app.py)"""
+        self._ensure_thread()
+        registry.inc(REQUESTS, route, method, str(status_code))
+        if status_code >= 500:
+            registry.inc(ERRORS, route, method)
+        if size is not None:
+            registry.observe(RESPONSE_SIZE, size, route)
+        registry.observe(LATENCY, seconds, route, method)
+
+    def on_query(self, operation, params, seconds, phase='execute'):
+        """Called by the connection pool for every execute and fetch"""
+        route = current_route()
+        if phase == 'execute':
+            registry.inc(QUERIES, route)
+        registry.observe(QUERY_TIME, seconds, route, phase)
+        if has_request_context() and 'db_seconds' in g:
+            g.db_seconds += seconds
+            if phase == 'execute':
+                g.db_queries += 1
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            log_slow_query(route, phase, operation, params, seconds)
+
+    def on_acquire(self, seconds):
+        """Called by the connection pool after each checkout"""
+        registry.observe(ACQUIRE_TIME, seconds)
+        if has_request_context() and 'db_seconds' in g:
+            g.db_seconds += seconds
+
+    def reset(self):
+        """Start this process's metrics from zero, e.g. in a worker just forked
+        from a master whose own queries are already in the registry"""
+        with self._write_lock:
+            registry.clear()
+            self._retired = False
+        self._thread = None
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(self.metrics_dir, f"worker-{pid or os.getpid()}.json")
+
+    def write_snapshot(self):
+        """Save this process's values for other workers' /metrics to include"""
+        if not self.metrics_dir:
+            return
+        with self._write_lock:
+            if not self._retired:
+                write_json(self._snapshot_path(), registry.snapshot())
+
+    def retire(self, pid=None):
+        """Add an exiting worker's counters and histograms to retired.json and
+        remove its snapshot file. Without `pid`, retires this process from its
+        live values (gunicorn's worker_exit); with one, retires that worker's
+        last snapshot, if it left one (child_exit, e.g. after a timeout kill)"""
+        if not self.metrics_dir:
+            return
+        path = self._snapshot_path(pid)
+        with self._write_lock:
+            if pid is None:
+                if self._retired:
+                    return
+                self._retired = True
+                values = registry.snapshot()
+            else:
+                try:
+                    with open(path) as f:
+                        values = json.load(f)
+                except FileNotFoundError:
+                    return
+                except (OSError, ValueError):
+                    values = []
+            # Exiting workers may retire at the same time; one at a time updates the file
+            with open(os.path.join(self.metrics_dir, 'retired.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                retired_path = os.path.join(self.metrics_dir, RETIRED_FILE)
+                try:
+                    with open(retired_path) as f:
+                        retired = json.load(f)
+                except (OSError, ValueError):
+                    retired = []
+                totals = registry.merge([retired, values], CUMULATIVE_TYPES)
+                write_json(retired_path, [[name, list(labels), value]
+                                          for (name, labels), value in totals.items()])
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _ensure_thread(self):
+        # Started on first request so each worker process gets its own thread
+        if self.metrics_dir and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, name='metrics-snapshot', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"Error writing metrics snapshot: {e}")
+
+    def render(self):
+        """Metrics for /metrics: this process live, plus other workers' snapshots"""
+        snapshots = [registry.snapshot()]
+        if self.metrics_dir and os.path.isdir(self.metrics_dir):
+            own = os.path.basename(self._snapshot_path())
+            for name in os.listdir(self.metrics_dir):
+                if not name.endswith('.json') or name == own:
+                    continue
+                try:
+                    with open(os.path.join(self.metrics_dir, name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return registry.render(snapshots)
+
+
+def write_json(path, data):
+    """Replace `path` atomically, so readers never see a partial file"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def log_slow_query(route, phase, operation, params, seconds):
+    """One JSON line per slow statement, with its SQL and (shortened) parameters"""
+    if isinstance(params, dict):
+        params = list(params.values())
+    print(json.dumps({
+        'event': 'slow_query',
+        'route': route,
+        'phase': phase,
+        'duration_ms': round(seconds * 1000, 2),
+        'sql': ' '.join(str(operation).split()),
+        'params': [shorten(value) for value in params or ()]
+    }))
+
+
+def shorten(value, limit=200):
+    """Parameter as logged: bytes by size, long values truncated"""
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + '…'
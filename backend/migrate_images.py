@@ -0,0 +1,129 @@
+"""
+Move base64 images in question_image_data into the shared, content-addressed
+question_images store as binary, keyed by their SHA-256 hash (which is also
+used for ETags and cache-busting URLs). Identical images are stored once.
+
+Usage:
+    python migrate_images.py                 # every test bank
+    python migrate_images.py aws_saa_c03     # specific banks
+    python migrate_images.py --batch-size 100
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+
+import mysql.connector
+
+from app import DB_CONFIG, init_image_store_table
+from catalog import touch_signal_file
+
+# Same column definitions scraper.py adds to new tables
+IMAGE_COLUMNS = [
+    ("question_image_blob", "LONGBLOB AFTER question_image_data", None),
+    ("question_image_hash", "CHAR(64) AFTER question_image_blob", "idx_image_hash"),
+]
+
+
+def find_image_tables(cursor):
+    """Tables that still have the legacy question_image_data column"""
+    cursor.execute("""
+        SELECT TABLE_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME = 'question_image_data'
+        ORDER BY TABLE_NAME
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def add_image_columns(cursor, table_name):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table_name,))
+    existing = {row[0] for row in cursor.fetchall()}
+    for column, definition, index_name in IMAGE_COLUMNS:
+        if column in existing:
+            continue
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD COLUMN {column} {definition}")
+        if index_name:
+            cursor.execute(f"ALTER TABLE `{table_name}` ADD INDEX {index_name} ({column})")
+        print(f"  ✓ Added column {column}")
+
+
+def migrate_table(db, table_name, batch_size):
+    """Convert one table in batches, committing after each batch"""
+    cursor = db.cursor()
+    add_image_columns(cursor, table_name)
+
+    last_id = 0
+    migrated = 0
+    while True:
+        cursor.execute(f"""
+            SELECT id, question_image_data, question_image_type FROM `{table_name}`
+            WHERE question_image_data IS NOT NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        images = {}
+        updates = []
+        for question_id, image_data, image_type in rows:
+            last_id = question_id
+            try:
+                image = base64.b64decode(image_data, validate=True)
+            except (binascii.Error, ValueError) as e:
+                print(f"  Skipping question {question_id}: invalid base64 ({e})")
+                continue
+            image_hash = hashlib.sha256(image).hexdigest()
+            images[image_hash] = (image_type, image, len(image))
+            updates.append((image_hash, question_id))
+
+        if images:
+            cursor.executemany("""
+                INSERT IGNORE INTO question_images (hash, mime_type, data, size)
+                VALUES (%s, %s, %s, %s)
+            """, [(image_hash,) + values for image_hash, values in images.items()])
+        cursor.executemany(f"""
+            UPDATE `{table_name}`
+            SET question_image_hash = %s, question_image_data = NULL
+            WHERE id = %s
+        """, updates)
+        db.commit()
+        migrated += len(updates)
+        print(f"  {migrated} images migrated (up to id {last_id})")
+
+    cursor.close()
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate base64 question images to binary storage")
+    parser.add_argument("tables", nargs="*", help="Tables to migrate (default: all test banks)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per transaction")
+    args = parser.parse_args()
+
+    if not init_image_store_table():
+        raise SystemExit("Could not create the question_images table")
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        cursor = db.cursor()
+        tables = args.tables or find_image_tables(cursor)
+        cursor.close()
+
+        for table_name in tables:
+            print(f"Migrating images in '{table_name}'...")
+            migrated = migrate_table(db, table_name, args.batch_size)
+            print(f"✓ {table_name}: {migrated} images moved to question_images")
+    finally:
+        db.close()
+
+    # Running API processes reload the catalog and pick up the new columns
+    touch_signal_file()
+
+
+if __name__ == "__main__":
+    main()
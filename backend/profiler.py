@@ -0,0 +1,54 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+# Longest window /api/debug/profile will sample for
+MAX_PROFILE_SECONDS = 120
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread in this process at a fixed interval.
+
+    Output is in "collapsed stack" format (one `frame;frame;frame count` line
+    per distinct stack), which flamegraph.pl and speedscope read directly.
+    Only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self._running = threading.Lock()
+
+    def run(self, seconds, interval=0.01):
+        """Sample for `seconds` and return a Counter of collapsed stacks.
+
+        Raises RuntimeError if another profile is already in progress.
+        """
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError('A profile is already running')
+        try:
+            own_thread = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own_thread:
+                        stacks[collapse(names.get(thread_id, thread_id), frame)] += 1
+                time.sleep(interval)
+            return stacks
+        finally:
+            self._running.release()
+
+
+def collapse(thread_name, frame):
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    frames.append(str(thread_name))
+    return ';'.join(reversed(frames))
+
+
+def format_collapsed(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,62 @@
+# Per-user progress aggregates over user_stats, computed in MySQL with the
+# (user_id, table_name) index rather than by shipping every row to the client
+
+# A question is mastered once answered often enough and mostly correctly,
+# and struggling while it is answered wrongly more often than not
+MASTERED_MIN_ATTEMPTS = 2
+MASTERED_ACCURACY = 0.8
+STRUGGLING_ACCURACY = 0.5
+
+SUMMARY_COLUMNS = f"""
+    COUNT(*) AS questions_attempted,
+    COALESCE(SUM(attempts), 0) AS attempts,
+    COALESCE(SUM(correct), 0) AS correct,
+    SUM(attempts >= {MASTERED_MIN_ATTEMPTS} AND correct >= attempts * {MASTERED_ACCURACY}) AS mastered,
+    SUM(attempts > 0 AND correct < attempts * {STRUGGLING_ACCURACY}) AS struggling,
+    MAX(last_attempt) AS last_activity
+"""
+
+
+def format_summary(row):
+    attempts = int(row['attempts'] or 0)
+    correct = int(row['correct'] or 0)
+    return {
+        'questionsAttempted': int(row['questions_attempted'] or 0),
+        'attempts': attempts,
+        'correct': correct,
+        'accuracy': round(correct / attempts * 100, 1) if attempts else 0,
+        'mastered': int(row['mastered'] or 0),
+        'struggling': int(row['struggling'] or 0),
+        'lastActivity': row['last_activity'].isoformat() if row['last_activity'] else None
+    }
+
+
+def bank_summary(cursor, user_id, table_name):
+    """Progress totals for one user in one bank"""
+    cursor.execute(f"""
+        SELECT {SUMMARY_COLUMNS}
+        FROM user_stats
+        WHERE user_id = %s AND table_name = %s
+    """, (user_id, table_name))
+    return format_summary(cursor.fetchone())
+
+
+def user_summary(cursor, user_id):
+    """Progress totals for one user, per bank and overall"""
+    cursor.execute(f"""
+        SELECT table_name, {SUMMARY_COLUMNS}
+        FROM user_stats
+        WHERE user_id = %s
+        GROUP BY table_name WITH ROLLUP
+    """, (user_id,))
+    banks = {}
+    overall = None
+    for row in cursor.fetchall():
+        if row['table_name'] is None:
+            overall = format_summary(row)
+        else:
+            banks[row['table_name']] = format_summary(row)
+    return {'banks': banks, 'overall': overall or format_summary({
+        'questions_attempted': 0, 'attempts': 0, 'correct': 0,
+        'mastered': 0, 'struggling': 0, 'last_activity': None
+    })}
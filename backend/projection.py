@@ -0,0 +1,89 @@
+# Which question columns a request reads (view= / fields=) and how they are
+# encoded (format=compact). Unrequested columns are never selected.
+
+ANSWER_COLUMNS = ('answer_a', 'answer_b', 'answer_c', 'answer_d', 'answer_e', 'answer_f')
+
+# Response field -> columns it needs. question_image_src is built from the
+# image flag and hash columns the caller supplies (see image_columns in app.py)
+FIELD_COLUMNS = {
+    'id': ('id',),
+    'topic_name': ('topic_name',),
+    'question_text': ('question_text',),
+    'question_image_url': ('question_image_url',),
+    'question_image_src': (),
+    'question_image_type': ('question_image_type',),
+    'answers': ANSWER_COLUMNS,
+    'correct_answers': ('correct_answers',),
+    'page_number': ('page_number',),
+}
+
+VIEWS = {
+    'full': tuple(FIELD_COLUMNS),
+    'summary': ('id', 'topic_name', 'question_text', 'page_number'),
+    'answers-only': ('id', 'answers', 'correct_answers'),
+}
+DEFAULT_VIEW = 'full'
+
+# Short keys used by format=compact
+COMPACT_KEYS = {
+    'id': 'id',
+    'topic_name': 't',
+    'question_text': 'q',
+    'question_image_url': 'iu',
+    'question_image_src': 'img',
+    'question_image_type': 'it',
+    'correct_answers': 'c',
+    'answer_count': 'n',
+    'page_number': 'p',
+}
+
+
+def parse_fields(view=None, fields=None):
+    """Field names for a request; `fields` (comma separated) overrides `view`.
+
+    Raises ValueError for unknown views or fields so the caller can answer 400.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in FIELD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # id is always returned; it orders results and builds cursors and image URLs
+        return ('id',) + tuple(name for name in FIELD_COLUMNS if name in names and name != 'id')
+
+    view = view or DEFAULT_VIEW
+    if view not in VIEWS:
+        raise ValueError(f"Unknown view '{view}' (expected one of: {', '.join(VIEWS)})")
+    return VIEWS[view]
+
+
+def parse_projection(args):
+    """(fields, compact) from a request's view=, fields= and format= query parameters"""
+    fields = parse_fields(args.get('view'), args.get('fields'))
+    encoding = args.get('format') or 'full'
+    if encoding not in ('full', 'compact'):
+        raise ValueError("'format' must be 'full' or 'compact'")
+    return fields, encoding == 'compact'
+
+
+def select_columns(fields, image_sql):
+    """SELECT list for `fields`; image_sql supplies has_image_data and question_image_hash"""
+    columns = [column for name in fields for column in FIELD_COLUMNS[name]]
+    if 'question_image_src' in fields:
+        columns.append(image_sql)
+    return ', '.join(columns)
+
+
+def compact_question(question):
+    """Short keys, answer options as a list (A first), and no null values"""
+    compact = {}
+    for name, key in COMPACT_KEYS.items():
+        value = question.get(name)
+        if value is not None:
+            compact[key] = value
+    if 'answer_a' in question:
+        answers = [question[column] for column in ANSWER_COLUMNS]
+        while answers and answers[-1] is None:
+            answers.pop()
+        compact['a'] = answers
+    return compact
@@ -0,0 +1,146 @@
+import json
+import secrets
+
+# Server-side quiz sessions. The question order is frozen when a session is
+# created, so any worker can serve its batches and grade its answers; correct
+# answers only leave the server in the response to a submitted answer.
+QUIZ_SESSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS quiz_sessions (
+        id CHAR(32) PRIMARY KEY,
+        user_id VARCHAR(255) NOT NULL,
+        table_name VARCHAR(255) NOT NULL,
+        question_ids MEDIUMTEXT NOT NULL,
+        seed VARCHAR(32),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_created_at (created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+# Longest seed the seed column stores
+MAX_SEED_LENGTH = 32
+
+# Latest answer per question in a session (a question can be answered again)
+QUIZ_SESSION_ANSWERS_DDL = """
+    CREATE TABLE IF NOT EXISTS quiz_session_answers (
+        session_id CHAR(32) NOT NULL,
+        question_id INT NOT NULL,
+        answer VARCHAR(20) NOT NULL,
+        is_correct BOOLEAN NOT NULL,
+        answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (session_id, question_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+ANSWER_LETTERS = 'ABCDEF'
+
+# Expired sessions deleted each time a session is created (see delete_expired_sessions)
+EXPIRED_SESSIONS_PER_CREATE = 100
+
+
+def new_session_id():
+    return secrets.token_hex(16)
+
+
+def answer_letters(value):
+    """Normalize ["a", "C"] or "A,C" to a sorted list of answer letters.
+
+    Raises ValueError for anything else so the caller can answer 400.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not value:
+        raise ValueError('answer must be a non-empty list of letters')
+    letters = set()
+    for letter in value:
+        letter = letter.strip().upper() if isinstance(letter, str) else None
+        if not letter or letter not in ANSWER_LETTERS:
+            raise ValueError(f'answer letters must be one of {", ".join(ANSWER_LETTERS)}')
+        letters.add(letter)
+    return sorted(letters)
+
+
+def correct_letters(correct_answers):
+    return sorted(letter.strip().upper() for letter in correct_answers.split(',') if letter.strip())
+
+
+def delete_expired_sessions(cursor, ttl_hours, limit=EXPIRED_SESSIONS_PER_CREATE):
+    """Delete up to `limit` expired sessions and their answers.
+
+    Sessions are short-lived, so each new one clears out a small batch of
+    expired ones. The ids are read first (a plain read, no locks) and deleted
+    by primary key, so the request's transaction only locks those rows rather
+    than the whole created_at range.
+    """
+    cursor.execute("""
+        SELECT id FROM quiz_sessions
+        WHERE created_at < NOW() - INTERVAL %s HOUR
+        ORDER BY created_at
+        LIMIT %s
+    """, (ttl_hours, limit))
+    expired = [row['id'] for row in cursor.fetchall()]
+    if not expired:
+        return 0
+    placeholders = ', '.join(['%s'] * len(expired))
+    cursor.execute(f"DELETE FROM quiz_session_answers WHERE session_id IN ({placeholders})", tuple(expired))
+    cursor.execute(f"DELETE FROM quiz_sessions WHERE id IN ({placeholders})", tuple(expired))
+    return len(expired)
+
+
+def create_session(cursor, user_id, table_name, question_ids, seed, ttl_hours):
+    """Store a new session with its frozen question order; returns the session id"""
+    delete_expired_sessions(cursor, ttl_hours)
+    session_id = new_session_id()
+    cursor.execute("""
+        INSERT INTO quiz_sessions (id, user_id, table_name, question_ids, seed)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (session_id, user_id, table_name, json.dumps(question_ids), seed))
+    return session_id
+
+
+# Statements shared by the sync helpers below and the async routes (async_app.py)
+LOAD_SESSION_SQL = """
+    SELECT id, user_id, table_name, question_ids, seed
+    FROM quiz_sessions
+    WHERE id = %s AND table_name = %s AND created_at >= NOW() - INTERVAL %s HOUR
+"""
+
+SAVE_ANSWER_SQL = """
+    INSERT INTO quiz_session_answers (session_id, question_id, answer, is_correct)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE answer = VALUES(answer), is_correct = VALUES(is_correct)
+"""
+
+SESSION_ANSWERS_SQL = """
+    SELECT question_id, answer, is_correct
+    FROM quiz_session_answers
+    WHERE session_id = %s
+"""
+
+
+def decode_session(session):
+    """A quiz_sessions row with question_ids decoded (None stays None)"""
+    if session:
+        session['question_ids'] = json.loads(session['question_ids'])
+    return session
+
+
+def decode_answers(rows):
+    """{question_id: {'answer': [...], 'isCorrect': bool}} from quiz_session_answers rows"""
+    return {row['question_id']: {'answer': row['answer'].split(','), 'isCorrect': bool(row['is_correct'])}
+            for row in rows}
+
+
+def load_session(cursor, session_id, table_name, ttl_hours):
+    """The session's row with question_ids decoded, or None if unknown or expired"""
+    cursor.execute(LOAD_SESSION_SQL, (session_id, table_name, ttl_hours))
+    return decode_session(cursor.fetchone())
+
+
+def save_answer(cursor, session_id, question_id, letters, is_correct):
+    cursor.execute(SAVE_ANSWER_SQL, (session_id, question_id, ','.join(letters), is_correct))
+
+
+def session_answers(cursor, session_id):
+    """{question_id: {'answer': [...], 'isCorrect': bool}} for answered questions"""
+    cursor.execute(SESSION_ANSWERS_SQL, (session_id,))
+    return decode_answers(cursor.fetchall())
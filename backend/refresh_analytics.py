@@ -0,0 +1,61 @@
+"""
+Rebuild the cohort analytics rollups behind /api/analytics from user_stats.
+The API keeps them current as attempts are recorded and statistics reset,
+and builds them at startup when they are still empty. Merging duplicate
+questions moves statistics without going through the API, so
+scraper.dedupe_topic_table runs this for the bank it merged.
+
+The rebuild is one transaction: the endpoints keep reading the previous
+rollups until it commits, and attempt writes wait for it.
+
+Usage:
+    python refresh_analytics.py                # every bank
+    python refresh_analytics.py aws_saa_c03    # one bank and its learners
+"""
+import argparse
+import time
+
+import mysql.connector
+
+from analytics import ANALYTICS_DDL, rebuild_statements
+from app import DB_CONFIG, table_is_empty
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the cohort analytics rollups from user_stats")
+    parser.add_argument("tables", nargs="*",
+                        help="Only rebuild these banks' rows and their learners' totals (default: everything)")
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        cursor = db.cursor()
+        for ddl in ANALYTICS_DDL:
+            cursor.execute(ddl)
+        db.commit()
+
+        # Rollups the API has not built yet are built in full, not bank by bank
+        tables = args.tables
+        if tables and table_is_empty(cursor, 'learner_bank_rollup'):
+            tables = []
+        started = time.perf_counter()
+        for table_name in tables or [None]:
+            for sql, params in rebuild_statements(table_name):
+                cursor.execute(sql, params)
+        db.commit()
+
+        cursor.execute("SELECT COUNT(*) FROM question_rollup")
+        questions = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM learner_rollup")
+        learners = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        db.close()
+
+    scope = ', '.join(tables) if tables else 'all banks'
+    print(f"✓ Rebuilt analytics rollups ({scope}): {questions} questions, {learners} learners "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
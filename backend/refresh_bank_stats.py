@@ -0,0 +1,44 @@
+"""
+Recompute the materialized bank_stats rows behind /api/stats. The API
+computes a missing row on first request; run this after bulk changes (or
+from cron) so no request has to pay for the aggregate scans.
+
+Usage:
+    python refresh_bank_stats.py                 # every test bank
+    python refresh_bank_stats.py aws_saa_c03     # specific banks
+"""
+import argparse
+
+import mysql.connector
+
+from app import DB_CONFIG, catalog
+from bank_stats import BANK_STATS_DDL, compute_bank_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute precomputed test bank statistics")
+    parser.add_argument("tables", nargs="*", help="Banks to refresh (default: all)")
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**DB_CONFIG)
+    try:
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(BANK_STATS_DDL)
+        # The catalog knows each bank's columns in either question store
+        banks = {bank['name'] for bank in catalog.banks()}
+        tables = args.tables or sorted(banks)
+
+        for table_name in tables:
+            if table_name not in banks:
+                print(f"Skipping '{table_name}': not a test bank")
+                continue
+            stats = compute_bank_stats(cursor, catalog.source(table_name))
+            db.commit()
+            print(f"✓ {table_name}: {stats['total_questions']} questions")
+        cursor.close()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import random
+import secrets
+import threading
+
+
+def new_seed():
+    """Random seed for a quiz that did not supply one"""
+    return str(secrets.randbelow(2**31))
+
+
+def seeded_slice(ids, seed, start, stop):
+    """Return positions [start, stop) of a seeded shuffle of ids.
+
+    Runs a Fisher-Yates shuffle only as far as `stop`, tracking swaps in a
+    dict, so the cost depends on the page position and not on the bank
+    size. The same seed always yields the same order, so paging through a
+    randomized quiz never reshuffles it.
+    """
+    rng = random.Random(seed)
+    n = len(ids)
+    stop = min(stop, n)
+    swapped = {}
+    page = []
+    for i in range(stop):
+        j = rng.randrange(i, n)
+        value_i = swapped.get(i, ids[i])
+        value_j = swapped.get(j, ids[j])
+        swapped[j] = value_i
+        if i >= start:
+            page.append(value_j)
+    return page
+
+
+class QuestionIdCache:
+    """Per-bank list of question ids, reloaded whenever the catalog reloads"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def cached(self, table_name):
+        """Sorted question ids for a bank if loaded since the catalog last reloaded, else None"""
+        cached = self._ids.get(table_name)
+        if cached and cached[0] == self.catalog.version:
+            return cached[1]
+        return None
+
+    def query(self, table_name):
+        """(sql, params) selecting a bank's question ids in order"""
+        source = self.catalog.source(table_name)
+        where, params = source.scope()
+        return f"SELECT id FROM {source.table} WHERE {where} ORDER BY id", params
+
+    def store(self, table_name, version, rows):
+        """Cache the rows returned by query() as loaded at catalog `version`; returns the ids"""
+        ids = [row['id'] if isinstance(row, dict) else row[0] for row in rows]
+        with self._lock:
+            self._ids[table_name] = (version, ids)
+        return ids
+
+    def get(self, table_name, cursor):
+        """Sorted question ids for a bank; loads them with cursor on a miss"""
+        # Read before querying, so a reload during the query isn't cached as current
+        version = self.catalog.version
+        ids = self.cached(table_name)
+        if ids is not None:
+            return ids
+
+        sql, params = self.query(table_name)
+        cursor.execute(sql, params)
+        return self.store(table_name, version, cursor.fetchall())
+
+    def sample(self, table_name, cursor, seed, start, stop):
+        """Question ids at positions [start, stop) of the bank shuffled by seed"""
+        return seeded_slice(self.get(table_name, cursor), seed, start, stop)
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta, timezone
+
+# SM-2 spaced repetition state per (user, bank, question). Reviews are
+# applied in SQL by the same upsert that records them, so recording stays one
+# statement per chunk and next-due selection is one range scan on idx_due.
+REVIEW_SCHEDULE_DDL = """
+    CREATE TABLE IF NOT EXISTS review_schedule (
+        user_id VARCHAR(255) NOT NULL,
+        table_name VARCHAR(255) NOT NULL,
+        question_id INT NOT NULL,
+        ease DOUBLE NOT NULL DEFAULT 2.5,
+        interval_days INT NOT NULL DEFAULT 0,
+        repetitions INT NOT NULL DEFAULT 0,
+        last_quality TINYINT NOT NULL,
+        reviewed_at DATETIME NOT NULL,
+        due_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, table_name, question_id),
+        INDEX idx_due (user_id, table_name, due_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+# Rows per INSERT statement, as in stats_writer.py
+ROWS_PER_STATEMENT = 500
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+# SM-2 grades (0-5) given to a review; 3 and above count as recalled
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 1
+
+
+def review_quality(attempts, correct):
+    """Grade for the attempts on one question recorded together"""
+    return CORRECT_QUALITY if attempts and correct >= attempts else WRONG_QUALITY
+
+
+def next_ease(ease, quality):
+    return max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+
+def first_review(quality, now):
+    """(ease, interval_days, repetitions, due_at) after a question's first review"""
+    repetitions = 1 if quality >= 3 else 0
+    return next_ease(INITIAL_EASE, quality), 1, repetitions, now + timedelta(days=1)
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def review_statements(counts, now=None):
+    """(sql, params) upserts applying one SM-2 review per question in counts"""
+    now = now or utc_now()
+    rows = []
+    for (user_id, table_name, question_id), (attempts, correct) in sorted(counts.items()):
+        quality = review_quality(attempts, correct)
+        ease, interval_days, repetitions, due_at = first_review(quality, now)
+        rows.append((user_id, table_name, question_id, ease, interval_days, repetitions,
+                     quality, now, due_at))
+
+    for offset in range(0, len(rows), ROWS_PER_STATEMENT):
+        chunk = rows[offset:offset + ROWS_PER_STATEMENT]
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))
+        # MySQL applies these assignments left to right, so interval_days sees
+        # the old repetitions and ease, and due_at sees the new interval_days
+        yield f"""
+            INSERT INTO review_schedule
+                (user_id, table_name, question_id, ease, interval_days, repetitions,
+                 last_quality, reviewed_at, due_at)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE
+                interval_days = IF(VALUES(last_quality) >= 3,
+                                   CASE repetitions WHEN 0 THEN 1 WHEN 1 THEN 6
+                                        ELSE ROUND(interval_days * ease) END,
+                                   1),
+                repetitions = IF(VALUES(last_quality) >= 3, repetitions + 1, 0),
+                ease = GREATEST({MIN_EASE}, ease + 0.1 - (5 - VALUES(last_quality))
+                                * (0.08 + (5 - VALUES(last_quality)) * 0.02)),
+                last_quality = VALUES(last_quality),
+                reviewed_at = VALUES(reviewed_at),
+                due_at = VALUES(reviewed_at) + INTERVAL interval_days DAY
+        """, tuple(value for row in chunk for value in row)
+
+
+def backfill_statement():
+    """(sql, params) giving every user_stats row without a schedule one review,
+    graded from its totals and dated at its last attempt. Seeds the schedule
+    for learners whose history predates review_schedule"""
+    recalled = "attempts > 0 AND correct >= attempts"
+    return f"""
+        INSERT IGNORE INTO review_schedule
+            (user_id, table_name, question_id, ease, interval_days, repetitions,
+             last_quality, reviewed_at, due_at)
+        SELECT user_id, table_name, question_id,
+               IF({recalled}, %s, %s), 1, IF({recalled}, 1, 0), IF({recalled}, %s, %s),
+               reviewed_at, reviewed_at + INTERVAL 1 DAY
+        FROM (
+            SELECT user_id, table_name, question_id, attempts, correct,
+                   last_attempt - INTERVAL TIMESTAMPDIFF(SECOND, UTC_TIMESTAMP(), NOW()) SECOND
+                       AS reviewed_at
+            FROM user_stats
+            WHERE user_id IS NOT NULL AND attempts > 0
+        ) AS history
+    """, (next_ease(INITIAL_EASE, CORRECT_QUALITY), next_ease(INITIAL_EASE, WRONG_QUALITY),
+          CORRECT_QUALITY, WRONG_QUALITY)
+
+
+def next_due(cursor, user_id, table_name, limit):
+    """The `limit` questions due soonest (overdue first), from the idx_due index"""
+    cursor.execute("""
+        SELECT question_id, ease, interval_days, repetitions, due_at
+        FROM review_schedule
+        WHERE user_id = %s AND table_name = %s
+        ORDER BY due_at
+        LIMIT %s
+    """, (user_id, table_name, limit))
+    return cursor.fetchall()
+
+
+def format_review(row, now=None):
+    now = now or utc_now()
+    return {
+        'dueAt': row['due_at'].isoformat(),
+        'overdue': row['due_at'] <= now,
+        'intervalDays': row['interval_days'],
+        'ease': round(row['ease'], 2),
+        'repetitions': row['repetitions']
+    }
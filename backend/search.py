@@ -0,0 +1,149 @@
+import html
+import re
+
+# Columns covered by the FULLTEXT index scraper.py creates (order matters for MATCH)
+SEARCH_COLUMNS = ('question_text', 'answer_a', 'answer_b', 'answer_c',
+                  'answer_d', 'answer_e', 'answer_f')
+FULLTEXT_INDEX = 'ft_question_answers'
+
+# InnoDB ignores shorter words (innodb_ft_min_token_size); such queries fall back to LIKE
+MIN_TOKEN_LENGTH = 3
+
+SNIPPET_LENGTH = 160
+
+
+def search_terms(keyword):
+    return re.findall(r'\w+', keyword.lower())
+
+
+def use_fulltext(keyword):
+    """Whether FULLTEXT can answer this query (some term long enough to be indexed)"""
+    return any(len(term) >= MIN_TOKEN_LENGTH for term in search_terms(keyword))
+
+
+def match_condition(keyword, fulltext, prefix=''):
+    """(score SQL, score params, where SQL, where params) for a keyword"""
+    columns = ', '.join(f"{prefix}{column}" for column in SEARCH_COLUMNS)
+    if fulltext:
+        match = f"MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        return match, [keyword], match, [keyword]
+    # No usable index: score by how many columns contain the keyword
+    like = f"%{keyword}%"
+    score = ' + '.join(f"({prefix}{column} LIKE %s)" for column in SEARCH_COLUMNS)
+    where = ' OR '.join(f"{prefix}{column} LIKE %s" for column in SEARCH_COLUMNS)
+    return score, [like] * len(SEARCH_COLUMNS), where, [like] * len(SEARCH_COLUMNS)
+
+
+def build_table_query(source, keyword, fulltext, limit):
+    """SELECT returning one bank table's best matches, scored relative to the
+    best of them (1.0), so branches using MATCH and LIKE can be merged"""
+    score, score_params, where, where_params = match_condition(keyword, fulltext)
+    bank_where, bank_params = source.scope()
+    columns = ', '.join(SEARCH_COLUMNS)
+    sql = f"""
+        (SELECT table_name, id, topic_name, {columns}, correct_answers,
+                raw_score / MAX(raw_score) OVER () AS score
+         FROM (SELECT %s AS table_name, id, topic_name, {columns}, correct_answers,
+                      {score} AS raw_score
+               FROM {source.table}
+               WHERE {bank_where} AND ({where})
+               ORDER BY raw_score DESC, id
+               LIMIT %s) matches)
+    """
+    return sql, [source.table_name] + score_params + list(bank_params) + where_params + [limit]
+
+
+def build_questions_query(sources, keyword, fulltext):
+    """One SELECT over the shared questions table for banks in the normalized
+    store. All banks share one index, so scores are comparable as they are;
+    they are only scaled so the best match is 1.0, as for per-bank tables."""
+    score, score_params, where, where_params = match_condition(keyword, fulltext, 'q.')
+    columns = ', '.join(SEARCH_COLUMNS)
+    bank_ids = [source.bank_id for source in sources]
+    sql = f"""
+        SELECT table_name, id, topic_name, {columns}, correct_answers,
+               raw_score / MAX(raw_score) OVER () AS score
+        FROM (SELECT b.table_name, q.id, q.topic_name, {', '.join(f"q.{column}" for column in SEARCH_COLUMNS)},
+                     q.correct_answers, {score} AS raw_score
+              FROM questions q
+              JOIN banks b ON b.id = q.bank_id
+              WHERE q.bank_id IN ({', '.join(['%s'] * len(bank_ids))}) AND ({where})) matches
+        ORDER BY score DESC, table_name, id
+        LIMIT %s OFFSET %s
+    """
+    return sql, score_params + bank_ids + where_params
+
+
+def search_banks(cursor, sources, keyword, page, per_page):
+    """Relevance-ranked matches across banks (catalog BankSources).
+
+    Banks in the shared questions table are searched with a single query;
+    per-bank tables with one UNION ALL branch each, using LIKE instead of
+    MATCH where the FULLTEXT index is missing. MATCH relevance depends on
+    each table's own index and LIKE counts matching columns, so each branch
+    divides its scores by its best one: a bank's top match scores 1.0, and
+    results are ordered by that score, then bank and id. Returns (results,
+    has_more) for the requested page.
+    """
+    if not sources:
+        return [], False
+    fulltext_ok = use_fulltext(keyword)
+    offset = (page - 1) * per_page
+
+    if all(source.bank_id is not None for source in sources):
+        sql, params = build_questions_query(sources, keyword, fulltext_ok)
+        cursor.execute(sql, tuple(params) + (per_page + 1, offset))
+    else:
+        # Each bank only needs to supply enough rows to fill this page
+        limit = offset + per_page + 1
+        selects, params = [], []
+        for source in sources:
+            fulltext = fulltext_ok and source.has_index(FULLTEXT_INDEX)
+            sql, table_params = build_table_query(source, keyword, fulltext, limit)
+            selects.append(sql)
+            params.extend(table_params)
+        cursor.execute(
+            " UNION ALL ".join(selects) + " ORDER BY score DESC, table_name, id LIMIT %s OFFSET %s",
+            tuple(params) + (per_page + 1, offset)
+        )
+    rows = cursor.fetchall()
+
+    terms = search_terms(keyword)
+    for row in rows:
+        row['score'] = round(float(row['score'] or 0), 4)
+        row['matched_field'], row['snippet'] = make_snippet(row, terms, keyword)
+    return rows[:per_page], len(rows) > per_page
+
+
+def make_snippet(row, terms, keyword):
+    """HTML-escaped excerpt of the best matching field with matches in <mark>"""
+    patterns = [re.escape(keyword)] + [re.escape(term) for term in terms if len(term) > 1]
+    pattern = re.compile('|'.join(patterns), re.IGNORECASE)
+
+    for column in SEARCH_COLUMNS:
+        text = row.get(column) or ''
+        match = pattern.search(text)
+        if match:
+            break
+    else:
+        column, text, match = 'question_text', row.get('question_text') or '', None
+
+    start = 0
+    if match and match.start() > SNIPPET_LENGTH // 3:
+        start = match.start() - SNIPPET_LENGTH // 3
+    excerpt = text[start:start + SNIPPET_LENGTH]
+
+    highlighted = []
+    position = 0
+    for found in pattern.finditer(excerpt):
+        highlighted.append(html.escape(excerpt[position:found.start()]))
+        highlighted.append(f"<mark>{html.escape(found.group())}</mark>")
+        position = found.end()
+    highlighted.append(html.escape(excerpt[position:]))
+
+    snippet = ''.join(highlighted)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + SNIPPET_LENGTH < len(text):
+        snippet += '…'
+    return column, snippet
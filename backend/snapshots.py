@@ -0,0 +1,372 @@
+import base64
+import bisect
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime
+
+from projection import ANSWER_COLUMNS, FIELD_COLUMNS
+
+# Read-only copies of test banks, compiled by build_snapshots.py and
+# memory-mapped by every API process, so question and image reads skip
+# MySQL. Each bank has a directory of generations plus a `current` symlink;
+# a build writes a new generation and swaps the symlink in one rename.
+#
+# questions.bin: header, packed question records, then the sorted question
+#   ids (int64) and each record's offset (uint64, plus one past the last).
+#   Integers are little-endian and the id and offset arrays are read in
+#   place, so snapshots are only portable between little-endian hosts.
+# images.bin: header, image bytes, then fixed-size index entries sorted by
+#   (hash, kind): kind is empty for the original or a variant's MIME type.
+
+QUESTIONS_FILE = 'questions.bin'
+IMAGES_FILE = 'images.bin'
+CURRENT_LINK = 'current'
+
+QUESTIONS_MAGIC = b'EQSNAPQ1'
+IMAGES_MAGIC = b'EQSNAPI1'
+# magic, question count, ids offset, offsets offset, build time
+QUESTIONS_HEADER = struct.Struct('<8sQQQd')
+# magic, entry count, index offset
+IMAGES_HEADER = struct.Struct('<8sQQ')
+# sha256, kind, data offset, data length
+IMAGE_ENTRY = struct.Struct('<32s16sQQ')
+
+# Text columns of a record, in stored order. question_image_hash is the
+# column as the API would read it (NULL for tables predating
+# migrate_images.py); image_key is the content hash indexing images.bin.
+TEXT_COLUMNS = ('topic_name', 'question_text', 'question_image_url', 'question_image_type') + ANSWER_COLUMNS + (
+    'correct_answers', 'question_image_hash', 'image_key')
+TEXT_INDEX = {name: index for index, name in enumerate(TEXT_COLUMNS)}
+# Null bitmap of the text columns, page_number (missing is -1), then each text column's end offset
+RECORD_HEADER = struct.Struct(f'<Hq{len(TEXT_COLUMNS)}I')
+
+
+def pack_record(row):
+    """One question as stored in questions.bin"""
+    nulls = 0
+    ends = []
+    data = bytearray()
+    for index, name in enumerate(TEXT_COLUMNS):
+        value = row.get(name)
+        if value is None:
+            nulls |= 1 << index
+        else:
+            data += str(value).encode('utf-8')
+        ends.append(len(data))
+    page_number = row.get('page_number')
+    return RECORD_HEADER.pack(nulls, -1 if page_number is None else page_number, *ends) + data
+
+
+class BankSnapshot:
+    """One generation of a bank's snapshot, memory-mapped read-only.
+
+    The mappings are shared through the page cache by every process that
+    opens the same files, so each worker adds no copy of its own.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, QUESTIONS_FILE), 'rb') as f:
+            self._questions = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, ids_at, offsets_at, self.built_at = QUESTIONS_HEADER.unpack_from(self._questions)
+        if magic != QUESTIONS_MAGIC:
+            raise ValueError(f"{path} is not a question snapshot")
+        view = memoryview(self._questions)
+        # Zero-copy int arrays over the mapping; bisect and seeded_slice index them directly
+        self.ids = view[ids_at:ids_at + 8 * self.count].cast('q')
+        self._offsets = view[offsets_at:offsets_at + 8 * (self.count + 1)].cast('Q')
+
+        with open(os.path.join(path, IMAGES_FILE), 'rb') as f:
+            self._images = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._image_count, self._index_at = IMAGES_HEADER.unpack_from(self._images)
+        if magic != IMAGES_MAGIC:
+            raise ValueError(f"{path} is not an image snapshot")
+
+    def position(self, question_id):
+        """Index of a question id in self.ids, or None"""
+        position = bisect.bisect_left(self.ids, question_id)
+        if position < self.count and self.ids[position] == question_id:
+            return position
+        return None
+
+    def after(self, after_id, limit):
+        """Ids of the `limit` questions following after_id"""
+        position = bisect.bisect_right(self.ids, after_id)
+        return list(self.ids[position:position + limit])
+
+    def _text(self, start, header, name):
+        index = TEXT_INDEX[name]
+        if header[0] >> index & 1:
+            return None
+        begin = start + RECORD_HEADER.size + (header[index + 1] if index else 0)
+        end = start + RECORD_HEADER.size + header[index + 2]
+        return str(self._questions[begin:end], 'utf-8')
+
+    def _row(self, position, fields):
+        start = self._offsets[position]
+        header = RECORD_HEADER.unpack_from(self._questions, start)
+        row = {}
+        for field in fields:
+            for column in FIELD_COLUMNS[field]:
+                if column == 'id':
+                    row['id'] = self.ids[position]
+                elif column == 'page_number':
+                    row['page_number'] = None if header[1] == -1 else header[1]
+                else:
+                    row[column] = self._text(start, header, column)
+        if 'question_image_src' in fields:
+            # The same keys image_columns() selects in app.py
+            row['has_image_data'] = int(self._text(start, header, 'image_key') is not None)
+            row['question_image_hash'] = self._text(start, header, 'question_image_hash')
+        return row
+
+    def questions(self, ids, fields):
+        """Rows (as the API's queries would return them) for the ids present, in the given order"""
+        rows = []
+        for question_id in ids:
+            position = self.position(question_id)
+            if position is not None:
+                rows.append(self._row(position, fields))
+        return rows
+
+    def _image_entry(self, index):
+        return IMAGE_ENTRY.unpack_from(self._images, self._index_at + index * IMAGE_ENTRY.size)
+
+    def _image_entries(self, image_key):
+        """{kind: (offset, length)} of an image and its variants"""
+        key = bytes.fromhex(image_key)
+        low, high = 0, self._image_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._image_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = {}
+        while low < self._image_count:
+            entry_hash, kind, offset, length = self._image_entry(low)
+            if entry_hash != key:
+                break
+            entries[kind.rstrip(b'\0').decode('ascii')] = (offset, length)
+            low += 1
+        return entries
+
+    def image(self, question_id, variant_types=()):
+        """(image bytes, hash, variant type or None, stored MIME type) for a
+        question, preferring a variant in variant_types; None if it has no image"""
+        position = self.position(question_id)
+        if position is None:
+            return None
+        start = self._offsets[position]
+        header = RECORD_HEADER.unpack_from(self._questions, start)
+        image_key = self._text(start, header, 'image_key')
+        if image_key is None:
+            return None
+        entries = self._image_entries(image_key)
+        variant_type = next((mime_type for mime_type in variant_types if mime_type in entries), None)
+        if (variant_type or '') not in entries:
+            # The question references an image missing from question_images
+            return None
+        offset, length = entries[variant_type or '']
+        return (self._images[offset:offset + length], image_key, variant_type,
+                self._text(start, header, 'question_image_type'))
+
+
+class SnapshotWriter:
+    """Streams one bank's questions and images into a new generation directory"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path)
+        self._questions = open(os.path.join(path, QUESTIONS_FILE), 'wb')
+        self._questions.write(b'\0' * QUESTIONS_HEADER.size)
+        self._images = open(os.path.join(path, IMAGES_FILE), 'wb')
+        self._images.write(b'\0' * IMAGES_HEADER.size)
+        self.ids = []
+        self._offsets = []
+        self._entries = {}
+
+    @property
+    def image_count(self):
+        return len(self._entries)
+
+    def add_question(self, row):
+        if self.ids and row['id'] <= self.ids[-1]:
+            raise ValueError("Questions must be added in increasing id order")
+        self.ids.append(row['id'])
+        self._offsets.append(self._questions.tell())
+        self._questions.write(pack_record(row))
+
+    def has_image(self, image_key, kind=''):
+        return (image_key, kind) in self._entries
+
+    def add_image(self, image_key, data, kind=''):
+        if self.has_image(image_key, kind):
+            return
+        self._entries[(image_key, kind)] = (self._images.tell(), len(data))
+        self._images.write(data)
+
+    def finish(self, built_at=None):
+        """Write the indexes and headers and flush everything to disk"""
+        self._offsets.append(self._questions.tell())
+        # Align the arrays so they can be read in place
+        self._questions.write(b'\0' * (-self._questions.tell() % 8))
+        ids_at = self._questions.tell()
+        self._questions.write(struct.pack(f'<{len(self.ids)}q', *self.ids))
+        offsets_at = self._questions.tell()
+        self._questions.write(struct.pack(f'<{len(self._offsets)}Q', *self._offsets))
+        self._questions.seek(0)
+        self._questions.write(QUESTIONS_HEADER.pack(QUESTIONS_MAGIC, len(self.ids), ids_at, offsets_at,
+                                                    built_at or time.time()))
+
+        index_at = self._images.tell()
+        for (image_key, kind), (offset, length) in sorted(self._entries.items()):
+            self._images.write(IMAGE_ENTRY.pack(bytes.fromhex(image_key), kind.encode('ascii'), offset, length))
+        self._images.seek(0)
+        self._images.write(IMAGES_HEADER.pack(IMAGES_MAGIC, len(self._entries), index_at))
+
+        for f in (self._questions, self._images):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+    def abort(self):
+        for f in (self._questions, self._images):
+            f.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def snapshot_columns(source):
+    """SELECT list for a bank's snapshot, NULL for columns older tables lack"""
+    columns = ['id']
+    for name in ('topic_name', 'question_text', 'question_image_url', 'question_image_type') + ANSWER_COLUMNS + (
+            'correct_answers', 'page_number', 'question_image_hash', 'question_image_data', 'question_image_blob'):
+        columns.append(name if source.has_column(name) else f"NULL AS {name}")
+    return ', '.join(columns)
+
+
+def write_snapshot(connection, source, directory, keep=2, batch_size=200):
+    """Compile one bank into a new generation under directory/<bank> and make
+    it current; returns (question count, image count, generation path)"""
+    bank_directory = os.path.join(directory, source.table_name)
+    os.makedirs(bank_directory, exist_ok=True)
+    generation = os.path.join(bank_directory, f"gen-{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}")
+    writer = SnapshotWriter(generation + '.building')
+    try:
+        stored = set()
+        cursor = connection.cursor(dictionary=True)
+        where, params = source.scope()
+        cursor.execute(f"SELECT {snapshot_columns(source)} FROM {source.table} WHERE {where} ORDER BY id", params)
+        for row in cursor:
+            image = None
+            if row['question_image_hash']:
+                stored.add(row['question_image_hash'])
+                row['image_key'] = row['question_image_hash']
+            elif row['question_image_blob'] is not None:
+                image = bytes(row['question_image_blob'])
+            elif row['question_image_data']:
+                # Not yet migrated to binary storage
+                image = base64.b64decode(row['question_image_data'])
+            if image is not None:
+                row['image_key'] = hashlib.sha256(image).hexdigest()
+                writer.add_image(row['image_key'], image)
+            writer.add_question(row)
+        cursor.close()
+
+        # Images in the shared store, with their optimized variants (see image_optimizer.py)
+        cursor = connection.cursor()
+        hashes = sorted(stored)
+        for start in range(0, len(hashes), batch_size):
+            batch = tuple(hashes[start:start + batch_size])
+            marks = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"SELECT hash, data FROM question_images WHERE hash IN ({marks})", batch)
+            for image_hash, data in cursor.fetchall():
+                writer.add_image(image_hash, bytes(data))
+            cursor.execute(f"""
+                SELECT hash, mime_type, data FROM question_image_variants
+                WHERE hash IN ({marks}) AND data IS NOT NULL
+            """, batch)
+            for image_hash, mime_type, data in cursor.fetchall():
+                writer.add_image(image_hash, bytes(data), mime_type)
+        cursor.close()
+        writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+
+    os.rename(writer.path, generation)
+    swap_current(bank_directory, generation)
+    prune_generations(bank_directory, keep)
+    return len(writer.ids), writer.image_count, generation
+
+
+def swap_current(bank_directory, generation):
+    """Point bank_directory/current at generation in one atomic rename"""
+    link = os.path.join(bank_directory, CURRENT_LINK)
+    temp_link = f"{link}.{os.getpid()}"
+    os.symlink(os.path.basename(generation), temp_link)
+    os.replace(temp_link, link)
+
+
+def prune_generations(bank_directory, keep):
+    """Remove all but the newest `keep` generations. Processes that still map
+    a removed one keep reading it until they switch (the kernel frees it then)"""
+    current = os.path.realpath(os.path.join(bank_directory, CURRENT_LINK))
+    generations = sorted(
+        (entry.path for entry in os.scandir(bank_directory)
+         if entry.is_dir(follow_symlinks=False) and entry.name.startswith('gen-')
+         and not entry.name.endswith('.building')),
+        key=os.path.getmtime, reverse=True
+    )
+    for path in generations[max(1, keep):]:
+        if path != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class SnapshotStore:
+    """The current snapshot of each bank for this process, rechecked whenever
+    the catalog reloads (the scraper and build_snapshots.py touch its signal
+    file after swapping in a new generation)"""
+
+    def __init__(self, directory, catalog):
+        self.directory = directory
+        self.catalog = catalog
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, table_name):
+        """Snapshot to serve a bank from, or None to read it from MySQL.
+
+        A snapshot is only used while its question count matches the
+        catalog's, so one left behind by changes made without rebuilding it
+        is not served.
+        """
+        version = self.catalog.version
+        cached = self._snapshots.get(table_name)
+        if cached is None or cached[0] != version:
+            cached = self._open(table_name, version, cached[1] if cached else None)
+        snapshot = cached[1]
+        bank = self.catalog.get(table_name)
+        if snapshot is None or bank is None or bank['totalQuestions'] != snapshot.count:
+            return None
+        return snapshot
+
+    def _open(self, table_name, version, previous):
+        path = os.path.realpath(os.path.join(self.directory, table_name, CURRENT_LINK))
+        snapshot = previous
+        if previous is None or previous.path != path:
+            try:
+                snapshot = BankSnapshot(path)
+            except (OSError, ValueError) as e:
+                if os.path.lexists(os.path.join(self.directory, table_name, CURRENT_LINK)):
+                    print(f"Error opening snapshot of {table_name}: {e}")
+                snapshot = None
+        cached = (version, snapshot)
+        with self._lock:
+            self._snapshots[table_name] = cached
+        return cached
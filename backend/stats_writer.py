@@ -0,0 +1,202 @@
+import atexit
+import json
+import threading
+
+from mysql.connector import Error
+
+from analytics import record_rollups
+from scheduler import review_statements
+
+# Rows per INSERT statement; keeps packets well under max_allowed_packet
+ROWS_PER_STATEMENT = 500
+
+# Longest user_id / table_name the VARCHAR(255) user_stats columns store
+MAX_ID_LENGTH = 255
+
+
+def coalesce_attempts(events, default_user='default_user', known_bank=None):
+    """Fold attempt events into {(user_id, table_name, question_id): [attempts, correct]}.
+
+    Raises ValueError for malformed events, and for banks `known_bank(table_name)`
+    rejects, so the caller can answer 400 before anything is buffered.
+    """
+    if not isinstance(events, list):
+        raise ValueError('attempts must be a list')
+
+    counts = {}
+    checked_banks = set()
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise ValueError(f'attempt {index} must be an object')
+        user_id = event.get('user_id') or default_user
+        table_name = event.get('table_name')
+        question_id = event.get('question_id')
+        if not isinstance(user_id, str) or len(user_id) > MAX_ID_LENGTH:
+            raise ValueError(f'attempt {index} needs a user_id string of at most {MAX_ID_LENGTH} characters')
+        if not table_name or not isinstance(table_name, str):
+            raise ValueError(f'attempt {index} is missing table_name')
+        if len(table_name) > MAX_ID_LENGTH:
+            raise ValueError(f'attempt {index} has a table_name longer than {MAX_ID_LENGTH} characters')
+        if not isinstance(question_id, int) or isinstance(question_id, bool):
+            raise ValueError(f'attempt {index} is missing an integer question_id')
+        if known_bank and table_name not in checked_banks:
+            if not known_bank(table_name):
+                raise ValueError(f'attempt {index} names an unknown test bank: {table_name}')
+            checked_banks.add(table_name)
+
+        key = (user_id, table_name, question_id)
+        totals = counts.setdefault(key, [0, 0])
+        totals[0] += 1
+        totals[1] += 1 if event.get('is_correct') else 0
+    return counts
+
+
+def merge_counts(target, counts):
+    for key, (attempts, correct) in counts.items():
+        totals = target.setdefault(key, [0, 0])
+        totals[0] += attempts
+        totals[1] += correct
+
+
+def attempt_statements(counts):
+    """(sql, params) upserts adding coalesced attempt counts to user_stats and review schedules"""
+    # Key order, so concurrent flushes from different workers lock rows in the same order
+    rows = [(user_id, table_name, question_id, attempts, correct)
+            for (user_id, table_name, question_id), (attempts, correct) in sorted(counts.items())]
+    for offset in range(0, len(rows), ROWS_PER_STATEMENT):
+        chunk = rows[offset:offset + ROWS_PER_STATEMENT]
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))
+        yield f"""
+            INSERT INTO user_stats (user_id, table_name, question_id, attempts, correct)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE
+                attempts = attempts + VALUES(attempts),
+                correct = correct + VALUES(correct),
+                last_attempt = CURRENT_TIMESTAMP
+        """, tuple(value for row in chunk for value in row)
+    # Each question's attempts in this batch count as one spaced-repetition review
+    yield from review_statements(counts)
+
+
+def write_attempts(connection, counts):
+    """Apply coalesced attempt counts, review schedules and analytics rollups
+    with multi-row upserts in one transaction"""
+    if not counts:
+        return
+
+    cursor = connection.cursor()
+    try:
+        for sql, params in attempt_statements(counts):
+            cursor.execute(sql, params)
+        record_rollups(cursor, counts)
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class WriteBehindBuffer:
+    """Coalesces attempt counts in memory and writes them in the background.
+
+    Flushes when `max_pending` distinct questions are buffered or every
+    `max_delay` seconds, and once more at interpreter exit. A batch the database
+    rejects is kept apart and retried on the next flushes, at most
+    `max_failures` times before it is dropped with a log line; batches that
+    could not get a connection are kept until one is available.
+    """
+
+    def __init__(self, get_connection, max_pending=500, max_delay=2.0, max_failures=5):
+        self._get_connection = get_connection
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+        self._pending = {}
+        # [counts, failures] for batches that failed to write
+        self._failed = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        # Started on first use so each worker process gets its own thread
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stats-write-behind', daemon=True)
+            self._thread.start()
+
+    def add(self, counts):
+        with self._lock:
+            merge_counts(self._pending, counts)
+            full = len(self._pending) >= self.max_pending
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending) + sum(len(counts) for counts, _ in self._failed)
+
+    def _write(self, counts):
+        """Write one batch; False when no connection could be had"""
+        connection = self._get_connection()
+        if not connection:
+            return False
+        try:
+            write_attempts(connection, counts)
+            return True
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            # Earlier failed batches are written on their own, so one that can
+            # never succeed does not hold back the attempts buffered since
+            batches, self._failed = self._failed, []
+            if batch and batches and batches[-1][1] == 0:
+                # Still waiting for a connection, without a failed write yet
+                merge_counts(batches[-1][0], batch)
+            elif batch:
+                batches.append([batch, 0])
+
+            written = 0
+            for position, (counts, failures) in enumerate(batches):
+                try:
+                    if self._write(counts):
+                        written += len(counts)
+                        continue
+                    print("Error flushing buffered user stats (will retry): Database connection failed")
+                    self._failed.extend(batches[position:])
+                    break
+                except Exception as e:
+                    failures += 1
+                    if failures >= self.max_failures:
+                        drop_attempts(counts, failures, e)
+                        continue
+                    print(f"Error flushing buffered user stats (failure {failures} of "
+                          f"{self.max_failures}, will retry): {e}")
+                self._failed.append([counts, failures])
+            return written
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            self.flush()
+
+
+def drop_attempts(counts, failures, error):
+    """Log a batch given up on as one JSON line, with its counts, so it can be replayed"""
+    print(json.dumps({
+        'event': 'dropped_user_stats',
+        'failures': failures,
+        'error': str(error),
+        'attempts': [{'user_id': user_id, 'table_name': table_name, 'question_id': question_id,
+                      'attempts': attempts, 'correct': correct}
+                     for (user_id, table_name, question_id), (attempts, correct) in sorted(counts.items())]
+    }))
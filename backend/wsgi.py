@@ -0,0 +1,11 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The schema is created once by the gunicorn master (see gunicorn.conf.py),
+so workers skip it.
+"""
+from app import create_app
+
+app = create_app(init_db=False)
@@ -0,0 +1,269 @@
+"""
+Check the scraper's lxml parser against the BeautifulSoup parser it
+replaced, and time both.
+
+Every page is parsed by both; any page where the questions, images or
+answers differ is reported (with the first differing question) and the
+script exits with status 1. Line breaks are compared as LF, as lxml reads
+CR LF the way browsers do. Then each parser runs over all pages
+--repeat times and pages per second are reported.
+
+Usage:
+    python benchmark_parser.py pages/*.html            # saved pages
+    python benchmark_parser.py --synthetic 200         # generated pages
+    python benchmark_parser.py --save pages --url "https://example.com/exam/page-{page}" --pages 1 20
+
+--save downloads pages (rate limited like the scraper) into a directory, to
+be used as fixtures afterwards. The BeautifulSoup parser needs
+beautifulsoup4 (pip install beautifulsoup4), which the scraper itself no
+longer does.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+from scraper import HostRateLimiter, get_session, parse_questions
+
+WORDS = ("instance bucket policy region zone replica cache queue stream function role subnet gateway "
+         "volume snapshot cluster endpoint table index key certificate domain metric alarm").split()
+
+
+def reference_parse_questions(page_content):
+    """The scraper's previous parser (BeautifulSoup with html.parser), unchanged"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_content, "html.parser")
+
+    parsed = []
+    for question in soup.find_all("p", class_="lead"):
+        image_src = None
+
+        # Look for images in the question (before the first div)
+        for content in question.children:
+            if content.name == 'div':
+                break
+            if content.name == 'img':
+                image_src = content.get("src")
+                break
+
+        # Get all text nodes before the first <div> tag
+        question_parts = []
+        for content in question.children:
+            if content.name == 'div':
+                break  # Stop when we hit the first div
+            if content.name == 'br':
+                question_parts.append(' ')
+            elif content.name == 'img':
+                # Skip images in text extraction
+                continue
+            elif isinstance(content, str):
+                question_parts.append(content.strip())
+            else:
+                question_parts.append(content.get_text().strip())
+
+        question_text = ' '.join(question_parts).strip()
+
+        # Initialize answer dictionary
+        answers_dict = {
+            'answer_a': None,
+            'answer_b': None,
+            'answer_c': None,
+            'answer_d': None,
+            'answer_e': None,
+            'answer_f': None
+        }
+        correct_answers = []  # List to store multiple correct answers
+
+        # Find all answer options
+        answer_list = question.find("ol", class_="rounded-list")
+        if answer_list:
+            all_lis = answer_list.find_all("li")
+            answer_labels = ['A', 'B', 'C', 'D', 'E', 'F']
+
+            answer_idx = 0
+            for li in all_lis:
+                if answer_idx >= len(answer_labels):
+                    break
+
+                # Get only the direct text of this <li>
+                answer_text = ""
+                for content in li.children:
+                    if isinstance(content, str):
+                        answer_text += content.strip()
+                    elif content.name != 'li':
+                        answer_text += content.get_text().strip()
+
+                answer_text = answer_text.strip()
+
+                # Skip empty answers
+                if not answer_text:
+                    continue
+
+                answer_label = answer_labels[answer_idx]
+                answers_dict[f'answer_{answer_label.lower()}'] = answer_text
+                if li.get("data-correct") == "True":
+                    correct_answers.append(answer_label)
+
+                answer_idx += 1
+
+        parsed.append({
+            'question_text': question_text,
+            'image_src': image_src,
+            'answers': answers_dict,
+            'correct_answers': sorted(correct_answers)
+        })
+    return parsed
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def synthetic_question(rng, number):
+    """One question in the markup the scraped site uses, with its usual irregularities"""
+    text = f"Q{number}: {sentence(rng, 10, 40)}"
+    if rng.random() < 0.3:
+        text += f" <b>{sentence(rng, 1, 3)}</b> &amp; <code>{rng.choice(WORDS)}</code>"
+    if rng.random() < 0.3:
+        text += f"<br>\n{sentence(rng, 5, 15)}&nbsp;?"
+    if rng.random() < 0.2:
+        text += f"\n<br><img src=\"/images/q{number}.png\" alt=\"\">\n"
+    if rng.random() < 0.1:
+        text += f"<pre>{rng.choice(WORDS)} = {{\n  \"{rng.choice(WORDS)}\": true\n}}</pre>{sentence(rng, 3, 6)}"
+    if rng.random() < 0.1:
+        text += "<!-- exhibit -->"
+
+    answer_count = rng.choice((4, 4, 4, 5, 6, 7))
+    correct = set(rng.sample(range(answer_count), 2 if rng.random() < 0.2 else 1))
+    # Some pages leave <li> unclosed
+    closing = '' if rng.random() < 0.2 else '</li>'
+    items = []
+    for index in range(answer_count):
+        answer = sentence(rng, 3, 12)
+        if rng.random() < 0.1:
+            answer = f"<span>{rng.choice(WORDS)}</span> {answer}"
+        items.append(f'<li data-correct="{index in correct}">{answer}{closing}\n')
+    if rng.random() < 0.05:
+        items.insert(rng.randint(0, len(items)), '<li data-correct="False"> </li>\n')
+
+    return (f'<p class="lead">\n{text}\n<div class="answers">\n<ol class="rounded-list">\n{"".join(items)}</ol>\n'
+            f'<div class="explanation">{sentence(rng, 5, 20)}</div>\n</div>\n</p>\n')
+
+
+def synthetic_page(page_num, questions_per_page=10, seed=0):
+    rng = random.Random(f"{seed}:{page_num}")
+    body = ''.join(synthetic_question(rng, (page_num - 1) * questions_per_page + i + 1)
+                   for i in range(questions_per_page))
+    return (f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>Page {page_num}</title></head>\n'
+            f'<body>\n<div class="container">\n<h1>Exam questions – page {page_num}</h1>\n{body}'
+            f'<nav class="pagination"><a href="/page-{page_num + 1}">Next</a></nav>\n</div>\n</body>\n</html>\n'
+            ).encode('utf-8')
+
+
+def save_pages(url, first, last, directory, requests_per_second):
+    """Download pages first..last of url into directory; returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    rate_limiter = HostRateLimiter(requests_per_second)
+    paths = []
+    for page_num in range(first, last + 1):
+        page_url = url.format(page=page_num)
+        rate_limiter.wait(page_url)
+        response = get_session().get(page_url, timeout=30)
+        response.raise_for_status()
+        path = os.path.join(directory, f"page-{page_num}.html")
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        paths.append(path)
+        print(f"  Saved {page_url} to {path}")
+    return paths
+
+
+def unix_line_breaks(parsed):
+    """lxml, like browsers, reads CR LF and CR line breaks as LF; content_hash ignores the difference"""
+    def fix(text):
+        return text.replace('\r\n', '\n').replace('\r', '\n') if text else text
+    return [dict(question, question_text=fix(question['question_text']),
+                 answers={key: fix(value) for key, value in question['answers'].items()})
+            for question in parsed]
+
+
+def first_difference(expected, actual):
+    if len(expected) != len(actual):
+        return f"{len(expected)} questions before, {len(actual)} now"
+    for index, (old, new) in enumerate(zip(expected, actual)):
+        if old != new:
+            return f"question {index + 1}:\n    before: {old}\n    now:    {new}"
+    return None
+
+
+def pages_per_second(parser, pages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parser(page)
+    return len(pages) * repeat / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and time the scraper's HTML parsers")
+    parser.add_argument("pages", nargs="*", help="Saved HTML pages (globs allowed)")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Also generate this many pages (default: 100 when no pages are given)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated pages")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each parser goes over the pages")
+    parser.add_argument("--save", metavar="DIR", help="Download pages into DIR first (needs --url)")
+    parser.add_argument("--url", help="Page URL pattern with a {page} placeholder, for --save")
+    parser.add_argument("--pages", dest="page_range", type=int, nargs=2, default=(1, 10),
+                        metavar=("FIRST", "LAST"), help="Pages to download with --save")
+    parser.add_argument("--requests-per-second", type=float, default=1.0, help="Rate limit for --save")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.pages for path in sorted(glob.glob(pattern)) or [pattern]]
+    if args.save:
+        if not args.url:
+            parser.error("--save needs --url")
+        paths += save_pages(args.url, *args.page_range, args.save, args.requests_per_second)
+
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append((path, f.read()))
+    synthetic = args.synthetic or (0 if pages else 100)
+    pages += [(f"synthetic page {page_num}", synthetic_page(page_num, seed=args.seed))
+              for page_num in range(1, synthetic + 1)]
+
+    mismatches = 0
+    questions = 0
+    for name, page in pages:
+        expected = unix_line_breaks(reference_parse_questions(page))
+        questions += len(expected)
+        difference = first_difference(expected, parse_questions(page))
+        if difference:
+            mismatches += 1
+            print(f"✗ {name}: {difference}")
+    print(f"{len(pages) - mismatches}/{len(pages)} pages ({questions} questions) parsed identically")
+
+    contents = [page for _, page in pages]
+    old_rate = pages_per_second(reference_parse_questions, contents, args.repeat)
+    new_rate = pages_per_second(parse_questions, contents, args.repeat)
+    print(f"BeautifulSoup (html.parser): {old_rate:8.1f} pages/s")
+    print(f"lxml:                        {new_rate:8.1f} pages/s ({new_rate / old_rate:.1f}x)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'pages': len(pages), 'questions': questions, 'mismatches': mismatches,
+                       'repeat': args.repeat, 'beautifulsoup_pages_per_second': round(old_rate, 1),
+                       'lxml_pages_per_second': round(new_rate, 1)}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Run the scraper against a local HTTP server serving the fixture pages in
+fixtures/scraper, and check what it stores.
+
+The fixtures are three pages of eight questions, one of them repeated
+across pages, with two images (one used on two pages). The script scrapes
+them into a scratch topic (table `scraper_fixture_check`, dropped before
+and after) in the database from scraper.py's db_config, several times:
+
+  1. with page 3 failing: pages 1-2 are stored, with their images, and
+     checkpointed
+  2. again: only page 3 is fetched, the repeated question is stored once,
+     and the finished run clears its checkpoints
+  3. again: every page is fetched (a refresh), no image is downloaded again
+     and nothing changes
+  4. with page 2 failing, then from another base_url: the second run
+     ignores the first one's checkpoints and fetches every page
+
+Exits with status 1 if any check fails.
+
+Usage:
+    python check_scraper.py
+    python check_scraper.py --keep     # leave the scratch topic in place
+"""
+import argparse
+import hashlib
+import os
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlparse
+
+import mysql.connector
+
+import scraper
+from scraper import content_hash, create_checkpoint_table, db_config, parse_questions, sanitize_table_name
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'scraper')
+TOPIC_NAME = 'Scraper Fixture Check'
+FIRST_PAGE, LAST_PAGE = 1, 3
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves the fixture directory, recording each path and failing the
+    paths in server.unavailable with a 503"""
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        with self.server.lock:
+            self.server.requests.append(path)
+        if path in self.server.unavailable:
+            self.send_error(503)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureHandler, directory=FIXTURE_DIR))
+    server.requests = []
+    server.unavailable = set()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name='fixture-server', daemon=True).start()
+    return server
+
+
+def page_path(page_num):
+    return f"/page-{page_num}.html"
+
+
+def expected_questions():
+    """{content_hash: (correct answers, image hash)} for each fixture page, by page number"""
+    pages = {}
+    for page_num in range(FIRST_PAGE, LAST_PAGE + 1):
+        with open(os.path.join(FIXTURE_DIR, f"page-{page_num}.html"), 'rb') as f:
+            questions = parse_questions(f.read())
+        pages[page_num] = {}
+        for question in questions:
+            image_hash = None
+            if question['image_src']:
+                image_path = urlparse(urljoin(page_path(page_num), question['image_src'])).path
+                with open(os.path.join(FIXTURE_DIR, image_path.lstrip('/')), 'rb') as f:
+                    image_hash = hashlib.sha256(f.read()).hexdigest()
+            row_hash = content_hash(question['question_text'], question['answers'])
+            pages[page_num][row_hash] = (','.join(question['correct_answers']), image_hash)
+    return pages
+
+
+def image_paths():
+    return {f"/images/{name}" for name in os.listdir(os.path.join(FIXTURE_DIR, 'images'))}
+
+
+def stored_questions(cursor, table_name):
+    """{content_hash: (correct answers, image hash)}, the row count and the
+    image content types of the scratch topic"""
+    if scraper.QUESTION_STORE == 'normalized':
+        cursor.execute("""
+            SELECT q.content_hash, q.correct_answers, q.question_image_hash, q.question_image_type
+            FROM questions q JOIN banks b ON b.id = q.bank_id
+            WHERE b.table_name = %s
+        """, (table_name,))
+    else:
+        cursor.execute(f"""
+            SELECT content_hash, correct_answers, question_image_hash, question_image_type FROM `{table_name}`
+        """)
+    rows = cursor.fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}, len(rows), {row[3] for row in rows if row[2]}
+
+
+def checkpoints(cursor, table_name):
+    cursor.execute("SELECT page_number FROM scrape_checkpoints WHERE table_name = %s", (table_name,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def stored_image_hashes(cursor, hashes):
+    if not hashes:
+        return set()
+    placeholders = ', '.join(['%s'] * len(hashes))
+    cursor.execute(f"SELECT hash FROM question_images WHERE hash IN ({placeholders})", tuple(hashes))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def drop_topic(cursor, table_name):
+    create_checkpoint_table(cursor)
+    cursor.execute("DELETE FROM scrape_checkpoints WHERE table_name = %s", (table_name,))
+    if scraper.QUESTION_STORE == 'normalized':
+        cursor.execute("SELECT 1 FROM information_schema.TABLES "
+                       "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'banks'")
+        if cursor.fetchall():
+            cursor.execute("DELETE FROM banks WHERE table_name = %s", (table_name,))
+    else:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`")
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def __call__(self, condition, message, detail=None):
+        if condition:
+            print(f"  ✓ {message}")
+        else:
+            self.failed += 1
+            print(f"  ✗ {message}" + (f": {detail}" if detail is not None else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the scraper against local fixture pages")
+    parser.add_argument("--keep", action="store_true", help="Leave the scratch topic in the database")
+    args = parser.parse_args()
+
+    table_name = sanitize_table_name(TOPIC_NAME)
+    pages = expected_questions()
+    all_questions = {}
+    for questions in pages.values():
+        all_questions.update(questions)
+    all_pages = {page_path(page_num) for page_num in pages}
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/page-{{page}}.html"
+    check = Checks()
+
+    def run(title, unavailable=(), url=base_url):
+        print(f"\n=== {title} ===")
+        with server.lock:
+            server.requests.clear()
+            server.unavailable = {page_path(page_num) for page_num in unavailable}
+        scraper.scrape_exam_questions(url, TOPIC_NAME, FIRST_PAGE, LAST_PAGE, db_config,
+                                      page_workers=2, image_workers=2, requests_per_second=0,
+                                      optimize_images=False)
+        with server.lock:
+            return list(server.requests)
+
+    db = mysql.connector.connect(**db_config)
+    db.autocommit = True
+    cursor = db.cursor()
+    try:
+        drop_topic(cursor, table_name)
+
+        requests = run("Run 1: page 3 fails", unavailable=[3])
+        first_two = {**pages[1], **pages[2]}
+        stored, rows, image_types = stored_questions(cursor, table_name)
+        print("\nChecks after run 1")
+        check(set(requests) == all_pages | image_paths(), "every page and image was requested",
+              sorted(set(requests)))
+        check(stored == first_two, "pages 1-2 are stored with their answers and image hashes", stored)
+        check(rows == len(first_two), "no question is stored twice", rows)
+        image_hashes = {image_hash for _, image_hash in first_two.values() if image_hash}
+        check(stored_image_hashes(cursor, image_hashes) == image_hashes, "images are in question_images")
+        check(image_types == {'image/png'}, "images keep their content type", image_types)
+        check(checkpoints(cursor, table_name) == {1, 2}, "pages 1-2 are checkpointed",
+              checkpoints(cursor, table_name))
+
+        requests = run("Run 2: resume")
+        stored, rows, _ = stored_questions(cursor, table_name)
+        print("\nChecks after run 2")
+        check(requests == [page_path(3)], "only page 3 was fetched", requests)
+        check(stored == all_questions, "every fixture question is stored", stored)
+        check(rows == len(all_questions), "the question repeated on page 3 is stored once", rows)
+        check(not checkpoints(cursor, table_name), "the finished run cleared its checkpoints",
+              checkpoints(cursor, table_name))
+
+        requests = run("Run 3: refresh")
+        stored, rows, _ = stored_questions(cursor, table_name)
+        print("\nChecks after run 3")
+        check(sorted(requests) == sorted(all_pages), "every page was fetched, and no image", requests)
+        check(stored == all_questions and rows == len(all_questions), "nothing changed", rows)
+
+        run("Run 4a: page 2 fails", unavailable=[2])
+        requests = run("Run 4b: another base_url", url=base_url + "?mirror=1")
+        print("\nChecks after run 4")
+        check({urlparse(path).path for path in requests} >= all_pages,
+              "checkpoints from another base_url were ignored", requests)
+        check(not checkpoints(cursor, table_name), "the finished run cleared its checkpoints",
+              checkpoints(cursor, table_name))
+    finally:
+        if not args.keep:
+            drop_topic(cursor, table_name)
+        cursor.close()
+        db.close()
+        server.shutdown()
+
+    if check.failed:
+        print(f"\n✗ {check.failed} check(s) failed")
+        sys.exit(1)
+    print("\n✓ All scraper checks passed")
+
+
+if __name__ == "__main__":
+    main()
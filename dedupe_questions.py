@@ -0,0 +1,57 @@
+"""
+Offline dedupe/compaction for topic tables created by scraper.py.
+
+For each table: backfills content hashes, merges duplicate questions
+(moving their user_stats and review schedules onto the kept question, then
+refreshing the bank's analytics rollups), adds the unique content_hash
+index and moves per-row images into the shared question_images store.
+
+Usage:
+    python dedupe_questions.py                  # every topic table
+    python dedupe_questions.py aws_saa_c03      # specific tables
+"""
+import argparse
+
+import mysql.connector
+
+from scraper import db_config, dedupe_topic_table, signal_catalog_update
+
+
+def find_topic_tables(cursor):
+    """Per-topic question tables (not the shared questions table)"""
+    cursor.execute("""
+        SELECT TABLE_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME IN ('question_text', 'correct_answers')
+          AND TABLE_NAME <> 'questions'
+        GROUP BY TABLE_NAME
+        HAVING COUNT(*) = 2
+        ORDER BY TABLE_NAME
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove duplicate questions from topic tables")
+    parser.add_argument("tables", nargs="*", help="Tables to compact (default: all topic tables)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction")
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**db_config)
+    try:
+        cursor = db.cursor()
+        tables = args.tables or find_topic_tables(cursor)
+        cursor.close()
+
+        for table_name in tables:
+            print(f"Compacting '{table_name}'...")
+            removed = dedupe_topic_table(db, table_name, args.batch_size)
+            print(f"✓ {table_name}: {removed} duplicate questions removed")
+    finally:
+        db.close()
+
+    # Question counts changed; let the API reload its catalog
+    signal_catalog_update()
+
+
+if __name__ == "__main__":
+    main()
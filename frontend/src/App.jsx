@@ -1,10 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { CheckCircle, XCircle, RotateCcw, Database, TrendingUp, Loader, Eye } from 'lucide-react';
 
 const ExamQuizApp = () => {
   // API Base URL
   const API_BASE_URL = 'http://localhost:5000/api';
+  // Image URLs from the API are server-relative (/api/image/...)
+  const API_ORIGIN = API_BASE_URL.replace(/\/api$/, '');
 
   // State management
   const [testBanks, setTestBanks] = useState([]);
@@ -26,55 +28,61 @@ const ExamQuizApp = () => {
   });
   const [view, setView] = useState('setup');
 
+  // Current quiz session on the server: { id, bankName, total }
+  const [session, setSession] = useState(null);
+  const loadingBatch = useRef(false);
+  const QUESTION_BATCH_SIZE = 20;
+  // Fetch the next batch once this few loaded questions are left
+  const PREFETCH_AHEAD = 5;
+  // Newest lastAttempt received from the server per bank; later loads only
+  // fetch questions attempted since then (?since=) and merge them in
+  const statsSyncedAt = useRef({});
+
   // Load user stats from database
   const loadUserStats = async () => {
     if (!selectedBank) return;
     
+    const bankName = selectedBank.name;
+    const syncedAt = statsSyncedAt.current[bankName];
     try {
-      const response = await fetch(`${API_BASE_URL}/user-stats/${selectedBank.name}?user_id=default_user`);
+      const response = await fetch(
+        `${API_BASE_URL}/user-stats/${bankName}?user_id=default_user` +
+        (syncedAt ? `&since=${encodeURIComponent(syncedAt)}` : '')
+      );
       if (!response.ok) throw new Error('Failed to fetch user stats');
       const stats = await response.json();
+      
+      const newest = Object.values(stats).reduce(
+        (latest, s) => (s.lastAttempt && s.lastAttempt > latest ? s.lastAttempt : latest),
+        syncedAt || ''
+      );
+      if (newest) statsSyncedAt.current[bankName] = newest;
+      
       setUserStats(prev => ({
         ...prev,
-        [selectedBank.name]: stats
+        [bankName]: syncedAt ? { ...prev[bankName], ...stats } : stats
       }));
     } catch (error) {
       console.log('No previous stats found or error loading stats:', error);
     }
   };
 
-  // Save user stats to database
-  const saveUserStats = async (bankName, questionId, isCorrect) => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/user-stats/${bankName}/${questionId}`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          user_id: 'default_user',
-          is_correct: isCorrect
-        })
-      });
-      
-      if (!response.ok) throw new Error('Failed to save stats');
-      const updatedStats = await response.json();
-      
-      // Update local state
-      setUserStats(prev => ({
+  // The server records attempts when answers are submitted; mirror them locally
+  const recordLocalAttempt = (bankName, questionId, isCorrect) => {
+    setUserStats(prev => {
+      const previous = prev[bankName]?.[questionId] || { attempts: 0, correct: 0 };
+      return {
         ...prev,
         [bankName]: {
           ...prev[bankName],
           [questionId]: {
-            attempts: updatedStats.attempts,
-            correct: updatedStats.correct,
-            lastAttempt: updatedStats.lastAttempt
+            attempts: previous.attempts + 1,
+            correct: previous.correct + (isCorrect ? 1 : 0),
+            lastAttempt: new Date().toISOString()
           }
         }
-      }));
-    } catch (error) {
-      console.error('Error saving stats:', error);
-    }
+      };
+    });
   };
 
   // Connect to database and fetch test banks
@@ -94,52 +102,79 @@ const ExamQuizApp = () => {
     }
   };
 
-  // Load questions from API
-  const loadQuestions = async (bankName, start, end, random, wrongOnly = false, wrongThreshold = 1) => {
+  // Questions that start at position `offset` of the session, added after
+  // those already loaded (skipping any that are loaded already)
+  const mergeQuestions = (loaded, offset, batch) =>
+    offset > loaded.length ? loaded : loaded.concat(batch.slice(loaded.length - offset));
+
+  // Start a quiz session: the server freezes the question order and sends
+  // the first batch, without correct answers
+  const startSession = async (bankName, start, end, random, wrongOnly = false, wrongThreshold = 1) => {
     setLoading(true);
     setError(null);
     try {
-      const response = await fetch(
-        `${API_BASE_URL}/questions/${bankName}?start=${start}&end=${end}&random=${random}`
-      );
-      if (!response.ok) throw new Error('Failed to fetch questions');
-      let questionsData = await response.json();
+      const response = await fetch(`${API_BASE_URL}/quiz-sessions/${bankName}`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          user_id: 'default_user',
+          start,
+          end,
+          random,
+          wrong_threshold: wrongOnly ? wrongThreshold : null,
+          batch_size: QUESTION_BATCH_SIZE
+        })
+      });
+      if (!response.ok) throw new Error('Failed to start quiz');
+      const data = await response.json();
       
-      // Filter for wrong answers only if requested
-      if (wrongOnly && userStats[bankName]) {
-        questionsData = questionsData.filter(q => {
-          const qStats = userStats[bankName][q.id];
-          if (!qStats || qStats.attempts === 0) return false;
-          
-          // Calculate number of wrong answers
-          const wrongCount = qStats.attempts - qStats.correct;
-          return wrongCount >= wrongThreshold;
-        });
-        
-        if (questionsData.length === 0) {
-          setError(`No questions found that you've answered wrong at least ${wrongThreshold} time(s).`);
-          setLoading(false);
-          return;
-        }
+      if (data.total === 0) {
+        setError(wrongOnly
+          ? `No questions found that you've answered wrong at least ${wrongThreshold} time(s).`
+          : 'No questions found in this range.');
+        return;
       }
       
-      setQuestions(questionsData);
+      setSession({ id: data.sessionId, bankName, total: data.total });
+      setQuestions(data.questions);
       setCurrentQuestionIndex(0);
       setUserAnswers({});
       setShowResults({});
       setRevealedAnswers({});
     } catch (err) {
-      console.error('Error fetching questions:', err);
+      console.error('Error starting quiz:', err);
       setError('Failed to load questions. Please try again.');
     } finally {
       setLoading(false);
     }
   };
 
+  // Fetch the next batch of the session's questions
+  const loadMoreQuestions = async () => {
+    if (!session || loadingBatch.current || questions.length >= session.total) return;
+    loadingBatch.current = true;
+    const offset = questions.length;
+    try {
+      const response = await fetch(
+        `${API_BASE_URL}/quiz-sessions/${session.bankName}/${session.id}/questions` +
+        `?offset=${offset}&limit=${QUESTION_BATCH_SIZE}`
+      );
+      if (!response.ok) throw new Error('Failed to fetch questions');
+      const batch = await response.json();
+      setQuestions(prev => mergeQuestions(prev, offset, batch));
+    } catch (err) {
+      console.error('Error fetching questions:', err);
+    } finally {
+      loadingBatch.current = false;
+    }
+  };
+
   const startQuiz = async () => {
     if (!selectedBank) return;
     
-    await loadQuestions(
+    await startSession(
       selectedBank.name,
       settings.startQuestion,
       settings.endQuestion,
@@ -155,8 +190,7 @@ const ExamQuizApp = () => {
 
   const handleAnswerSelect = (questionId, answer) => {
     const currentQuestion = questions[currentQuestionIndex];
-    const correctAnswers = currentQuestion.correct_answers.split(',').map(a => a.trim());
-    const isMultipleChoice = correctAnswers.length > 1;
+    const isMultipleChoice = currentQuestion.answer_count > 1;
     
     setUserAnswers(prev => {
       const currentAnswers = prev[questionId] || [];
@@ -174,33 +208,54 @@ const ExamQuizApp = () => {
     });
   };
 
-  const revealAnswer = (questionId) => {
-    const question = questions.find(q => q.id === questionId);
+  // Submit the answer: the server grades it, records the attempt and sends
+  // the correct answers along with the next question
+  const revealAnswer = async (questionId) => {
     const userAnswer = userAnswers[questionId] || [];
-    const correctAnswers = question.correct_answers.split(',').map(a => a.trim()).sort();
-    const isCorrect = JSON.stringify(userAnswer.sort()) === JSON.stringify(correctAnswers);
-    
-    setShowResults(prev => ({
-      ...prev,
-      [questionId]: {
-        isCorrect,
-        userAnswer,
-        correctAnswers
-      }
-    }));
     
     setRevealedAnswers(prev => ({
       ...prev,
       [questionId]: true
     }));
     
-    // Update statistics
-    updateStatistics(selectedBank.name, questionId, isCorrect);
-  };
-
-  const updateStatistics = (bankName, questionId, isCorrect) => {
-    // Save to database
-    saveUserStats(bankName, questionId, isCorrect);
+    try {
+      const response = await fetch(
+        `${API_BASE_URL}/quiz-sessions/${session.bankName}/${session.id}/answers`,
+        {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({
+            question_id: questionId,
+            answer: userAnswer
+          })
+        }
+      );
+      if (!response.ok) throw new Error('Failed to submit answer');
+      const result = await response.json();
+      
+      setShowResults(prev => ({
+        ...prev,
+        [questionId]: {
+          isCorrect: result.isCorrect,
+          userAnswer,
+          correctAnswers: result.correctAnswers
+        }
+      }));
+      recordLocalAttempt(session.bankName, questionId, result.isCorrect);
+      if (result.next) {
+        setQuestions(prev => mergeQuestions(prev, result.position, [result.next]));
+      }
+    } catch (err) {
+      console.error('Error submitting answer:', err);
+      setRevealedAnswers(prev => {
+        const newRevealed = { ...prev };
+        delete newRevealed[questionId];
+        return newRevealed;
+      });
+      alert('Failed to submit your answer. Please try again.');
+    }
   };
 
   const nextQuestion = () => {
@@ -235,6 +290,7 @@ const ExamQuizApp = () => {
       if (!response.ok) throw new Error('Failed to reset stats');
       
       setUserStats({});
+      statsSyncedAt.current = {};
       alert('All statistics have been reset successfully!');
     } catch (error) {
       console.error('Error resetting stats:', error);
@@ -261,6 +317,7 @@ const ExamQuizApp = () => {
         delete newStats[selectedBank.name];
         return newStats;
       });
+      delete statsSyncedAt.current[selectedBank.name];
       
       alert(`Statistics for ${selectedBank.displayName} have been reset successfully!`);
       
@@ -278,7 +335,7 @@ const ExamQuizApp = () => {
     const accuracy = answeredQuestions > 0 ? (correctAnswers / answeredQuestions * 100).toFixed(1) : 0;
     
     return {
-      total: questions.length,
+      total: session?.total || questions.length,
       answered: answeredQuestions,
       correct: correctAnswers,
       accuracy
@@ -303,6 +360,13 @@ const ExamQuizApp = () => {
     connectToDatabase();
   }, []);
 
+  // Prefetch the next batch of questions before the user reaches it
+  useEffect(() => {
+    if (session && questions.length - currentQuestionIndex <= PREFETCH_AHEAD) {
+      loadMoreQuestions();
+    }
+  }, [session, currentQuestionIndex, questions.length]);
+
   // Load stats when bank is selected
   useEffect(() => {
     if (selectedBank) {
@@ -537,8 +601,9 @@ const ExamQuizApp = () => {
     const result = showResults[currentQuestion.id];
     const revealed = revealedAnswers[currentQuestion.id];
     const userAnswer = userAnswers[currentQuestion.id] || [];
-    const correctAnswers = currentQuestion.correct_answers.split(',').map(a => a.trim());
-    const isMultipleChoice = correctAnswers.length > 1;
+    // Correct answers only arrive once the answer has been submitted
+    const correctAnswers = result?.correctAnswers || [];
+    const isMultipleChoice = currentQuestion.answer_count > 1;
     const answers = ['A', 'B', 'C', 'D', 'E', 'F'].filter(letter => 
       currentQuestion[`answer_${letter.toLowerCase()}`]
     );
@@ -554,7 +619,7 @@ const ExamQuizApp = () => {
             <div className="flex justify-between items-center">
               <div>
                 <h2 className="text-2xl font-bold text-gray-800">{selectedBank?.displayName}</h2>
-                <p className="text-gray-600">Question {currentQuestionIndex + 1} of {questions.length}</p>
+                <p className="text-gray-600">Question {currentQuestionIndex + 1} of {session?.total || questions.length}</p>
                 {questionStats && (
                   <p className="text-sm text-gray-500 mt-1">
                     Previous attempts: {questionStats.attempts} | Correct: {questionStats.correct}
@@ -583,22 +648,16 @@ const ExamQuizApp = () => {
             {isMultipleChoice && (
               <div className="mb-4 p-3 bg-yellow-50 border border-yellow-200 rounded-lg">
                 <p className="text-sm font-medium text-yellow-800">
-                  ⚠️ Multiple answers required - Select {correctAnswers.length} options
+                  ⚠️ Multiple answers required - Select {currentQuestion.answer_count} options
                 </p>
               </div>
             )}
 
-            {currentQuestion.question_image_url && (
-              <img 
-                src={currentQuestion.question_image_url} 
-                alt="Question" 
-                className="mb-4 max-w-full rounded-lg"
-              />
-            )}
-
-            {currentQuestion.question_image_base64 && currentQuestion.question_image_type && (
+            {(currentQuestion.question_image_src || currentQuestion.question_image_url) && (
               <img 
-                src={`data:${currentQuestion.question_image_type};base64,${currentQuestion.question_image_base64}`}
+                src={currentQuestion.question_image_src
+                  ? `${API_ORIGIN}${currentQuestion.question_image_src}`
+                  : currentQuestion.question_image_url}
                 alt="Question" 
                 className="mb-4 max-w-full rounded-lg"
               />
@@ -0,0 +1,139 @@
+"""
+Smaller encodings of stored question images. Each image is decoded, scaled
+down to at most MAX_DIMENSION pixels on its longer side, stripped of
+metadata (EXIF, ICC profiles, comments) and re-encoded as WebP and, where
+Pillow supports it, AVIF. Encodings are kept in question_image_variants
+next to the original in question_images, which stays as the fallback for
+browsers that accept neither; the API serves the smallest format a browser
+asks for.
+
+Needs Pillow (pip install Pillow); without it images are stored as
+downloaded. The scraper optimizes new images as it goes, and
+optimize_images.py backfills images already stored.
+"""
+import io
+
+# Pillow is optional; without it images are stored unoptimized
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# Longest side, in pixels, of an optimized image; quiz screenshots are shown
+# at most about this wide
+MAX_DIMENSION = 1600
+
+# Pillow format name and encoder options per variant MIME type, best first
+ENCODINGS = {
+    'image/avif': ('AVIF', {'quality': 55, 'speed': 6}),
+    'image/webp': ('WEBP', {'quality': 80, 'method': 6}),
+}
+
+# The shared, content-addressed image store (one row per distinct image)
+IMAGES_DDL = """
+    CREATE TABLE IF NOT EXISTS question_images (
+        hash CHAR(64) PRIMARY KEY,
+        mime_type VARCHAR(50),
+        data LONGBLOB NOT NULL,
+        size INT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+VARIANTS_DDL = """
+    CREATE TABLE IF NOT EXISTS question_image_variants (
+        hash CHAR(64) NOT NULL,
+        mime_type VARCHAR(50) NOT NULL,
+        data LONGBLOB,
+        size INT,
+        width INT,
+        height INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (hash, mime_type)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def supported_types():
+    """Variant MIME types this Pillow build can encode"""
+    if Image is None:
+        return []
+    return [mime_type for mime_type, (name, _) in ENCODINGS.items() if features.check(name.lower())]
+
+
+def create_image_store(cursor):
+    """Content-addressed image storage shared by all topics (one row per
+    distinct image), with the table of its optimized variants"""
+    cursor.execute(IMAGES_DDL)
+    create_variant_store(cursor)
+
+
+def create_variant_store(cursor):
+    """Optimized encodings of question_images, keyed by the original's hash. A
+    NULL data marks a format tried that came out no smaller than the original"""
+    cursor.execute(VARIANTS_DDL)
+
+
+def prepare(image, max_dimension):
+    """Upright, metadata-free pixels no larger than max_dimension on either side"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    # The encoders copy ICC profiles and EXIF from here unless told otherwise
+    image.info = {}
+    return image
+
+
+def encode(image, mime_type):
+    name, options = ENCODINGS[mime_type]
+    output = io.BytesIO()
+    image.save(output, name, **options)
+    if mime_type == 'image/webp' and image.getcolors(256) is not None:
+        # Flat screenshots with few colours usually compress better losslessly
+        lossless = io.BytesIO()
+        image.save(lossless, name, lossless=True, method=6)
+        if lossless.tell() < output.tell():
+            output = lossless
+    return output.getvalue()
+
+
+def optimize_image(data, mime_types=None, max_dimension=MAX_DIMENSION):
+    """Re-encode one image; returns (variants, error).
+
+    variants is a list of (mime_type, data, width, height), one per format
+    tried, with data None where the encoding was no smaller than the
+    original. Runs in worker processes, so it takes and returns plain bytes
+    and reports failures instead of raising them.
+    """
+    mime_types = mime_types or supported_types()
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            if getattr(source, 'n_frames', 1) > 1:
+                # Animations would lose their frames; keep the original
+                return [(mime_type, None, None, None) for mime_type in mime_types], None
+            image = prepare(source, max_dimension)
+            variants = []
+            for mime_type in mime_types:
+                encoded = encode(image, mime_type)
+                if len(encoded) >= len(data):
+                    encoded = None
+                variants.append((mime_type, encoded, image.width, image.height))
+            return variants, None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # Undecodable images are marked too, so backfills don't retry them
+        return [(mime_type, None, None, None) for mime_type in mime_types], str(e)
+
+
+def variant_rows(image_hash, variants):
+    """question_image_variants rows for one image's optimize_image() result"""
+    return [(image_hash, mime_type, encoded, len(encoded) if encoded else None, width, height)
+            for mime_type, encoded, width, height in variants]
+
+
+def store_variants(cursor, rows):
+    cursor.executemany("""
+        INSERT IGNORE INTO question_image_variants (hash, mime_type, data, size, width, height)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows)
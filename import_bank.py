@@ -0,0 +1,185 @@
+"""
+Bulk load a test bank from NDJSON, the format written by the API's
+GET /api/export/<table_name> (one question per line, images base64-encoded).
+
+The table is created with the scraper's schema if needed. Lines are read
+one at a time and written in batches, each batch in one transaction, so
+files of any size load in constant memory. Question ids are kept (so
+user_stats stay attached) unless --new-ids is given; rerunning an import
+updates existing questions in place.
+
+Usage:
+    python import_bank.py aws_saa_c03.ndjson                   # table named after the file
+    python import_bank.py export.ndjson --table aws_saa_c03
+    curl http://host:5000/api/export/aws_saa_c03 | python import_bank.py - --table aws_saa_c03
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+
+import mysql.connector
+
+from scraper import (QUESTION_STORE, content_hash, create_image_store, create_question_store,
+                     create_topic_table, db_config, dedupe_topic_table, ensure_bank,
+                     invalidate_bank_stats, last_question_id, sanitize_table_name,
+                     signal_catalog_update)
+
+ANSWER_COLUMNS = ('answer_a', 'answer_b', 'answer_c', 'answer_d', 'answer_e', 'answer_f')
+
+COLUMNS = ('topic_name', 'question_text', 'question_image_url', 'question_image_hash',
+           'question_image_type') + ANSWER_COLUMNS + ('correct_answers', 'page_number', 'content_hash')
+
+IMAGE_COLUMNS = ('question_image_url', 'question_image_hash', 'question_image_type')
+
+
+def read_records(stream):
+    """Yield (line number, question) for each non-blank line"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            raise SystemExit(f"Line {line_number}: invalid JSON ({e})")
+
+
+def prepare_row(record, keep_ids):
+    """Column values for a question, plus (hash, type, bytes) for its image if any"""
+    image = None
+    image_hash = None
+    if record.get('question_image'):
+        data = base64.b64decode(record['question_image'])
+        image_hash = hashlib.sha256(data).hexdigest()
+        image = (image_hash, record.get('question_image_type'), data)
+
+    values = dict(record, question_image_hash=image_hash,
+                  content_hash=content_hash(record['question_text'], record))
+    row = tuple(values.get(column) for column in COLUMNS)
+    if keep_ids:
+        row = (record['id'],) + row
+    return row, image
+
+
+def insert_sql(table_name, keep_ids, normalized=False):
+    if normalized:
+        # The shared questions table always needs (bank_id, id)
+        target, columns = "questions", ('bank_id', 'id') + COLUMNS
+    else:
+        target, columns = f"`{table_name}`", (('id',) if keep_ids else ()) + COLUMNS
+    # The file is authoritative: a question already present (same id or
+    # same content_hash) takes the imported values. Image columns keep the
+    # stored image when the file has none (an export made with images=false)
+    updates = ', '.join(
+        f"{column} = COALESCE(VALUES({column}), {column})" if column in IMAGE_COLUMNS
+        else f"{column} = VALUES({column})"
+        for column in COLUMNS
+    )
+    return f"""
+        INSERT INTO {target} ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE {updates}
+    """
+
+
+def write_batch(db, cursor, sql, rows, images):
+    try:
+        if images:
+            cursor.executemany("""
+                INSERT IGNORE INTO question_images (hash, mime_type, data, size)
+                VALUES (%s, %s, %s, %s)
+            """, [(image_hash, image_type, data, len(data))
+                  for image_hash, (image_type, data) in images.items()])
+        cursor.executemany(sql, rows)
+        db.commit()
+    except mysql.connector.Error:
+        db.rollback()
+        raise
+
+
+def import_bank(stream, table_name, batch_size=1000, keep_ids=True):
+    """Load NDJSON questions from stream into table_name; returns the number imported"""
+    db = mysql.connector.connect(**db_config)
+    cursor = db.cursor()
+    try:
+        create_image_store(cursor)
+        bank_id = None
+        if QUESTION_STORE == 'normalized':
+            create_question_store(cursor)
+            bank_id = ensure_bank(cursor, table_name, None)
+            next_id = last_question_id(cursor, bank_id)
+            db.commit()
+        else:
+            create_topic_table(cursor, table_name)
+            # Older tables need hashes backfilled and the unique index added first
+            dedupe_topic_table(db, table_name)
+
+        sql = insert_sql(table_name, keep_ids, normalized=bank_id is not None)
+        rows, images = [], {}
+        imported = 0
+        for line_number, record in read_records(stream):
+            try:
+                row, image = prepare_row(record, keep_ids)
+            except (KeyError, ValueError) as e:
+                raise SystemExit(f"Line {line_number}: invalid question ({e})")
+            if bank_id is not None:
+                if not keep_ids:
+                    next_id += 1
+                    row = (next_id,) + row
+                row = (bank_id,) + row
+            rows.append(row)
+            if image:
+                images[image[0]] = image[1:]
+
+            if len(rows) >= batch_size:
+                write_batch(db, cursor, sql, rows, images)
+                imported += len(rows)
+                print(f"  {imported} questions imported")
+                rows, images = [], {}
+
+        if rows:
+            write_batch(db, cursor, sql, rows, images)
+            imported += len(rows)
+
+        invalidate_bank_stats(cursor, table_name)
+        db.commit()
+        return imported
+    finally:
+        cursor.close()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a test bank from an NDJSON export")
+    parser.add_argument("file", help="NDJSON file, or - for stdin")
+    parser.add_argument("--table", help="Table to load into (default: the file name)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Questions per transaction")
+    parser.add_argument("--new-ids", action="store_true",
+                        help="Let MySQL assign ids instead of keeping the exported ones")
+    args = parser.parse_args()
+
+    if args.file == '-':
+        if not args.table:
+            parser.error("--table is required when reading from stdin")
+        stream = sys.stdin
+    else:
+        stream = open(args.file, encoding='utf-8')
+    table_name = sanitize_table_name(args.table or os.path.splitext(os.path.basename(args.file))[0])
+
+    try:
+        print(f"Importing into '{table_name}'...")
+        imported = import_bank(stream, table_name, args.batch_size, keep_ids=not args.new_ids)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(f"✓ {table_name}: {imported} questions imported")
+
+    # New bank or new question counts; let the API reload its catalog
+    signal_catalog_update()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Copy per-topic question tables into the normalized store: one `banks` row
+per topic and every question in the shared `questions` table, keyed by
+(bank_id, id). Question ids are kept, so user_stats, review schedules and
+quiz sessions stay attached.
+
+Each table is first compacted like dedupe_questions.py (content hashes,
+duplicates merged, row images moved to question_images), then copied in
+batches of --batch-size rows, one transaction per batch. Base64 images
+still in the row are decoded into question_images on the way. The copy is
+an upsert, so rerunning it (e.g. after another scrape) brings the store up
+to date; questions since removed from a topic table are removed too.
+
+Once every table is copied, set QUESTION_STORE=normalized for the API and
+the scraper.
+
+Usage:
+    python migrate_to_normalized.py                  # every topic table
+    python migrate_to_normalized.py aws_saa_c03      # specific tables
+    python migrate_to_normalized.py --drop-source    # drop each table once verified
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+
+import mysql.connector
+
+from dedupe_questions import find_topic_tables
+from scraper import (content_hash, create_image_store, create_question_store, db_config,
+                     dedupe_topic_table, ensure_bank, invalidate_bank_stats, signal_catalog_update)
+
+QUESTION_COLUMNS = ('topic_name', 'question_text', 'question_image_url', 'question_image_hash',
+                    'question_image_type', 'answer_a', 'answer_b', 'answer_c', 'answer_d',
+                    'answer_e', 'answer_f', 'correct_answers', 'page_number', 'content_hash',
+                    'created_at')
+
+
+def table_columns(cursor, table_name):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table_name,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def copy_batch(cursor, table_name, bank_id, has_image_data, last_id, batch_size):
+    """Upsert the next batch of a topic table into questions; returns the ids copied"""
+    image_data = 'question_image_data' if has_image_data else 'NULL'
+    cursor.execute(f"""
+        SELECT id, {', '.join(QUESTION_COLUMNS)}, {image_data} AS question_image_data
+        FROM `{table_name}`
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    """, (last_id, batch_size))
+    rows = cursor.fetchall()
+
+    images = {}
+    values = []
+    for row in rows:
+        question = dict(zip(('id',) + QUESTION_COLUMNS + ('question_image_data',), row))
+        encoded = question.pop('question_image_data')
+        if encoded and not question['question_image_hash']:
+            try:
+                image = base64.b64decode(encoded, validate=True)
+            except (binascii.Error, ValueError) as e:
+                print(f"  Question {question['id']}: dropping invalid base64 image ({e})")
+            else:
+                question['question_image_hash'] = hashlib.sha256(image).hexdigest()
+                images[question['question_image_hash']] = (question['question_image_type'], image)
+        if not question['content_hash']:
+            question['content_hash'] = content_hash(question['question_text'], question)
+        values.append((bank_id, question['id']) + tuple(question[column] for column in QUESTION_COLUMNS))
+
+    if images:
+        cursor.executemany("""
+            INSERT IGNORE INTO question_images (hash, mime_type, data, size)
+            VALUES (%s, %s, %s, %s)
+        """, [(image_hash, image_type, data, len(data))
+              for image_hash, (image_type, data) in images.items()])
+    if values:
+        columns = ('bank_id', 'id') + QUESTION_COLUMNS
+        updates = ', '.join(f"{column} = VALUES({column})" for column in QUESTION_COLUMNS)
+        cursor.executemany(f"""
+            INSERT INTO questions ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, values)
+    return [row[0] for row in rows]
+
+
+def migrate_table(db, table_name, batch_size):
+    """Copy one topic table; returns (questions in the table, questions in the store)"""
+    # Merges duplicates, so (bank_id, content_hash) stays unique in the copy
+    dedupe_topic_table(db, table_name, batch_size)
+
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"SELECT topic_name FROM `{table_name}` LIMIT 1")
+        topic = cursor.fetchall()
+        bank_id = ensure_bank(cursor, table_name, topic[0][0] if topic else None)
+        db.commit()
+        has_image_data = 'question_image_data' in table_columns(cursor, table_name)
+
+        # Questions deleted from the topic table since an earlier run (removed
+        # first so a re-added question can't collide with its old copy)
+        cursor.execute(f"""
+            DELETE q FROM questions q
+            LEFT JOIN `{table_name}` t ON t.id = q.id
+            WHERE q.bank_id = %s AND t.id IS NULL
+        """, (bank_id,))
+        if cursor.rowcount:
+            print(f"  Removed {cursor.rowcount} questions no longer in '{table_name}'")
+        db.commit()
+
+        last_id = 0
+        copied = 0
+        while True:
+            ids = copy_batch(cursor, table_name, bank_id, has_image_data, last_id, batch_size)
+            if not ids:
+                break
+            db.commit()
+            last_id = ids[-1]
+            copied += len(ids)
+            print(f"  {copied} questions copied (up to id {last_id})")
+
+        invalidate_bank_stats(cursor, table_name)
+        db.commit()
+
+        cursor.execute(f"SELECT COUNT(*) FROM `{table_name}`")
+        source_count = cursor.fetchall()[0][0]
+        cursor.execute("SELECT COUNT(*) FROM questions WHERE bank_id = %s", (bank_id,))
+        store_count = cursor.fetchall()[0][0]
+        return source_count, store_count
+    except mysql.connector.Error:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move per-topic question tables into the normalized store")
+    parser.add_argument("tables", nargs="*", help="Tables to migrate (default: all topic tables)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction")
+    parser.add_argument("--drop-source", action="store_true",
+                        help="Drop each topic table after its copy is verified")
+    args = parser.parse_args()
+
+    db = mysql.connector.connect(**db_config)
+    failed = []
+    try:
+        cursor = db.cursor()
+        create_image_store(cursor)
+        create_question_store(cursor)
+        tables = args.tables or find_topic_tables(cursor)
+        cursor.close()
+
+        for table_name in tables:
+            print(f"Migrating '{table_name}'...")
+            source_count, store_count = migrate_table(db, table_name, args.batch_size)
+            if source_count != store_count:
+                print(f"⚠️  {table_name}: {source_count} questions in the table but {store_count} "
+                      f"in the store; kept the table")
+                failed.append(table_name)
+                continue
+            print(f"✓ {table_name}: {store_count} questions in the normalized store")
+            if args.drop_source:
+                cursor = db.cursor()
+                cursor.execute(f"DROP TABLE `{table_name}`")
+                cursor.close()
+                print(f"✓ Dropped '{table_name}'")
+    finally:
+        db.close()
+
+    # New banks for API processes running with QUESTION_STORE=normalized
+    signal_catalog_update()
+    if failed:
+        raise SystemExit(f"{len(failed)} table(s) did not verify: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Backfill WebP/AVIF variants (see image_optimizer.py) for images already in
+the shared question_images store. Images are re-encoded in parallel worker
+processes a batch at a time, committing after each batch, so an interrupted
+run picks up where it stopped; images that already have every requested
+format are skipped.
+
+Images still stored as base64 in question_image_data are not in the store
+yet; move them there first with backend/migrate_images.py.
+
+Usage:
+    python optimize_images.py
+    python optimize_images.py --formats image/webp --workers 4
+    python optimize_images.py --max-dimension 1200 --batch-size 20
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import mysql.connector
+
+from image_optimizer import (ENCODINGS, MAX_DIMENSION, optimize_image, store_variants, supported_types,
+                             variant_rows)
+from scraper import create_image_store, db_config
+
+
+def pending_images(cursor, mime_types, after_hash, batch_size):
+    """[(hash, formats still missing)] for the next batch of images after after_hash"""
+    marks = ', '.join(['%s'] * len(mime_types))
+    cursor.execute(f"""
+        SELECT i.hash, GROUP_CONCAT(v.mime_type) FROM question_images i
+        LEFT JOIN question_image_variants v ON v.hash = i.hash AND v.mime_type IN ({marks})
+        WHERE i.hash > %s
+        GROUP BY i.hash
+        HAVING COUNT(v.mime_type) < %s
+        ORDER BY i.hash
+        LIMIT %s
+    """, tuple(mime_types) + (after_hash, len(mime_types), batch_size))
+    return [(image_hash, [mime_type for mime_type in mime_types if mime_type not in (done or '').split(',')])
+            for image_hash, done in cursor.fetchall()]
+
+
+def optimize_store(db, mime_types, workers, batch_size, max_dimension):
+    """Encode every image missing one of mime_types; returns (images, original bytes, bytes per format)"""
+    cursor = db.cursor()
+    optimized = 0
+    original_bytes = 0
+    served_bytes = dict.fromkeys(mime_types, 0)
+    last_hash = ''
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = pending_images(cursor, mime_types, last_hash, batch_size)
+            if not batch:
+                break
+            last_hash = batch[-1][0]
+            missing = dict(batch)
+            marks = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"SELECT hash, data FROM question_images WHERE hash IN ({marks})", tuple(missing))
+            images = {image_hash: bytes(data) for image_hash, data in cursor.fetchall()}
+
+            hashes = list(images)
+            results = pool.map(optimize_image, (images[image_hash] for image_hash in hashes),
+                               (missing[image_hash] for image_hash in hashes),
+                               [max_dimension] * len(hashes))
+            rows = []
+            for image_hash, (variants, error) in zip(hashes, results):
+                if error:
+                    print(f"  Skipping {image_hash[:12]}: {error}")
+                rows.extend(variant_rows(image_hash, variants))
+                size = len(images[image_hash])
+                original_bytes += size
+                for mime_type, encoded, _, _ in variants:
+                    # Formats that came out no larger are served as the original
+                    served_bytes[mime_type] += len(encoded) if encoded else size
+            store_variants(cursor, rows)
+            db.commit()
+            optimized += len(hashes)
+            print(f"  {optimized} images optimized")
+
+    cursor.close()
+    return optimized, original_bytes, served_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode stored question images as WebP/AVIF")
+    parser.add_argument("--formats", nargs="+", choices=list(ENCODINGS), default=None,
+                        help="Formats to encode (default: every one Pillow supports)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Encoding processes")
+    parser.add_argument("--batch-size", type=int, default=50, help="Images per transaction")
+    parser.add_argument("--max-dimension", type=int, default=MAX_DIMENSION,
+                        help="Longest side of an optimized image in pixels")
+    args = parser.parse_args()
+
+    available = supported_types()
+    if not available:
+        raise SystemExit("Pillow is not installed (pip install Pillow)")
+    mime_types = args.formats or available
+    unsupported = [mime_type for mime_type in mime_types if mime_type not in available]
+    if unsupported:
+        raise SystemExit(f"This Pillow build cannot encode {', '.join(unsupported)}")
+
+    db = mysql.connector.connect(**db_config)
+    try:
+        cursor = db.cursor()
+        create_image_store(cursor)
+        db.commit()
+        cursor.close()
+
+        print(f"Optimizing question images as {', '.join(mime_types)} with {args.workers} workers...")
+        optimized, original_bytes, served_bytes = optimize_store(db, mime_types, args.workers,
+                                                                 args.batch_size, args.max_dimension)
+    finally:
+        db.close()
+
+    print(f"✓ {optimized} images optimized ({original_bytes / 1048576:.1f} MB originals)")
+    for mime_type, size in served_bytes.items():
+        if size:
+            print(f"  {mime_type}: {size / 1048576:.1f} MB, {original_bytes / size:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
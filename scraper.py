@@ -1,11 +1,35 @@
-from requests_html import HTMLSession
-from bs4 import BeautifulSoup
+import lxml.html
+import requests
 import mysql.connector
 import time
 import re
-import base64
-import requests
-from urllib.parse import urljoin
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+
+from image_optimizer import create_image_store, optimize_image, store_variants, supported_types, variant_rows
+
+# Touched after each scrape so the API reloads its test bank catalog
+# (must match CATALOG_SIGNAL_FILE in backend/app.py)
+CATALOG_SIGNAL_FILE = os.getenv(
+    'CATALOG_SIGNAL_FILE',
+    os.path.join(tempfile.gettempdir(), 'exam_quiz_catalog.signal')
+)
+
+# 'tables' stores each topic in its own table; 'normalized' stores every topic
+# in the shared banks and questions tables (must match QUESTION_STORE in backend/app.py)
+QUESTION_STORE = os.getenv('QUESTION_STORE', 'tables')
+
+# Directory of the API's compiled bank snapshots; when set, each run rebuilds
+# the scraped topic's snapshot (must match SNAPSHOT_DIR in backend/app.py)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR') or None
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
 
 def sanitize_table_name(topic_name):
     """Convert topic name to a valid SQL table name"""
@@ -26,6 +50,8 @@ def create_topic_table(cursor, table_name):
         question_text TEXT NOT NULL,
         question_image_url VARCHAR(500),
         question_image_data LONGTEXT,
+        question_image_blob LONGBLOB,
+        question_image_hash CHAR(64),
         question_image_type VARCHAR(50),
         answer_a TEXT,
         answer_b TEXT,
@@ -35,39 +61,678 @@ def create_topic_table(cursor, table_name):
         answer_f TEXT,
         correct_answers VARCHAR(20) NOT NULL,
         page_number INT,
+        content_hash CHAR(64),
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE INDEX uniq_content_hash (content_hash),
         INDEX idx_page_number (page_number),
-        INDEX idx_topic_name (topic_name)
+        INDEX idx_topic_name (topic_name),
+        INDEX idx_image_hash (question_image_hash),
+        FULLTEXT INDEX ft_question_answers (question_text, answer_a, answer_b, answer_c, answer_d, answer_e, answer_f)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
     """
     cursor.execute(create_table_sql)
+    upgrade_topic_table(cursor, table_name)
     print(f"✓ Table '{table_name}' created/verified")
 
-def download_and_encode_image(image_url, base_url):
-    """Download an image and return base64 encoded data with MIME type"""
+# Columns and indexes added after the original table layout
+ADDED_COLUMNS = {
+    'question_image_blob': "LONGBLOB AFTER question_image_data",
+    'question_image_hash': "CHAR(64) AFTER question_image_blob",
+    'content_hash': "CHAR(64) AFTER page_number",
+}
+
+ADDED_INDEXES = {
+    'idx_image_hash': "INDEX idx_image_hash (question_image_hash)",
+    'ft_question_answers': "FULLTEXT INDEX ft_question_answers "
+                           "(question_text, answer_a, answer_b, answer_c, answer_d, answer_e, answer_f)",
+}
+
+def upgrade_topic_table(cursor, table_name):
+    """Bring a table created by an older version of this script up to date.
+    
+    The unique content_hash index is added by dedupe_topic_table, since
+    existing rows need hashes (and duplicates removed) first.
+    """
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table_name,))
+    existing = {row[0] for row in cursor.fetchall()}
+    for column, definition in ADDED_COLUMNS.items():
+        if column in existing:
+            continue
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD COLUMN {column} {definition}")
+        print(f"✓ Added column '{column}' to '{table_name}'")
+    
+    cursor.execute("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table_name,))
+    existing = {row[0] for row in cursor.fetchall()}
+    for index_name, definition in ADDED_INDEXES.items():
+        if index_name in existing:
+            continue
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD {definition}")
+        print(f"✓ Added index '{index_name}' to '{table_name}'")
+
+def create_question_store(cursor):
+    """Shared tables for QUESTION_STORE=normalized: one row per topic in `banks`
+    and every topic's questions in `questions`, keyed by (bank_id, id)"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS banks (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        table_name VARCHAR(64) NOT NULL,
+        topic_name VARCHAR(255),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE INDEX uniq_table_name (table_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS questions (
+        bank_id INT NOT NULL,
+        id INT NOT NULL,
+        topic_name VARCHAR(255) NOT NULL,
+        question_text TEXT NOT NULL,
+        question_image_url VARCHAR(500),
+        question_image_hash CHAR(64),
+        question_image_type VARCHAR(50),
+        answer_a TEXT,
+        answer_b TEXT,
+        answer_c TEXT,
+        answer_d TEXT,
+        answer_e TEXT,
+        answer_f TEXT,
+        correct_answers VARCHAR(20) NOT NULL,
+        page_number INT,
+        content_hash CHAR(64),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (bank_id, id),
+        UNIQUE INDEX uniq_content_hash (bank_id, content_hash),
+        INDEX idx_image_hash (question_image_hash),
+        FULLTEXT INDEX ft_question_answers (question_text, answer_a, answer_b, answer_c, answer_d, answer_e, answer_f),
+        CONSTRAINT fk_questions_bank FOREIGN KEY (bank_id) REFERENCES banks (id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+def ensure_bank(cursor, table_name, topic_name):
+    """Id of a topic in the banks table, registering it on first use"""
+    cursor.execute("""
+        INSERT INTO banks (table_name, topic_name) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id), topic_name = COALESCE(topic_name, VALUES(topic_name))
+    """, (table_name, topic_name))
+    return cursor.lastrowid
+
+def last_question_id(cursor, bank_id):
+    """Highest question id in a bank, locked so concurrent writers can't reuse ids"""
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM questions WHERE bank_id = %s FOR UPDATE", (bank_id,))
+    return cursor.fetchall()[0][0]
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+def content_hash(question_text, answers_dict):
+    """SHA-256 of the normalized question and answers; identifies a question across scrapes"""
+    parts = [normalize_text(question_text)]
+    parts += [normalize_text(answers_dict.get(f'answer_{label}')) for label in 'abcdef']
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def table_exists(cursor, table_name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table_name,))
+    return bool(cursor.fetchall())
+
+def table_has_index(cursor, table_name, index_name):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    """, (table_name, index_name))
+    return bool(cursor.fetchall())
+
+def merge_duplicate_question(cursor, table_name, duplicate_id, kept_id, has_user_stats, has_reviews):
+    """Fold a duplicate row into the kept one, carrying over its user stats and
+    the review schedules of learners who have none for the kept question"""
+    if has_reviews:
+        cursor.execute("""
+            UPDATE IGNORE review_schedule SET question_id = %s
+            WHERE table_name = %s AND question_id = %s
+        """, (kept_id, table_name, duplicate_id))
+        cursor.execute(
+            "DELETE FROM review_schedule WHERE table_name = %s AND question_id = %s",
+            (table_name, duplicate_id)
+        )
+    if has_user_stats:
+        cursor.execute("""
+            INSERT INTO user_stats (user_id, table_name, question_id, attempts, correct, last_attempt)
+            SELECT user_id, table_name, %s, attempts, correct, last_attempt
+            FROM user_stats
+            WHERE table_name = %s AND question_id = %s
+            ON DUPLICATE KEY UPDATE
+                attempts = user_stats.attempts + VALUES(attempts),
+                correct = user_stats.correct + VALUES(correct),
+                last_attempt = GREATEST(user_stats.last_attempt, VALUES(last_attempt))
+        """, (kept_id, table_name, duplicate_id))
+        cursor.execute(
+            "DELETE FROM user_stats WHERE table_name = %s AND question_id = %s",
+            (table_name, duplicate_id)
+        )
+    cursor.execute(f"DELETE FROM `{table_name}` WHERE id = %s", (duplicate_id,))
+
+def dedupe_topic_table(db, table_name, batch_size=500):
+    """Backfill content hashes, merge duplicate questions and move row images into the image store.
+    
+    Safe to run repeatedly; on an already compacted table it changes nothing.
+    Returns the number of duplicate questions removed.
+    """
+    cursor = db.cursor()
+    upgrade_topic_table(cursor, table_name)
+    create_image_store(cursor)
+    
+    has_user_stats = table_exists(cursor, 'user_stats')
+    has_reviews = table_exists(cursor, 'review_schedule')
+    
+    # 1. Hash rows that predate content_hash, merging any that turn out to be
+    # duplicates. Hashes are matched in memory: until the unique index exists
+    # content_hash is unindexed, so a lookup per row would scan the table
+    cursor.execute(f"SELECT content_hash, MIN(id) FROM `{table_name}` "
+                   f"WHERE content_hash IS NOT NULL GROUP BY content_hash")
+    kept_ids = dict(cursor.fetchall())
+    removed = 0
+    last_id = 0
+    while True:
+        cursor.execute(f"""
+            SELECT id, question_text, answer_a, answer_b, answer_c, answer_d, answer_e, answer_f
+            FROM `{table_name}`
+            WHERE content_hash IS NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        
+        for row in rows:
+            question_id, question_text = row[0], row[1]
+            last_id = question_id
+            answers_dict = {f'answer_{label}': value for label, value in zip('abcdef', row[2:])}
+            row_hash = content_hash(question_text, answers_dict)
+            
+            if row_hash in kept_ids:
+                merge_duplicate_question(cursor, table_name, question_id, kept_ids[row_hash],
+                                         has_user_stats, has_reviews)
+                removed += 1
+            else:
+                cursor.execute(
+                    f"UPDATE `{table_name}` SET content_hash = %s WHERE id = %s",
+                    (row_hash, question_id)
+                )
+                kept_ids[row_hash] = question_id
+        db.commit()
+        print(f"  Hashed questions up to id {last_id} ({removed} duplicates removed so far)")
+    
+    # 2. Enforce uniqueness from now on
+    if not table_has_index(cursor, table_name, 'uniq_content_hash'):
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD UNIQUE INDEX uniq_content_hash (content_hash)")
+        print(f"✓ Added unique content hash index to '{table_name}'")
+    
+    # 3. Move per-row image blobs into the shared content-addressed store
+    moved = 0
+    while True:
+        cursor.execute(f"""
+            SELECT id FROM `{table_name}`
+            WHERE question_image_blob IS NOT NULL
+            ORDER BY id
+            LIMIT %s
+        """, (batch_size,))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            break
+        
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f"""
+            INSERT IGNORE INTO question_images (hash, mime_type, data, size)
+            SELECT question_image_hash, question_image_type, question_image_blob, LENGTH(question_image_blob)
+            FROM `{table_name}`
+            WHERE id IN ({placeholders})
+        """, tuple(ids))
+        cursor.execute(
+            f"UPDATE `{table_name}` SET question_image_blob = NULL WHERE id IN ({placeholders})",
+            tuple(ids)
+        )
+        db.commit()
+        moved += len(ids)
+    if moved:
+        print(f"✓ Moved {moved} images from '{table_name}' into the shared image store")
+    
+    if removed:
+        invalidate_bank_stats(cursor, table_name)
+    db.commit()
+    cursor.close()
+    if removed and has_user_stats:
+        # Learners' statistics moved between questions
+        refresh_analytics(table_name)
+    return removed
+
+def invalidate_bank_stats(cursor, table_name):
+    """Drop the API's precomputed stats for a topic so they are recomputed on next read"""
+    try:
+        cursor.execute("DELETE FROM bank_stats WHERE table_name = %s", (table_name,))
+    except mysql.connector.ProgrammingError as e:
+        # The API creates bank_stats; if it hasn't yet there is nothing to invalidate
+        if e.errno != 1146:
+            raise
+
+def signal_catalog_update():
+    """Touch the catalog signal file so the API picks up new/changed banks"""
+    try:
+        with open(CATALOG_SIGNAL_FILE, 'a'):
+            os.utime(CATALOG_SIGNAL_FILE, None)
+    except OSError as e:
+        print(f"Warning: could not touch catalog signal file: {e}")
+
+def rebuild_snapshot(table_name):
+    """Compile a fresh snapshot of a topic for the API (backend/build_snapshots.py),
+    which swaps it in once it is complete"""
+    result = subprocess.run([sys.executable, 'build_snapshots.py', table_name], cwd=BACKEND_DIR)
+    if result.returncode:
+        print(f"Warning: could not rebuild the snapshot of '{table_name}'; "
+              f"the API reads it from MySQL until it is rebuilt")
+
+def refresh_analytics(table_name):
+    """Rebuild a topic's cohort analytics rollups (backend/refresh_analytics.py)
+    after its statistics were merged onto other questions"""
+    result = subprocess.run([sys.executable, 'refresh_analytics.py', table_name], cwd=BACKEND_DIR)
+    if result.returncode:
+        print(f"Warning: could not refresh the analytics of '{table_name}'; "
+              f"run backend/refresh_analytics.py {table_name}")
+
+class HostRateLimiter:
+    """Spaces out requests to each host to at most `requests_per_second`"""
+    
+    def __init__(self, requests_per_second=1.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+    
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Sent with every request; some sites turn away the default python-requests agent
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_6) AppleWebKit/603.3.8 '
+              '(KHTML, like Gecko) Version/10.1.2 Safari/603.3.8')
+
+# One HTTP session per worker thread (sessions aren't thread-safe)
+_thread_local = threading.local()
+
+def get_session():
+    if not hasattr(_thread_local, 'session'):
+        _thread_local.session = requests.Session()
+        _thread_local.session.headers['User-Agent'] = USER_AGENT
+    return _thread_local.session
+
+def download_image(image_url, base_url, rate_limiter=None):
+    """Download an image and return its raw bytes, MIME type and absolute URL"""
     try:
         # Make the URL absolute if it's relative
         full_url = urljoin(base_url, image_url)
         
+        if rate_limiter:
+            rate_limiter.wait(full_url)
         print(f"    Downloading image: {full_url}")
-        response = requests.get(full_url, timeout=10)
+        response = get_session().get(full_url, timeout=10)
         response.raise_for_status()
         
         # Get content type
         content_type = response.headers.get('content-type', 'image/png')
         
-        # Encode to base64
-        image_data = base64.b64encode(response.content).decode('utf-8')
-        
-        return image_data, content_type, full_url
+        return response.content, content_type, full_url
     except Exception as e:
         print(f"    Error downloading image: {str(e)}")
         return None, None, image_url
 
-def scrape_exam_questions(base_url, topic_name, start_page, end_page, db_config, download_images=True):
+ANSWER_LABELS = ['A', 'B', 'C', 'D', 'E', 'F']
+
+CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+def decode_page(page_content):
+    """Page bytes as text: in the declared charset, else UTF-8, else Windows-1252"""
+    if isinstance(page_content, str):
+        return page_content
+    declared = CHARSET_PATTERN.search(page_content[:4096])
+    encodings = [declared.group(1).decode('ascii')] if declared else []
+    for encoding in encodings + ['utf-8']:
+        try:
+            return page_content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return page_content.decode('windows-1252', errors='replace')
+
+def is_question(element):
+    return element.tag == 'p' and 'lead' in (element.get('class') or '').split()
+
+def question_nodes(question):
+    """Text and elements of one question, in document order.
+    
+    Questions are <p class="lead"> elements that wrap their answer list in a
+    <div>. An HTML parser closes a <p> at the first block element, so what
+    follows is read from the siblings after it, up to the next question.
+    """
+    if question.text is not None:
+        yield question.text
+    for child in question:
+        yield child
+        if child.tail is not None:
+            yield child.tail
+    if question.tail is not None:
+        yield question.tail
+    for sibling in question.itersiblings():
+        if is_question(sibling) or any(is_question(p) for p in sibling.iter('p')):
+            return
+        yield sibling
+        if sibling.tail is not None:
+            yield sibling.tail
+
+def find_answer_list(element):
+    for ol in element.iter('ol'):
+        if 'rounded-list' in (ol.get('class') or '').split():
+            return ol
+    return None
+
+def node_text(element):
+    """Text of an element, or of a comment"""
+    if not isinstance(element.tag, str):
+        return element.text or ''
+    return element.text_content()
+
+def parse_answers(answer_list):
+    """(answers dict, sorted correct labels) from an <ol class="rounded-list">, if any"""
+    answers_dict = {f'answer_{label.lower()}': None for label in ANSWER_LABELS}
+    correct_answers = []
+    if answer_list is None:
+        return answers_dict, correct_answers
+    
+    answer_idx = 0
+    for li in answer_list.iter('li'):
+        if answer_idx >= len(ANSWER_LABELS):
+            break
+        
+        # Only the text of this <li>, not of <li>s nested in it
+        parts = [li.text.strip()] if li.text is not None else []
+        for child in li:
+            if child.tag != 'li':
+                parts.append(node_text(child).strip())
+            if child.tail is not None:
+                parts.append(child.tail.strip())
+        answer_text = ''.join(parts).strip()
+        
+        # Skip empty answers
+        if not answer_text:
+            continue
+        
+        answer_label = ANSWER_LABELS[answer_idx]
+        answers_dict[f'answer_{answer_label.lower()}'] = answer_text
+        if li.get("data-correct") == "True":
+            correct_answers.append(answer_label)
+        
+        answer_idx += 1
+    return answers_dict, sorted(correct_answers)
+
+def parse_question(question):
+    """Question text, first image and answer list of one question in a single pass"""
+    question_parts = []
+    image_src = None
+    seen_image = False
+    answer_list = None
+    in_text = True
+    for node in question_nodes(question):
+        if isinstance(node, str):
+            if in_text:
+                question_parts.append(node.strip())
+            continue
+        if in_text:
+            # The question text is everything before the first <div>
+            if node.tag == 'div':
+                in_text = False
+            elif node.tag == 'br':
+                question_parts.append(' ')
+            elif node.tag == 'img':
+                if not seen_image:
+                    image_src = node.get("src")
+                    seen_image = True
+            else:
+                question_parts.append(node_text(node).strip())
+        if answer_list is None and isinstance(node.tag, str):
+            answer_list = find_answer_list(node)
+        if answer_list is not None and not in_text:
+            break
+    
+    answers_dict, correct_answers = parse_answers(answer_list)
+    return {
+        'question_text': ' '.join(question_parts).strip(),
+        'image_src': image_src,
+        'answers': answers_dict,
+        'correct_answers': correct_answers
+    }
+
+def parse_questions(page_content):
+    """Extract questions, answers and image references from one page of HTML"""
+    text = XML_DECLARATION.sub('', decode_page(page_content), count=1)
+    if not text.strip():
+        return []
+    root = lxml.html.document_fromstring(text)
+    return [parse_question(question) for question in root.iter('p') if is_question(question)]
+
+def fetch_page(url, rate_limiter, image_pool, download_images, known_images=None, optimize_pool=None):
+    """Fetch and parse one page, downloading its images concurrently.
+    
+    known_images maps source URLs already in the image store to (hash, type),
+    so re-scrapes don't download them again. With an optimize_pool (a
+    process pool) downloaded images are also re-encoded there (see
+    image_optimizer.py).
+    """
+    known_images = known_images or {}
+    rate_limiter.wait(url)
+    page = get_session().get(url, timeout=30)
+    page.raise_for_status()
+    questions = parse_questions(page.content)
+    
+    downloads = {}
+    for index, question in enumerate(questions):
+        question['image_url'] = question['image_src']
+        question['image_data'] = question['image_type'] = question['image_hash'] = None
+        question['image_variants'] = None
+        full_url = urljoin(url, question['image_src']) if question['image_src'] else None
+        if full_url in known_images:
+            question['image_url'] = full_url
+            question['image_hash'], question['image_type'] = known_images[full_url]
+        elif question['image_src'] and download_images:
+            downloads[index] = image_pool.submit(download_image, question['image_src'], url, rate_limiter)
+    
+    optimizing = {}
+    for index, future in downloads.items():
+        image_data, image_type, image_url = future.result()
+        question = questions[index]
+        question['image_url'] = image_url
+        if image_data:
+            question['image_data'] = image_data
+            question['image_type'] = image_type
+            question['image_hash'] = hashlib.sha256(image_data).hexdigest()
+            if optimize_pool:
+                optimizing[index] = optimize_pool.submit(optimize_image, image_data)
+    
+    for index, future in optimizing.items():
+        variants, error = future.result()
+        if error:
+            print(f"    Could not optimize image {questions[index]['image_url']}: {error}")
+        questions[index]['image_variants'] = variants
+    return questions
+
+def create_checkpoint_table(cursor):
+    """Track completed pages so an interrupted scrape can resume"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+        table_name VARCHAR(64) NOT NULL,
+        page_number INT NOT NULL,
+        base_url VARCHAR(500) NOT NULL,
+        questions INT NOT NULL DEFAULT 0,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (table_name, page_number)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+def stored_images(cursor, table_name, bank_id=None):
+    """Source URLs of images this topic already has in the image store"""
+    if bank_id is None:
+        cursor.execute(f"""
+            SELECT question_image_url, question_image_hash, question_image_type FROM `{table_name}`
+            WHERE question_image_hash IS NOT NULL AND question_image_url IS NOT NULL
+        """)
+    else:
+        cursor.execute("""
+            SELECT question_image_url, question_image_hash, question_image_type FROM questions
+            WHERE bank_id = %s AND question_image_hash IS NOT NULL AND question_image_url IS NOT NULL
+        """, (bank_id,))
+    return {url: (image_hash, image_type) for url, image_hash, image_type in cursor.fetchall()}
+
+def completed_pages(cursor, table_name, base_url):
+    """Pages of this topic an unfinished run already saved from the same base_url"""
+    cursor.execute("SELECT page_number FROM scrape_checkpoints WHERE table_name = %s AND base_url = %s",
+                   (table_name, base_url))
+    return {row[0] for row in cursor.fetchall()}
+
+def clear_checkpoints(db, cursor, table_name, start_page, end_page):
+    """Forget a finished run's pages, so the next scrape of the topic fetches
+    them again and picks up new and changed questions"""
+    cursor.execute("""
+        DELETE FROM scrape_checkpoints
+        WHERE table_name = %s AND page_number BETWEEN %s AND %s
+    """, (table_name, start_page, end_page))
+    db.commit()
+
+def save_page(db, cursor, table_name, topic_name, base_url, page_num, questions, bank_id=None):
+    """Insert one page of questions and its checkpoint in a single transaction.
+    
+    With a bank_id the questions go into the shared questions table.
+    """
+    rows = []
+    images = {}
+    variants = []
+    for question in questions:
+        if not question['correct_answers']:
+            print(f"WARNING: No correct answer found for question on page {page_num}\n")
+            continue
+        
+        # Join multiple correct answers with comma (e.g., "A,C,D")
+        correct_answers_str = ','.join(question['correct_answers'])
+        answers_dict = question['answers']
+        if question['image_data']:
+            images[question['image_hash']] = (question['image_type'], question['image_data'])
+        if question.get('image_variants'):
+            variants.extend(variant_rows(question['image_hash'], question['image_variants']))
+        rows.append((
+            topic_name,
+            question['question_text'],
+            question['image_url'],
+            question['image_hash'],
+            question['image_type'],
+            answers_dict['answer_a'],
+            answers_dict['answer_b'],
+            answers_dict['answer_c'],
+            answers_dict['answer_d'],
+            answers_dict['answer_e'],
+            answers_dict['answer_f'],
+            correct_answers_str,
+            page_num,
+            content_hash(question['question_text'], answers_dict)
+        ))
+        
+        for label in ['A', 'B', 'C', 'D', 'E', 'F']:
+            answer_text = answers_dict[f'answer_{label.lower()}']
+            if answer_text:
+                is_correct = label in question['correct_answers']
+                print(f"  {label}. {answer_text[:80]}{'...' if len(answer_text) > 80 else ''} {'✓ CORRECT' if is_correct else ''}")
+        
+        print(f"\nQuestion: {question['question_text'][:100]}{'...' if len(question['question_text']) > 100 else ''}")
+        if question['image_url']:
+            print(f"Image: {'✓ Stored' if question['image_hash'] else '✓ URL stored'}")
+        print(f"Correct Answer(s): {correct_answers_str}")
+        if len(question['correct_answers']) > 1:
+            print(f"  ⚠️  Multiple correct answers detected! ({len(question['correct_answers'])} answers)")
+        print("="*40 + "\n")
+    
+    try:
+        if images:
+            # Identical images are stored once, whichever question or topic uses them
+            cursor.executemany("""
+                INSERT IGNORE INTO question_images (hash, mime_type, data, size)
+                VALUES (%s, %s, %s, %s)
+            """, [(image_hash, image_type, data, len(data))
+                  for image_hash, (image_type, data) in images.items()])
+        if variants:
+            store_variants(cursor, variants)
+        if rows:
+            target, key_columns = f"`{table_name}`", ""
+            if bank_id is not None:
+                # No per-bank AUTO_INCREMENT here: number new questions after
+                # the bank's last one (ids of rows that turn out to exist are skipped)
+                first_id = last_question_id(cursor, bank_id) + 1
+                rows = [(bank_id, first_id + index) + row for index, row in enumerate(rows)]
+                target, key_columns = "questions", "bank_id, id, "
+            # Questions already in the table (same content_hash) are updated in
+            # place, which is a no-op when nothing changed
+            placeholders = ', '.join(['%s'] * len(rows[0]))
+            insert_sql = f"""
+                INSERT INTO {target} 
+                ({key_columns}topic_name, question_text, question_image_url, question_image_hash,
+                 question_image_type, answer_a, answer_b, answer_c, answer_d, answer_e, answer_f,
+                 correct_answers, page_number, content_hash) 
+                VALUES ({placeholders})
+                ON DUPLICATE KEY UPDATE
+                    correct_answers = VALUES(correct_answers),
+                    question_image_url = COALESCE(VALUES(question_image_url), question_image_url),
+                    question_image_hash = COALESCE(VALUES(question_image_hash), question_image_hash),
+                    question_image_type = COALESCE(VALUES(question_image_type), question_image_type)
+            """
+            cursor.executemany(insert_sql, rows)
+        cursor.execute("""
+            INSERT INTO scrape_checkpoints (table_name, page_number, base_url, questions)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE questions = VALUES(questions), completed_at = CURRENT_TIMESTAMP
+        """, (table_name, page_num, base_url, len(rows)))
+        if rows:
+            invalidate_bank_stats(cursor, table_name)
+        db.commit()
+    except mysql.connector.Error:
+        db.rollback()
+        raise
+    return len(rows)
+
+def scrape_exam_questions(base_url, topic_name, start_page, end_page, db_config, download_images=True,
+                          page_workers=4, image_workers=8, requests_per_second=1.0, resume=True,
+                          optimize_images=True, optimize_workers=None):
     """
     Scrape exam questions from a URL pattern
     
+    Pages are fetched by a pool of `page_workers` threads and images by a pool
+    of `image_workers`, with requests to each host spaced out by
+    `requests_per_second`. Downloaded images are re-encoded by a pool of
+    `optimize_workers` processes (default: one per CPU). Each page is
+    inserted and checkpointed in one transaction, so a rerun with
+    resume=True skips pages that already finished. Checkpoints are only
+    honoured for the same base_url, and are cleared once a run finishes
+    without failed pages, so the next scrape refreshes every page.
+    
     Args:
         base_url: Base URL pattern with {page} placeholder
         topic_name: Name of the topic/exam (e.g., "AWS SAA-C03")
@@ -75,172 +740,96 @@ def scrape_exam_questions(base_url, topic_name, start_page, end_page, db_config,
         end_page: Ending page number (inclusive)
         db_config: Dictionary with database connection parameters
         download_images: If True, downloads and stores images; if False, only stores URLs
+        page_workers: Pages fetched concurrently
+        image_workers: Images downloaded concurrently
+        requests_per_second: Per-host request rate limit
+        resume: Skip pages completed by a previous run
+        optimize_images: Also store resized WebP/AVIF encodings of new images (needs Pillow)
+        optimize_workers: Processes re-encoding images
     """
     
-    # Database connection
+    # Database connection (only used from this thread)
     db = mysql.connector.connect(**db_config)
     cursor = db.cursor()
     
     # Create table name from topic
     table_name = sanitize_table_name(topic_name)
     
-    # Create the table
-    create_topic_table(cursor, table_name)
+    create_checkpoint_table(cursor)
+    create_image_store(cursor)
+    if QUESTION_STORE == 'normalized':
+        create_question_store(cursor)
+        bank_id = ensure_bank(cursor, table_name, topic_name)
+        db.commit()
+    else:
+        bank_id = None
+        # Create the table
+        create_topic_table(cursor, table_name)
+        # Older tables need hashes backfilled before upserts can match them
+        dedupe_topic_table(db, table_name)
+    known_images = stored_images(cursor, table_name, bank_id)
     
-    session = HTMLSession()
+    pages = list(range(start_page, end_page + 1))
+    if resume:
+        done = completed_pages(cursor, table_name, base_url)
+        if done & set(pages):
+            print(f"Resuming: skipping {len(done & set(pages))} page(s) already scraped")
+        pages = [page_num for page_num in pages if page_num not in done]
     
-    # Loop through pages
-    for page_num in range(start_page, end_page + 1):
-        URL = base_url.format(page=page_num)
-        
-        print(f"\n{'='*60}")
-        print(f"SCRAPING PAGE {page_num} - Topic: {topic_name}")
-        print(f"{'='*60}\n")
+    rate_limiter = HostRateLimiter(requests_per_second)
+    total_questions = 0
+    failed_pages = []
+    
+    optimize_pool = None
+    if download_images and optimize_images:
+        if supported_types():
+            optimize_pool = ProcessPoolExecutor(max_workers=optimize_workers)
+        else:
+            print("Pillow is not installed; storing images without optimizing them")
+    
+    with ThreadPoolExecutor(max_workers=page_workers) as page_pool, \
+         ThreadPoolExecutor(max_workers=image_workers) as image_pool:
+        futures = {
+            page_pool.submit(fetch_page, base_url.format(page=page_num), rate_limiter, image_pool,
+                             download_images, known_images, optimize_pool): page_num
+            for page_num in pages
+        }
         
-        try:
-            page = session.get(URL)
-            soup = BeautifulSoup(page.content, "html.parser")
-            
-            questions = soup.find_all("p", class_="lead")
-            
-            for question in questions:
-                # Initialize image variables
-                image_url = None
-                image_data = None
-                image_type = None
-                
-                # Look for images in the question (before the first div)
-                for content in question.children:
-                    if content.name == 'div':
-                        break
-                    if content.name == 'img':
-                        image_url = content.get("src")
-                        if image_url:
-                            print(f"  📷 Image found in question!")
-                            if download_images:
-                                image_data, image_type, image_url = download_and_encode_image(image_url, URL)
-                        break
-                
-                # Get all text nodes before the first <div> tag
-                question_parts = []
-                for content in question.children:
-                    if content.name == 'div':
-                        break  # Stop when we hit the first div
-                    if content.name == 'br':
-                        question_parts.append(' ')
-                    elif content.name == 'img':
-                        # Skip images in text extraction
-                        continue
-                    elif isinstance(content, str):
-                        question_parts.append(content.strip())
-                    else:
-                        question_parts.append(content.get_text().strip())
-                
-                question_text = ' '.join(question_parts).strip()
-                
-                # Initialize answer dictionary
-                answers_dict = {
-                    'answer_a': None,
-                    'answer_b': None,
-                    'answer_c': None,
-                    'answer_d': None,
-                    'answer_e': None,
-                    'answer_f': None
-                }
-                correct_answers = []  # List to store multiple correct answers
-                
-                # Find all answer options
-                answer_list = question.find("ol", class_="rounded-list")
-                if answer_list:
-                    all_lis = answer_list.find_all("li")
-                    answer_labels = ['A', 'B', 'C', 'D', 'E', 'F']
-                    
-                    answer_idx = 0
-                    for li in all_lis:
-                        if answer_idx >= len(answer_labels):
-                            break
-                        
-                        # Get only the direct text of this <li>
-                        answer_text = ""
-                        for content in li.children:
-                            if isinstance(content, str):
-                                answer_text += content.strip()
-                            elif content.name != 'li':
-                                answer_text += content.get_text().strip()
-                        
-                        answer_text = answer_text.strip()
-                        
-                        # Skip empty answers
-                        if not answer_text:
-                            continue
-                        
-                        is_correct = li.get("data-correct") == "True"
-                        answer_label = answer_labels[answer_idx]
-                        
-                        # Store answer in dictionary
-                        column_name = f'answer_{answer_label.lower()}'
-                        answers_dict[column_name] = answer_text
-                        
-                        if is_correct:
-                            correct_answers.append(answer_label)
-                        
-                        print(f"  {answer_label}. {answer_text[:80]}{'...' if len(answer_text) > 80 else ''} {'✓ CORRECT' if is_correct else ''}")
-                        
-                        answer_idx += 1
-                
-                if correct_answers:
-                    # Join multiple correct answers with comma (e.g., "A,C,D")
-                    correct_answers_str = ','.join(sorted(correct_answers))
-                    
-                    # Insert question into database
-                    insert_sql = f"""
-                        INSERT INTO `{table_name}` 
-                        (topic_name, question_text, question_image_url, question_image_data, question_image_type,
-                         answer_a, answer_b, answer_c, answer_d, answer_e, answer_f, correct_answers, page_number) 
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_sql, (
-                        topic_name,
-                        question_text,
-                        image_url,
-                        image_data,
-                        image_type,
-                        answers_dict['answer_a'],
-                        answers_dict['answer_b'],
-                        answers_dict['answer_c'],
-                        answers_dict['answer_d'],
-                        answers_dict['answer_e'],
-                        answers_dict['answer_f'],
-                        correct_answers_str,
-                        page_num
-                    ))
-                    
-                    print(f"\nQuestion: {question_text[:100]}{'...' if len(question_text) > 100 else ''}")
-                    if image_url:
-                        print(f"Image: {'✓ Downloaded and stored' if image_data else '✓ URL stored'}")
-                    print(f"Correct Answer(s): {correct_answers_str}")
-                    if len(correct_answers) > 1:
-                        print(f"  ⚠️  Multiple correct answers detected! ({len(correct_answers)} answers)")
-                    print("="*40 + "\n")
-                    
-                    db.commit()
-                else:
-                    print(f"WARNING: No correct answer found for question on page {page_num}\n")
+        # Write pages as they finish; the database is only touched here
+        for future in as_completed(futures):
+            page_num = futures[future]
             
-            # Be polite to the server
-            time.sleep(1)
+            print(f"\n{'='*60}")
+            print(f"SCRAPED PAGE {page_num} - Topic: {topic_name}")
+            print(f"{'='*60}\n")
             
-        except Exception as e:
-            print(f"Error on page {page_num}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            continue
+            try:
+                questions = future.result()
+                total_questions += save_page(db, cursor, table_name, topic_name, base_url, page_num, questions,
+                                             bank_id)
+            except Exception as e:
+                print(f"Error on page {page_num}: {str(e)}")
+                traceback.print_exc()
+                failed_pages.append(page_num)
+                continue
+    if optimize_pool:
+        optimize_pool.shutdown()
+    
+    # Checkpoints only matter to a run that has yet to finish
+    if not failed_pages:
+        clear_checkpoints(db, cursor, table_name, start_page, end_page)
     
     # Close database connection
     cursor.close()
     db.close()
     
-    print(f"\n✓ Scraping complete for {topic_name}! Data saved to table '{table_name}'.")
+    if SNAPSHOT_DIR:
+        rebuild_snapshot(table_name)
+    signal_catalog_update()
+    
+    print(f"\n✓ Scraping complete for {topic_name}! {total_questions} questions saved to table '{table_name}'.")
+    if failed_pages:
+        print(f"⚠️  {len(failed_pages)} page(s) failed and will be retried on the next run: {sorted(failed_pages)}")
 
 # Database configuration
 db_config = {
@@ -295,11 +884,12 @@ scrape_exam_questions(
     db_config=db_config
 )
 """
-time.sleep(10)
-scrape_exam_questions(
-    base_url="https://free-braindumps.com/hashicorp/free-terraform-associate-braindumps/page-{page}",
-    topic_name="Hashicorp Terraform Associate",
-    start_page=2,
-    end_page=51,
-    db_config=db_config
-)
\ No newline at end of file
+if __name__ == '__main__':
+    time.sleep(10)
+    scrape_exam_questions(
+        base_url="https://free-braindumps.com/hashicorp/free-terraform-associate-braindumps/page-{page}",
+        topic_name="Hashicorp Terraform Associate",
+        start_page=2,
+        end_page=51,
+        db_config=db_config
+    )